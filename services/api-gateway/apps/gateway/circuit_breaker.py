@@ -0,0 +1,337 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger('gateway')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Добавить счетчики воркера в общее окно и решить, открывать ли breaker.
+# Результат пробного запроса (ARGV[3]) закрывает или заново открывает breaker
+BREAKER_SCRIPT = """
+local total = tonumber(ARGV[1])
+local failures = tonumber(ARGV[2])
+local probe = ARGV[3]
+local window = tonumber(ARGV[4])
+local min_requests = tonumber(ARGV[5])
+local failure_rate = tonumber(ARGV[6])
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local result
+if probe == 'success' then
+    redis.call('DEL', KEYS[2])
+    redis.call('HSET', KEYS[1], 'state', 'closed', 'opened_at', 0, 'window_start', now, 'total', 0, 'failures', 0)
+    result = {'closed', '0'}
+elseif probe == 'failure' then
+    redis.call('DEL', KEYS[2])
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', now)
+    result = {'open', tostring(now)}
+else
+    local bucket = redis.call('HMGET', KEYS[1], 'state', 'opened_at', 'window_start')
+    if bucket[1] == 'open' then
+        result = {'open', bucket[2]}
+    else
+        local window_start = tonumber(bucket[3])
+        if not window_start or now - window_start >= window then
+            redis.call('HSET', KEYS[1], 'state', 'closed', 'window_start', now, 'total', 0, 'failures', 0)
+        end
+
+        local window_total = redis.call('HINCRBY', KEYS[1], 'total', total)
+        local window_failures = redis.call('HINCRBY', KEYS[1], 'failures', failures)
+
+        if window_total >= min_requests and window_failures / window_total >= failure_rate then
+            redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', now)
+            result = {'open', tostring(now)}
+        else
+            result = {'closed', '0'}
+        end
+    end
+end
+
+redis.call('EXPIRE', KEYS[1], 3600)
+return result
+"""
+
+
+class Probe:
+    """
+    Разрешение на пробный запрос half-open
+    Только его результат закрывает или заново открывает breaker; если запрос
+    не дошел до record (исключение), release или deadline освобождают пробу
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.done = False
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker сервиса, общий для всех воркеров через Redis
+    Воркер копит счетчики локально и отправляет их не чаще раза в секунду
+    (ошибки - сразу), пока breaker открыт - запросы отклоняются без Redis
+
+    allow_request() возвращает разрешение: False - отклонить, True - обычный
+    запрос, Probe - пробный. Разрешение передается в record() и release()
+    """
+
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, name):
+        self.name = name
+        self.key = f'gateway:breaker:{name}'
+        self.probe_key = f'gateway:breaker:{name}:probe'
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe = None
+
+        self._total = 0
+        self._failures = 0
+        self._last_flush = time.monotonic()
+        self._next_probe_check = 0.0
+        self._lock = threading.Lock()
+        self._script = None
+
+    @property
+    def redis(self):
+        return get_redis_connection('default')
+
+    @property
+    def script(self):
+        if self._script is None:
+            self._script = self.redis.register_script(BREAKER_SCRIPT)
+        return self._script
+
+    def allow_request_fast(self):
+        """Breaker закрыт - решение без Redis"""
+        return self.state == CLOSED
+
+    def allow_request(self):
+        """Разрешение на запрос в сервис: False, True или Probe"""
+        if self.state == CLOSED:
+            return True
+
+        now = time.time()
+        if now - self.opened_at < settings.CIRCUIT_BREAKER_OPEN_SECONDS:
+            return False
+
+        # Время открытия вышло - один воркер отправляет пробный запрос (half-open)
+        with self._lock:
+            if self.probe is not None:
+                if now < self.probe.deadline:
+                    return False
+                # Проба зависла дольше CIRCUIT_BREAKER_OPEN_SECONDS - как и ключ в Redis, она истекла
+                logger.warning(f'Circuit breaker {self.name}: probe timed out')
+                self.probe.done = True
+                self.probe = None
+            if now < self._next_probe_check:
+                return False
+            self._next_probe_check = now + self.FLUSH_INTERVAL
+
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.set(self.probe_key, 1, nx=True, ex=settings.CIRCUIT_BREAKER_OPEN_SECONDS)
+            pipe.hmget(self.key, 'state', 'opened_at')
+            acquired, (state, opened_at) = pipe.execute()
+        except RedisError as e:
+            logger.warning(f'Circuit breaker {self.name}: Redis error: {str(e)}')
+            return True
+
+        if state is None or state.decode() == CLOSED:
+            # Пробный запрос другого воркера уже закрыл breaker
+            self._set_state(CLOSED, 0)
+            return True
+
+        if acquired:
+            probe = Probe(now + settings.CIRCUIT_BREAKER_OPEN_SECONDS)
+            with self._lock:
+                self.probe = probe
+            return probe
+
+        if opened_at is not None:
+            self._set_state(OPEN, opened_at)
+        return False
+
+    def record(self, success, permit=True):
+        """Учесть результат запроса с разрешением permit из allow_request()"""
+        pending = self.count(success, permit)
+        if pending is not None:
+            self.flush(*pending)
+
+    def count(self, success, permit=True):
+        """
+        Учесть результат локально
+        Возвращает аргументы flush, если счетчики пора отправить в Redis
+        """
+        if isinstance(permit, Probe) and self._finish_probe(permit):
+            return 0, 0, 'success' if success else 'failure'
+
+        with self._lock:
+            self._total += 1
+            if not success:
+                self._failures += 1
+
+            now = time.monotonic()
+            if success and now - self._last_flush < self.FLUSH_INTERVAL:
+                return None
+
+            total, failures = self._total, self._failures
+            self._total = self._failures = 0
+            self._last_flush = now
+
+        return total, failures, ''
+
+    def _finish_probe(self, probe):
+        """Снять пробу; False - она уже истекла или освобождена"""
+        with self._lock:
+            if probe.done:
+                return False
+            probe.done = True
+            if self.probe is probe:
+                self.probe = None
+            return True
+
+    def release(self, permit):
+        """
+        Вызывается в finally после запроса: проба без результата (исключение
+        до record) освобождается, чтобы следующую пробу мог отправить любой воркер
+        """
+        if not isinstance(permit, Probe) or not self._finish_probe(permit):
+            return
+        logger.warning(f'Circuit breaker {self.name}: probe finished without result')
+        try:
+            self.redis.delete(self.probe_key)
+        except RedisError as e:
+            logger.warning(f'Circuit breaker {self.name}: Redis error: {str(e)}')
+
+    def flush(self, total, failures, probe):
+        try:
+            state, opened_at = self.script(
+                keys=[self.key, self.probe_key],
+                args=[
+                    total,
+                    failures,
+                    probe,
+                    settings.CIRCUIT_BREAKER_WINDOW,
+                    settings.CIRCUIT_BREAKER_MIN_REQUESTS,
+                    settings.CIRCUIT_BREAKER_FAILURE_RATE,
+                ]
+            )
+        except RedisError as e:
+            logger.warning(f'Circuit breaker {self.name}: Redis error: {str(e)}')
+            return
+
+        state = state.decode()
+        if state == OPEN and self.state != OPEN:
+            logger.error(f'Circuit breaker opened for {self.name}')
+        elif state == CLOSED and self.state == OPEN:
+            logger.info(f'Circuit breaker closed for {self.name}')
+        self._set_state(state, opened_at)
+
+    def _set_state(self, state, opened_at):
+        self.state = state
+        self.opened_at = float(opened_at)
+
+    def status(self):
+        """Состояние breaker для health check (из Redis - общее для всех воркеров)"""
+        try:
+            state, opened_at, total, failures = self.redis.hmget(
+                self.key, 'state', 'opened_at', 'total', 'failures'
+            )
+        except RedisError as e:
+            return {'state': 'unknown', 'error': str(e)}
+
+        state = state.decode() if state else CLOSED
+        opened_at = float(opened_at or 0)
+        if state == OPEN and time.time() - opened_at >= settings.CIRCUIT_BREAKER_OPEN_SECONDS:
+            state = HALF_OPEN
+
+        return {
+            'state': state,
+            'window_requests': int(total or 0),
+            'window_failures': int(failures or 0),
+        }
+
+
+class LatencyTracker:
+    """
+    Задержки ответов маршрута и таймаут, вычисленный из p99
+    Один tracker на маршрут в процессе: пишут потоки запросов, фоновое обновление
+    кэша и async view, поэтому выборка копируется под lock, а сортируется копия
+    """
+
+    RECALCULATE_EVERY = 50
+
+    def __init__(self):
+        self._samples = deque(maxlen=settings.ADAPTIVE_TIMEOUT_SAMPLES)
+        self._since_recalculate = 0
+        self._lock = threading.Lock()
+        self.p99 = None
+        self.timeout = settings.REQUEST_TIMEOUT
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._since_recalculate += 1
+
+            if self._since_recalculate < self.RECALCULATE_EVERY:
+                return
+            if len(self._samples) < settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+                return
+
+            self._since_recalculate = 0
+            samples = list(self._samples)
+
+        samples.sort()
+        self.p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        self.timeout = min(
+            settings.REQUEST_TIMEOUT,
+            max(settings.ADAPTIVE_TIMEOUT_MIN, self.p99 * settings.ADAPTIVE_TIMEOUT_MULTIPLIER)
+        )
+
+
+BREAKERS = {}
+LATENCY_TRACKERS = {}
+
+
+def get_breaker(service_url):
+    breaker = BREAKERS.get(service_url)
+    if breaker is None:
+        breaker = BREAKERS.setdefault(service_url, CircuitBreaker(service_url))
+    return breaker
+
+
+def get_latency_tracker(route_prefix):
+    tracker = LATENCY_TRACKERS.get(route_prefix)
+    if tracker is None:
+        tracker = LATENCY_TRACKERS.setdefault(route_prefix, LatencyTracker())
+    return tracker
+
+
+def is_failure(status_code, elapsed):
+    """Ошибки сервиса и слишком медленные ответы открывают breaker"""
+    return status_code >= 500 or elapsed >= settings.CIRCUIT_BREAKER_SLOW_CALL
+
+
+def get_breakers_status(service_urls):
+    return {service_url: get_breaker(service_url).status() for service_url in service_urls}
+
+
+def get_timeouts_status():
+    return {
+        route_prefix: {
+            'p99': round(tracker.p99, 3) if tracker.p99 is not None else None,
+            'timeout': round(tracker.timeout, 3),
+        }
+        for route_prefix, tracker in LATENCY_TRACKERS.items()
+    }
@@ -0,0 +1,156 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from .upstream import get_pool
+
+logger = logging.getLogger('gateway')
+
+HEALTH_SERVICES = {
+    'user-service': settings.USER_SERVICE_URL,
+    'freelance-service': settings.FREELANCE_SERVICE_URL,
+    'notification-service': settings.NOTIFICATION_SERVICE_URL,
+    'content-service': settings.CONTENT_SERVICE_URL,
+    'marketplace-service': settings.MARKETPLACE_SERVICE_URL,
+}
+
+# Сервисы проверяются параллельно: время ответа - самый медленный сервис,
+# а не сумма всех таймаутов
+_executor = ThreadPoolExecutor(max_workers=len(HEALTH_SERVICES), thread_name_prefix='health')
+
+
+def check_service(service_url, deep):
+    """Опросить /health/ одного сервиса"""
+    try:
+        response = get_pool(service_url).request(
+            'GET',
+            f'{service_url}/health/',
+            params={'deep': 1} if deep else None,
+            timeout=settings.HEALTH_CHECK_TIMEOUT
+        )
+    except Exception as e:
+        return {
+            'status': 'unhealthy',
+            'error': str(e)
+        }
+
+    result = {
+        'status': 'healthy' if response.status_code == 200 else 'unhealthy',
+        'response_time': response.elapsed.total_seconds()
+    }
+
+    if deep:
+        try:
+            details = response.json()
+        except ValueError:
+            details = {}
+        # В deep режиме сервис сам сообщает о своих зависимостях (БД, Redis)
+        for key in ('database', 'redis', 'latency_ms'):
+            if key in details:
+                result[key] = details[key]
+        if details.get('status') == 'degraded':
+            result['status'] = 'degraded'
+
+    return result
+
+
+def check_redis():
+    """Доступность и задержка Redis самого gateway"""
+    started = time.monotonic()
+    try:
+        get_redis_connection('default').ping()
+    except Exception as e:
+        return {'status': 'unhealthy', 'error': str(e)}
+    return {'status': 'healthy', 'latency_ms': round((time.monotonic() - started) * 1000, 2)}
+
+
+def collect_health(deep=False):
+    """Опросить все сервисы параллельно"""
+    futures = {
+        service_name: _executor.submit(check_service, service_url, deep)
+        for service_name, service_url in HEALTH_SERVICES.items()
+    }
+    services_status = {service_name: future.result() for service_name, future in futures.items()}
+
+    report = {
+        'services': services_status,
+        'all_healthy': all(status['status'] == 'healthy' for status in services_status.values()),
+        'checked_at': time.time(),
+    }
+    if deep:
+        report['redis'] = check_redis()
+    return report
+
+
+def pending_report(deep=False):
+    """Результат до первой проверки: состояние сервисов неизвестно"""
+    report = {
+        'services': {service_name: {'status': 'unknown'} for service_name in HEALTH_SERVICES},
+        'all_healthy': False,
+        'checked_at': None,
+    }
+    if deep:
+        report['redis'] = {'status': 'unknown'}
+    return report
+
+
+class HealthCache:
+    """
+    Последний результат проверки сервисов
+    Фоновый поток обновляет его каждые ttl секунд, а запросы (probe балансировщика)
+    всегда отвечают из памяти и не ждут сервисы. Поток запускается первым запросом
+    в процессе воркера - после fork, поэтому работает и с preload
+    """
+
+    def __init__(self, ttl, deep=False):
+        self.ttl = ttl
+        self.deep = deep
+        self._report = None
+        self._ready = threading.Event()
+        self._stopped = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._pid != os.getpid():
+            self._start()
+        if self._report is None:
+            # Первая проверка воркера: сервисы опрашиваются параллельно, ждем не дольше таймаута
+            self._ready.wait(settings.HEALTH_CHECK_TIMEOUT + 1)
+        return self._report or pending_report(self.deep)
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._report = None
+            self._ready.clear()
+            threading.Thread(target=self._run, name='health-refresh', daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._report = collect_health(self.deep)
+            except Exception as e:
+                # Остается прежний результат, следующая попытка - через ttl
+                logger.error(f'Health refresh failed: {str(e)}')
+            self._ready.set()
+            self._stopped.wait(self.ttl)
+
+
+HEALTH_CACHE = HealthCache(settings.HEALTH_CACHE_TTL)
+DEEP_HEALTH_CACHE = HealthCache(settings.HEALTH_CACHE_TTL, deep=True)
+
+
+def get_health(deep=False):
+    """Результат проверки сервисов (из памяти, не старше HEALTH_CACHE_TTL + время опроса)"""
+    return (DEEP_HEALTH_CACHE if deep else HEALTH_CACHE).get()
@@ -0,0 +1,57 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+
+# Заголовки личности пользователя, которые gateway передает сервисам после
+# проверки JWT. Сервисы проверяют подпись вместо повторного декодирования токена
+USER_ID_HEADER = 'X-User-Id'
+USER_EMAIL_HEADER = 'X-User-Email'
+TOKEN_EXP_HEADER = 'X-Token-Exp'
+USER_CLAIMS_HEADER = 'X-User-Claims'
+SIGNATURE_HEADER = 'X-Identity-Signature'
+
+IDENTITY_HEADERS = {
+    USER_ID_HEADER.lower(),
+    USER_EMAIL_HEADER.lower(),
+    TOKEN_EXP_HEADER.lower(),
+    USER_CLAIMS_HEADER.lower(),
+    SIGNATURE_HEADER.lower(),
+}
+
+# Время выдачи и флаги ролей из токена: сервис проверяет отзыв и права
+# без запроса пользователя к БД. Формат: iat=1767311100.5,is_active=1,is_staff=0
+FORWARDED_CLAIMS = ('iat', 'is_active', 'is_staff', 'is_superuser', 'is_freelancer', 'is_seller', 'is_moderator')
+
+
+def sign_identity(user_id, email, exp, claims=''):
+    """Подпись заголовков личности общим с сервисами секретом"""
+    message = f'{user_id}|{email}|{exp}'
+    if claims:
+        message = f'{message}|{claims}'
+    return hmac.new(settings.INTERNAL_AUTH_SECRET.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def encode_claims(payload):
+    """Claims токена для заголовка X-User-Claims (флаги - 0/1)"""
+    return ','.join(
+        f'{claim}={int(payload[claim]) if isinstance(payload[claim], bool) else payload[claim]}'
+        for claim in FORWARDED_CLAIMS
+        if claim in payload
+    )
+
+
+def build_identity_headers(payload):
+    """Подписанные заголовки личности из проверенных claims токена"""
+    user_id = payload.get('user_id')
+    email = payload.get('email') or ''
+    exp = payload.get('exp') or ''
+    claims = encode_claims(payload)
+
+    return {
+        USER_ID_HEADER: str(user_id),
+        USER_EMAIL_HEADER: email,
+        TOKEN_EXP_HEADER: str(exp),
+        USER_CLAIMS_HEADER: claims,
+        SIGNATURE_HEADER: sign_identity(user_id, email, exp, claims),
+    }
@@ -0,0 +1,88 @@
+import atexit
+import json
+import logging
+import queue
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+class JSONFormatter(logging.Formatter):
+    """Одна запись - одна JSON строка; поля access log берутся из record.access"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        data.update(getattr(record, 'access', None) or {})
+
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+# Обработчики процесса - для числа отброшенных записей в /health/
+HANDLERS = []
+
+
+def dropped_records():
+    """Сколько записей отброшено из-за переполнения очереди с запуска процесса"""
+    return sum(handler.dropped for handler in HANDLERS)
+
+
+class QueueLogHandler(QueueHandler):
+    """
+    Запись в лог без блокировки запроса
+    Запись кладется в очередь как есть, форматирование и вывод в stdout
+    выполняет фоновый поток. При переполнении очереди запись отбрасывается;
+    когда место появится, в лог попадет warning с числом отброшенных записей
+    (не чаще раза в dropped_warning_interval секунд)
+    """
+
+    def __init__(self, max_size=10000, dropped_warning_interval=60):
+        super().__init__(queue.Queue(max_size))
+        self.target = logging.StreamHandler()
+        self.dropped = 0
+        self.dropped_warning_interval = dropped_warning_interval
+        self._reported = 0
+        self._reported_at = float('-inf')
+        HANDLERS.append(self)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def setFormatter(self, fmt):
+        # Форматирует фоновый поток, а не поток запроса
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        if self.dropped > self._reported and time.monotonic() - self._reported_at >= self.dropped_warning_interval:
+            self.report_dropped()
+
+    def report_dropped(self):
+        dropped = self.dropped
+        warning = logging.makeLogRecord({
+            'name': 'gateway',
+            'levelno': logging.WARNING,
+            'levelname': 'WARNING',
+            'msg': f'Log queue full: dropped {dropped - self._reported} records ({dropped} total)',
+        })
+        self._reported = dropped
+        self._reported_at = time.monotonic()
+        try:
+            self.queue.put_nowait(warning)
+        except queue.Full:
+            pass
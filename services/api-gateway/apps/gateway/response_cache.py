@@ -0,0 +1,201 @@
+import hashlib
+import logging
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+logger = logging.getLogger('gateway')
+
+FRESH = 'fresh'
+STALE = 'stale'
+
+LOCK_POLL_INTERVAL = 0.05
+
+
+def is_cacheable_request(request, match):
+    """Кэшируются только анонимные GET запросы к публичным маршрутам с TTL"""
+    return (
+        match.cache_ttl is not None
+        and match.public
+        and request.method == 'GET'
+        and 'HTTP_AUTHORIZATION' not in request.META
+    )
+
+
+def is_cacheable_response(status_code, headers, body):
+    """Ответ сервиса можно отдавать всем анонимным клиентам"""
+    if status_code != 200 or 'Set-Cookie' in headers:
+        return False
+
+    cache_control = headers.get('Cache-Control', '').lower()
+    if 'no-store' in cache_control or 'private' in cache_control:
+        return False
+
+    return len(body) <= settings.RESPONSE_CACHE_MAX_BODY
+
+
+def make_cache_key(path, query_params):
+    """Ключ кэша: путь и параметры запроса, отсортированные по имени"""
+    query = urlencode(sorted(query_params.lists()), doseq=True)
+    digest = hashlib.sha256(f'{path}?{query}'.encode()).hexdigest()
+    return f'response:{digest}'
+
+
+def build_entry(status_code, headers, body, ttl):
+    etag = headers.get('ETag') or f'"{hashlib.sha1(body).hexdigest()}"'
+    return {
+        'status': status_code,
+        'content_type': headers.get('Content-Type', 'application/json'),
+        'body': body,
+        'etag': etag,
+        'stored_at': time.time(),
+        'ttl': ttl,
+    }
+
+
+def etag_matches(request, etag):
+    if_none_match = request.headers.get('If-None-Match')
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+
+def build_cached_response(request, entry, cache_status):
+    """Ответ из записи кэша; 304 - если у клиента уже есть эта версия"""
+    age = int(time.time() - entry['stored_at'])
+
+    if etag_matches(request, entry['etag']):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(entry['body'], status=entry['status'], content_type=entry['content_type'])
+
+    response['ETag'] = entry['etag']
+    response['Age'] = age
+    response['Cache-Control'] = f'public, max-age={max(entry["ttl"] - age, 0)}'
+    response['X-Cache'] = cache_status
+    return response
+
+
+class ResponseCache:
+    """
+    Кэш ответов в Redis с stale-while-revalidate и объединением запросов
+    Запись живет ttl + stale секунд: после ttl она отдается как устаревшая,
+    пока один воркер обновляет ее в фоне. При промахе в сервис идет только
+    один запрос на ключ, остальные ждут его результат
+    """
+
+    def __init__(self, stale, lock_timeout):
+        self.stale = stale
+        self.lock_timeout = lock_timeout
+
+    def get(self, key):
+        try:
+            return cache.get(key)
+        except Exception as e:
+            # Недоступность Redis не должна ломать проксирование
+            logger.warning(f'Response cache read failed: {str(e)}')
+            return None
+
+    def set(self, key, entry):
+        try:
+            cache.set(key, entry, timeout=entry['ttl'] + self.stale)
+        except Exception as e:
+            logger.warning(f'Response cache write failed: {str(e)}')
+
+    def freshness(self, entry):
+        if entry is None:
+            return None
+        age = time.time() - entry['stored_at']
+        if age < entry['ttl']:
+            return FRESH
+        if age < entry['ttl'] + self.stale:
+            return STALE
+        return None
+
+    def acquire_lock(self, key):
+        """Право запросить ответ у сервиса для ключа"""
+        try:
+            return cache.add(f'{key}:lock', 1, timeout=self.lock_timeout)
+        except Exception as e:
+            logger.warning(f'Response cache lock failed: {str(e)}')
+            return True
+
+    def release_lock(self, key):
+        try:
+            cache.delete(f'{key}:lock')
+        except Exception as e:
+            logger.warning(f'Response cache unlock failed: {str(e)}')
+
+    def poll(self, key):
+        """Запись и признак, что блокировка ключа еще занята (одним запросом в Redis)"""
+        lock_key = f'{key}:lock'
+        try:
+            values = cache.get_many([key, lock_key])
+        except Exception as e:
+            logger.warning(f'Response cache read failed: {str(e)}')
+            return None, False
+        return values.get(key), lock_key in values
+
+    def wait_for(self, key):
+        """
+        Дождаться свежей записи, которую запрашивает другой запрос
+        Блокировка снята без записи (ответ не кэшируется: 404, 500, Set-Cookie) -
+        ждать нечего, запрос сразу идет в сервис
+        """
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry, locked = self.poll(key)
+            if self.freshness(entry) == FRESH:
+                return entry
+            if not locked:
+                return None
+        return None
+
+    def lookup(self, request, key, fetch):
+        """
+        Ответ из кэша или None, если запрос нужно отправить в сервис
+        Второе значение - запрос получил блокировку ключа и должен сохранить ответ
+        fetch - функция без аргументов для фонового обновления устаревшей записи
+        """
+        entry = self.get(key)
+        state = self.freshness(entry)
+
+        if state == FRESH:
+            return build_cached_response(request, entry, 'HIT'), False
+        if state == STALE:
+            self.refresh_in_background(key, fetch)
+            return build_cached_response(request, entry, 'STALE'), False
+
+        if self.acquire_lock(key):
+            return None, True
+
+        # Этот ключ уже запрашивает другой запрос - ждем его результат
+        entry = self.wait_for(key)
+        if entry is not None:
+            return build_cached_response(request, entry, 'HIT'), False
+        return None, False
+
+    def refresh_in_background(self, key, fetch):
+        """Обновить устаревшую запись в фоне (один поток на ключ во всех воркерах)"""
+        if not self.acquire_lock(key):
+            return
+        threading.Thread(target=self._refresh, args=(key, fetch), daemon=True).start()
+
+    def _refresh(self, key, fetch):
+        try:
+            entry = fetch()
+            if entry is not None:
+                self.set(key, entry)
+        except Exception as e:
+            logger.error(f'Response cache refresh failed: {str(e)}')
+        finally:
+            self.release_lock(key)
+
+
+RESPONSE_CACHE = ResponseCache(settings.RESPONSE_CACHE_STALE, settings.RESPONSE_CACHE_LOCK_TIMEOUT)
@@ -1,3 +1,6 @@
+from collections import namedtuple
+from urllib.parse import urlencode
+
 from django.conf import settings
 
 # Маппинг путей к сервисам
@@ -5,7 +8,7 @@ SERVICE_ROUTES = {
     '/api/auth/': settings.USER_SERVICE_URL,
     '/api/users/': settings.USER_SERVICE_URL,
     '/api/profile/': settings.USER_SERVICE_URL,
-    
+
     '/api/orders/': settings.FREELANCE_SERVICE_URL,
     '/api/gigs/': settings.FREELANCE_SERVICE_URL,
     '/api/reviews/': settings.FREELANCE_SERVICE_URL,
@@ -15,43 +18,171 @@ SERVICE_ROUTES = {
     '/api/search/': settings.FREELANCE_SERVICE_URL,
     '/api/analytics/': settings.FREELANCE_SERVICE_URL,
     '/api/disputes/': settings.FREELANCE_SERVICE_URL,
-    
+
     '/api/notifications/': settings.NOTIFICATION_SERVICE_URL,
-    
+
     '/api/posts/': settings.CONTENT_SERVICE_URL,
     '/api/categories/': settings.CONTENT_SERVICE_URL,
     '/api/comments/': settings.CONTENT_SERVICE_URL,
 }
 
+# Пути которые не требуют аутентификации
+PUBLIC_PATHS = [
+    '/api/auth/login/',
+    '/api/auth/register/',
+    '/api/auth/refresh/',
+    '/api/gigs/',
+    '/api/search/',
+    '/api/posts/',
+    '/health/',
+]
+
+# Политика rate limiting: token bucket на limit запросов за window секунд,
+# burst - емкость корзины (сколько запросов можно сделать подряд)
+RateLimitPolicy = namedtuple('RateLimitPolicy', ['scope', 'limit', 'window', 'burst'])
+
+DEFAULT_RATE_LIMIT = RateLimitPolicy(
+    'default',
+    settings.RATE_LIMIT_REQUESTS,
+    settings.RATE_LIMIT_WINDOW,
+    settings.RATE_LIMIT_BURST
+)
+
+# Отдельные лимиты для маршрутов (самый длинный префикс)
+RATE_LIMIT_ROUTES = {
+    prefix: RateLimitPolicy(prefix, *params)
+    for prefix, params in settings.RATE_LIMIT_ROUTES.items()
+}
+
+# TTL кэша ответов для публичных GET маршрутов (секунд)
+RESPONSE_CACHE_ROUTES = dict(settings.RESPONSE_CACHE_ROUTES)
+
+
+def strip_duplicate_api_prefix(path):
+    """
+    Убрать gateway префикс из пути
+    Например: /api/users/api/profile/ -> /api/profile/
+    /api/auth/login/ -> /api/auth/login/ (остается как есть)
+    """
+    first = path.find('/api/')
+    if first == -1:
+        return path
+    second = path.find('/api/', first + len('/api/'))
+    if second == -1:
+        return path
+    # Есть дубликат /api/ - берем все начиная со второго вхождения
+    return path[second:]
+
+
+# Результат поиска маршрута: сервис, правило переписывания пути,
+# политика доступа, лимит запросов и TTL кэша ответов (None - не кэшируется)
+RouteMatch = namedtuple(
+    'RouteMatch',
+    ['service_url', 'route_prefix', 'rewrite', 'public', 'rate_limit', 'cache_ttl']
+)
+
+NO_ROUTE = RouteMatch(None, None, strip_duplicate_api_prefix, False, DEFAULT_RATE_LIMIT, None)
+
+
+class _Node:
+    __slots__ = ('children', 'service_url', 'route_prefix', 'public', 'rate_limit', 'cache_ttl', 'match')
+
+    def __init__(self):
+        self.children = {}
+        self.service_url = None
+        self.route_prefix = None
+        self.public = None
+        self.rate_limit = None
+        self.cache_ttl = None
+        self.match = NO_ROUTE
+
+
+class RouteTable:
+    """
+    Префиксное дерево маршрутов по сегментам пути
+    Строится один раз при старте; поиск зависит от глубины пути,
+    а не от количества маршрутов
+    """
+
+    def __init__(self, routes, public_paths, rate_limits=None, cache_ttls=None,
+                 rewrite=strip_duplicate_api_prefix):
+        self.root = _Node()
+        self.rewrite = rewrite
+
+        for prefix, service_url in routes.items():
+            node = self._insert(prefix)
+            node.service_url = service_url
+            node.route_prefix = prefix
+
+        for prefix in public_paths:
+            self._insert(prefix).public = True
+
+        for prefix, policy in (rate_limits or {}).items():
+            self._insert(prefix).rate_limit = policy
+
+        for prefix, ttl in (cache_ttls or {}).items():
+            self._insert(prefix).cache_ttl = ttl
+
+        self._compile(self.root, NO_ROUTE)
+
+    def _insert(self, prefix):
+        node = self.root
+        for segment in self._segments(prefix):
+            node = node.children.setdefault(segment, _Node())
+        return node
+
+    def _compile(self, node, inherited):
+        """Заранее вычислить итоговый маршрут каждого узла (самый длинный префикс)"""
+        service_url, route_prefix = inherited.service_url, inherited.route_prefix
+        if node.service_url is not None:
+            service_url, route_prefix = node.service_url, node.route_prefix
+
+        public = inherited.public if node.public is None else node.public
+        rate_limit = inherited.rate_limit if node.rate_limit is None else node.rate_limit
+        cache_ttl = inherited.cache_ttl if node.cache_ttl is None else node.cache_ttl
+
+        node.match = RouteMatch(service_url, route_prefix, self.rewrite, public, rate_limit, cache_ttl)
+        for child in node.children.values():
+            self._compile(child, node.match)
+
+    @staticmethod
+    def _segments(path):
+        # Учитываются только сегменты, за которыми идет '/': префикс '/api/gigs/'
+        # совпадает с '/api/gigs/1/', но не с '/api/gigs' - как и str.startswith
+        return path.split('/')[1:-1]
+
+    def resolve(self, path):
+        """Найти маршрут с самым длинным совпадающим префиксом"""
+        node = self.root
+        for segment in self._segments(path):
+            child = node.children.get(segment)
+            if child is None:
+                break
+            node = child
+        return node.match
+
+
+ROUTE_TABLE = RouteTable(SERVICE_ROUTES, PUBLIC_PATHS, RATE_LIMIT_ROUTES, RESPONSE_CACHE_ROUTES)
+
+
+def resolve(path):
+    """Определить сервис, правило переписывания пути, политику доступа, лимит и TTL кэша"""
+    return ROUTE_TABLE.resolve(path)
+
+
 def get_service_url(path):
     """Определить URL сервиса по пути запроса"""
-    
-    for route_prefix, service_url in SERVICE_ROUTES.items():
-        if path.startswith(route_prefix):
-            return service_url, route_prefix
-    return None, None
-        
-def build_target_url(service_url, path, route_prefix, query_params=None):
+    match = resolve(path)
+    return match.service_url, match.route_prefix
+
+
+def build_target_url(match, path, query_params=None):
     """Построить полный URL для запроса к сервису"""
-    
-    # Убираем gateway префикс из пути
-    # Например: /api/users/profile/ -> /api/profile/
-    # /api/auth/login/ -> /api/auth/login/ (остается как есть)
-    
-    # Если путь содержит дублирование /api/, убираем первое вхождение
-    parts = path.split('/api/', 2)
-    if len(parts) > 2:
-        # Есть дубликат /api/ - берем последнюю часть
-        target_path = '/api/' + parts[-1]
-    else:
-        # Нет дубликата - используем путь как есть
-        target_path = path
-    
-    target_url = f'{service_url}{target_path}'
-    
+
+    target_url = f'{match.service_url}{match.rewrite(path)}'
+
     if query_params:
-        from urllib.parse import urlencode
         query_string = urlencode(query_params)
         target_url = f'{target_url}?{query_string}'
-    
+
     return target_url
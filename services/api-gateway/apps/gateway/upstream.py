@@ -0,0 +1,138 @@
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+from .router import SERVICE_ROUTES
+
+
+class UpstreamPool:
+    """Пул keep-alive соединений к одному микросервису"""
+
+    def __init__(self, service_url, max_connections, keepalive_timeout):
+        self.service_url = service_url
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+
+        self.adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max_connections,
+            pool_block=settings.UPSTREAM_POOL_BLOCK,
+            max_retries=0
+        )
+
+        self.session = requests.Session()
+        self.session.trust_env = False
+        # Сессия общая для всех клиентов - куки сервисов не должны
+        # утекать между запросами разных пользователей
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+
+        self._lock = threading.Lock()
+        self._last_used = time.monotonic()
+        self._in_flight = 0
+        self.requests_total = 0
+        self.idle_resets = 0
+
+    def request(self, method, url, **kwargs):
+        """Выполнить запрос через пул"""
+        self._acquire()
+        try:
+            return self.session.request(method, url, **kwargs)
+        finally:
+            self._release()
+
+    def _acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            # Простаивающие дольше keep-alive соединения скорее всего уже
+            # закрыты сервисом - сбрасываем их, чтобы не ловить RST на запросе
+            if self._in_flight == 0 and now - self._last_used > self.keepalive_timeout:
+                self.adapter.poolmanager.clear()
+                self.idle_resets += 1
+            self._in_flight += 1
+            self.requests_total += 1
+            self._last_used = now
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+            self._last_used = time.monotonic()
+
+    def stats(self):
+        """Статистика пула для health check"""
+        connections_created = 0
+        idle_connections = 0
+
+        for key in self.adapter.poolmanager.pools.keys():
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            connections_created += pool.num_connections
+            idle_connections += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+
+        return {
+            'max_connections': self.max_connections,
+            'keepalive_timeout': self.keepalive_timeout,
+            'in_flight': self._in_flight,
+            'idle_connections': idle_connections,
+            'connections_created': connections_created,
+            'requests_total': self.requests_total,
+            'idle_resets': self.idle_resets,
+        }
+
+
+def create_pool(service_url):
+    return UpstreamPool(
+        service_url,
+        max_connections=settings.UPSTREAM_POOL_MAXSIZE,
+        keepalive_timeout=settings.UPSTREAM_KEEPALIVE_TIMEOUT
+    )
+
+
+# По одному пулу на каждый сервис из SERVICE_ROUTES
+UPSTREAM_POOLS = {
+    service_url: create_pool(service_url)
+    for service_url in set(SERVICE_ROUTES.values())
+}
+
+
+def get_pool(service_url):
+    """Получить пул соединений для сервиса"""
+    pool = UPSTREAM_POOLS.get(service_url)
+    if pool is None:
+        pool = UPSTREAM_POOLS.setdefault(service_url, create_pool(service_url))
+    return pool
+
+
+def get_pools_stats():
+    """Статистика всех пулов"""
+    return {service_url: pool.stats() for service_url, pool in UPSTREAM_POOLS.items()}
+
+
+# Async-клиенты для ASGI режима. Соединения httpx привязаны к event loop,
+# поэтому клиенты создаются лениво - уже внутри цикла воркера
+ASYNC_CLIENTS = {}
+
+
+def get_async_client(service_url):
+    """Получить async-клиент с пулом соединений для сервиса"""
+    client = ASYNC_CLIENTS.get(service_url)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.UPSTREAM_POOL_MAXSIZE,
+                max_keepalive_connections=settings.UPSTREAM_POOL_MAXSIZE,
+                keepalive_expiry=settings.UPSTREAM_KEEPALIVE_TIMEOUT
+            ),
+            timeout=30,
+            trust_env=False
+        )
+        client.cookies.jar.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        client = ASYNC_CLIENTS.setdefault(service_url, client)
+    return client
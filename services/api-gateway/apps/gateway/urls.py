@@ -1,11 +1,15 @@
+from django.conf import settings
 from django.urls import path, re_path
 from . import views
    
 app_name = 'gateway'
 
+# В ASGI режиме запросы проксируются потоком через async view
+proxy_view = views.proxy_request_async if settings.ASYNC_PROXY else views.proxy_request
+
 urlpatterns = [
     
     path('health/', views.health_check, name='health'),
-    re_path(r'^api/.*$', views.proxy_request, name='proxy'),
+    re_path(r'^api/.*$', proxy_view, name='proxy'),
     
 ]
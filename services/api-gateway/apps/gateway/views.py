@@ -1,20 +1,49 @@
+import time
+from functools import partial
+import httpx
 import requests
-import json
 import logging
-from django.http import JsonResponse, HttpResponse
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-from .router import get_service_url, build_target_url
+from django.conf import settings
+from .router import resolve, build_target_url
+from .upstream import get_pool, get_pools_stats, get_async_client
+from .identity import IDENTITY_HEADERS
+from apps.middleware.request_id_middleware import REQUEST_ID_HEADER
+from .health import HEALTH_SERVICES, get_health
+from .log_handlers import dropped_records
+from .response_cache import (
+    RESPONSE_CACHE, is_cacheable_request, is_cacheable_response, make_cache_key,
+    build_entry, build_cached_response
+)
+from .circuit_breaker import (
+    Probe, get_breaker, get_latency_tracker, is_failure, get_breakers_status, get_timeouts_status
+)
 
 logger = logging.getLogger('gateway')
 
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Hop-by-hop заголовки относятся к конкретному соединению и не проксируются.
+# Set-Cookie сервисов клиенту не передаем (как и в sync режиме),
+# Content-Type выставляется при создании ответа, Server и Date - ASGI сервером
+EXCLUDED_RESPONSE_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailer', 'transfer-encoding', 'upgrade', 'set-cookie', 'content-type',
+    'server', 'date',
+}
+
 
 @csrf_exempt
 @require_http_methods(['GET', 'POST', 'PUT', 'PATCH', 'DELETE'])
 def proxy_request(request):
     """Универсальный прокси для всех запросов к микросервисам"""
     
-    service_url, route_prefix = get_service_url(request.path)
+    # Маршрут уже найден JWTAuthMiddleware - повторно дерево не обходим
+    match = getattr(request, 'route', None) or resolve(request.path)
+    service_url = match.service_url
     
     if not service_url:
         return JsonResponse({
@@ -23,47 +52,98 @@ def proxy_request(request):
         }, status=404)
     
     target_url = build_target_url(
-        service_url,
+        match,
         request.path,
-        route_prefix,
         request.GET.dict() if request.GET else None
     )
     
-    logger.info(f'Proxying {request.method} {request.path} -> {target_url}')
+    logger.debug(f'Proxying {request.method} {request.path} -> {target_url}')
     
     headers = prepare_headers(request)
-    body = prepare_body(request)
     
-    try:
-        response = make_request(
-            request.method,
-            target_url,
-            headers,
-            body
-        )
-        
-        return create_response(response)
+    if not is_cacheable_request(request, match):
+        return forward_request(request, match, target_url, headers)
     
-    except requests.ConnectionError:
-        logger.error(f'Service unavailable: {service_url}')
-        return JsonResponse({
-            'success': False,
-            'error': 'Сервис временно недоступен'
-        }, status=503)
+    # Публичный GET без токена - ответ одинаковый для всех, отдаем из кэша
+    cache_key = make_cache_key(request.path, request.GET)
+    headers = strip_conditional_headers(headers)
+    fetch = partial(fetch_cache_entry, match, target_url, headers)
     
-    except requests.Timeout:
-        logger.error(f'Service timeout: {service_url}')
-        return JsonResponse({
-            'success': False,
-            'error': 'Превышено время ожидания ответа'
-        }, status=504)
+    cached, owns_lock = RESPONSE_CACHE.lookup(request, cache_key, fetch)
+    if cached is not None:
+        return cached
     
-    except Exception as e:
-        logger.error(f'Proxy error: {str(e)}')
-        return JsonResponse({
-            'success': False,
-            'error': 'Внутренняя ошибка сервера'
-        }, status=500)
+    try:
+        return forward_request(request, match, target_url, headers, cache_key)
+    finally:
+        if owns_lock:
+            RESPONSE_CACHE.release_lock(cache_key)
+
+
+def forward_request(request, match, target_url, headers, cache_key=None):
+    """Отправить запрос в сервис; cache_key - сохранить кэшируемый ответ"""
+    service_url = match.service_url
+    request.upstream = service_url
+    
+    breaker = get_breaker(service_url)
+    permit = breaker.allow_request()
+    if not permit:
+        return service_unavailable(service_url)
+    
+    # Пробный запрос освобождается, даже если до record дело не дошло
+    try:
+        tracker = get_latency_tracker(match.route_prefix)
+        body = prepare_body(request)
+        started = time.monotonic()
+        
+        try:
+            response = make_request(
+                request.method,
+                target_url,
+                headers,
+                body,
+                service_url,
+                tracker.timeout
+            )
+            
+            elapsed = time.monotonic() - started
+            request.upstream_ms = elapsed * 1000
+            tracker.observe(elapsed)
+            breaker.record(not is_failure(response.status_code, elapsed), permit)
+            
+            if cache_key and is_cacheable_response(response.status_code, response.headers, response.content):
+                entry = build_entry(response.status_code, response.headers, response.content, match.cache_ttl)
+                RESPONSE_CACHE.set(cache_key, entry)
+                return build_cached_response(request, entry, 'MISS')
+            
+            return create_response(response)
+        
+        except requests.ConnectionError:
+            breaker.record(False, permit)
+            logger.error(f'Service unavailable: {service_url}')
+            return JsonResponse({
+                'success': False,
+                'error': 'Сервис временно недоступен'
+            }, status=503)
+        
+        except requests.Timeout:
+            tracker.observe(tracker.timeout)
+            breaker.record(False, permit)
+            logger.error(f'Service timeout: {service_url}')
+            return JsonResponse({
+                'success': False,
+                'error': 'Превышено время ожидания ответа'
+            }, status=504)
+        
+        except Exception as e:
+            breaker.record(False, permit)
+            logger.error(f'Proxy error: {str(e)}')
+            return JsonResponse({
+                'success': False,
+                'error': 'Внутренняя ошибка сервера'
+            }, status=500)
+    finally:
+        breaker.release(permit)
 
 
 def prepare_headers(request):
@@ -71,11 +151,24 @@ def prepare_headers(request):
     headers = {}
     
     for key, value in request.headers.items():
-        if key.lower() not in ['host', 'connection', 'content-length']:
-            headers[key] = value
+        if key.lower() in ['host', 'connection', 'content-length']:
+            continue
+        # Заголовки личности от клиента не принимаем - их выставляет только gateway
+        if key.lower() in IDENTITY_HEADERS:
+            continue
+        # ID запроса передаем уже проверенный RequestIDMiddleware
+        if key.lower() == 'x-request-id':
+            continue
+        headers[key] = value
     
     if 'Content-Type' not in headers:
         headers['Content-Type'] = 'application/json'
+    
+    if getattr(request, 'request_id', None):
+        headers[REQUEST_ID_HEADER] = request.request_id
+    
+    # Подписанная личность пользователя после проверки JWT
+    headers.update(getattr(request, 'identity_headers', {}))
        
     return headers
 
@@ -87,30 +180,73 @@ def prepare_body(request):
     return None
 
 
-def make_request(method, url, headers, body):
-    """Выполнить HTTP запрос к сервису"""
+def strip_conditional_headers(headers):
+    """
+    Условные заголовки клиента в сервис не передаем: для кэша нужен полный ответ,
+    ETag клиента проверяется уже по записи кэша
+    """
+    return {
+        key: value for key, value in headers.items()
+        if key.lower() not in ('if-none-match', 'if-modified-since')
+    }
+
+
+def fetch_cache_entry(match, target_url, headers):
+    """Запросить свежий ответ для записи кэша (фоновое обновление устаревшей записи)"""
+    service_url = match.service_url
+    
+    breaker = get_breaker(service_url)
+    permit = breaker.allow_request()
+    if not permit:
+        return None
+    
+    try:
+        tracker = get_latency_tracker(match.route_prefix)
+        started = time.monotonic()
+        
+        try:
+            response = make_request('GET', target_url, headers, None, service_url, tracker.timeout)
+        except requests.RequestException:
+            breaker.record(False, permit)
+            raise
+        
+        elapsed = time.monotonic() - started
+        tracker.observe(elapsed)
+        breaker.record(not is_failure(response.status_code, elapsed), permit)
+    finally:
+        breaker.release(permit)
+    
+    if not is_cacheable_response(response.status_code, response.headers, response.content):
+        return None
+    return build_entry(response.status_code, response.headers, response.content, match.cache_ttl)
+
+
+def make_request(method, url, headers, body, service_url, timeout):
+    """Выполнить HTTP запрос к сервису через его пул соединений"""
     kwargs = {
         'headers': headers,
-        'timeout': 30
+        'timeout': timeout
     }
     
     if body:
         kwargs['data'] = body
     
-    if method == 'GET':
-        return requests.get(url, **kwargs)
-    elif method == 'POST':
-        return requests.post(url, **kwargs)
-    elif method == 'PUT':
-        return requests.put(url, **kwargs)
-    elif method == 'PATCH':
-        return requests.patch(url, **kwargs)
-    elif method == 'DELETE':
-        return requests.delete(url, **kwargs)
+    return get_pool(service_url).request(method, url, **kwargs)
+
+
+def service_unavailable(service_url):
+    """Быстрый отказ, пока circuit breaker сервиса открыт"""
+    logger.warning(f'Circuit breaker open, request rejected: {service_url}')
+    response = JsonResponse({
+        'success': False,
+        'error': 'Сервис временно недоступен'
+    }, status=503)
+    response['Retry-After'] = settings.CIRCUIT_BREAKER_OPEN_SECONDS
+    return response
 
 
 def create_response(response):
-    """Создать Django response из requests response"""
+    """Создать Django response из requests response (тело передается как есть)"""
     
     if not response.content:
         return HttpResponse(
@@ -118,55 +254,230 @@ def create_response(response):
             content_type='application/json'
         )
     
+    return HttpResponse(
+        response.content,
+        status=response.status_code,
+        content_type=response.headers.get('Content-Type', 'application/json')
+    )
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST', 'PUT', 'PATCH', 'DELETE'])
+async def proxy_request_async(request):
+    """
+    Async прокси для ASGI режима
+    Тела запроса и ответа передаются потоком, без декодирования и буферизации
+    """
+    
+    # Маршрут уже найден JWTAuthMiddleware - повторно дерево не обходим
+    match = getattr(request, 'route', None) or resolve(request.path)
+    service_url = match.service_url
+    
+    if not service_url:
+        return JsonResponse({
+            'success': False,
+            'error': 'Service not found'
+        }, status=404)
+    
+    target_url = build_target_url(
+        match,
+        request.path,
+        request.GET.dict() if request.GET else None
+    )
+    
+    logger.debug(f'Proxying {request.method} {request.path} -> {target_url}')
+    
+    headers = prepare_headers(request)
+    
+    if not is_cacheable_request(request, match):
+        return await forward_request_async(request, match, target_url, headers)
+    
+    cache_key = make_cache_key(request.path, request.GET)
+    headers = strip_conditional_headers(headers)
+    fetch = partial(fetch_cache_entry, match, target_url, headers)
+    
+    cached, owns_lock = await sync_to_async(RESPONSE_CACHE.lookup, thread_sensitive=False)(
+        request, cache_key, fetch
+    )
+    if cached is not None:
+        return cached
+    
     try:
-        data = response.json()
-        return JsonResponse(
-            data,
-            status=response.status_code,
-            safe=False
-        )
-    except json.JSONDecodeError:
-        return HttpResponse(
-            response.content,
-            status=response.status_code,
-            content_type=response.headers.get('Content-Type', 'text/plain')
-        )
+        return await forward_request_async(request, match, target_url, headers, cache_key)
+    finally:
+        if owns_lock:
+            await sync_to_async(RESPONSE_CACHE.release_lock, thread_sensitive=False)(cache_key)
 
 
-@require_http_methods(['GET'])
-def health_check(request):
-    """Проверка здоровья Gateway и всех сервисов"""
-    from django.conf import settings
+async def forward_request_async(request, match, target_url, headers, cache_key=None):
+    """Отправить запрос в сервис; cache_key - сохранить кэшируемый ответ"""
+    service_url = match.service_url
+    request.upstream = service_url
     
-    services_status = {}
-    all_healthy = True
+    breaker = get_breaker(service_url)
+    permit = breaker.allow_request_fast()
+    if not permit:
+        permit = await sync_to_async(breaker.allow_request, thread_sensitive=False)()
+        if not permit:
+            return service_unavailable(service_url)
     
-    services = {
-        'user-service': settings.USER_SERVICE_URL,
-        'freelance-service': settings.FREELANCE_SERVICE_URL,
-        'notification-service': settings.NOTIFICATION_SERVICE_URL,
-        'content-service': settings.CONTENT_SERVICE_URL,
-    }
+    try:
+        return await send_request_async(request, match, target_url, headers, breaker, permit, cache_key)
+    finally:
+        if isinstance(permit, Probe):
+            await sync_to_async(breaker.release, thread_sensitive=False)(permit)
+
+
+async def send_request_async(request, match, target_url, headers, breaker, permit, cache_key):
+    service_url = match.service_url
+    tracker = get_latency_tracker(match.route_prefix)
+    content = None
+    
+    if request.method in ['POST', 'PUT', 'PATCH']:
+        content_length = request.META.get('CONTENT_LENGTH')
+        if content_length:
+            headers['Content-Length'] = content_length
+            content = stream_request_body(request)
+        else:
+            # Без Content-Length WSGI сервисы не прочитают chunked тело
+            content = request.body
+    
+    client = get_async_client(service_url)
+    started = time.monotonic()
+    
+    try:
+        upstream_response = await client.send(
+            client.build_request(
+                request.method, target_url, headers=headers, content=content, timeout=tracker.timeout
+            ),
+            stream=True
+        )
+    
+    except httpx.ConnectError:
+        await record_result(breaker, False, permit)
+        logger.error(f'Service unavailable: {service_url}')
+        return JsonResponse({
+            'success': False,
+            'error': 'Сервис временно недоступен'
+        }, status=503)
+    
+    except httpx.TimeoutException:
+        tracker.observe(tracker.timeout)
+        await record_result(breaker, False, permit)
+        logger.error(f'Service timeout: {service_url}')
+        return JsonResponse({
+            'success': False,
+            'error': 'Превышено время ожидания ответа'
+        }, status=504)
+    
+    except Exception as e:
+        await record_result(breaker, False, permit)
+        logger.error(f'Proxy error: {str(e)}')
+        return JsonResponse({
+            'success': False,
+            'error': 'Внутренняя ошибка сервера'
+        }, status=500)
     
-    for service_name, service_url in services.items():
+    # Задержка до заголовков ответа - тело дальше идет потоком
+    elapsed = time.monotonic() - started
+    request.upstream_ms = elapsed * 1000
+    tracker.observe(elapsed)
+    await record_result(breaker, not is_failure(upstream_response.status_code, elapsed), permit)
+    
+    if cache_key and is_bufferable(upstream_response):
+        # Небольшой ответ для кэша читаем целиком вместо потоковой передачи
         try:
-            response = requests.get(
-                f'{service_url}/api/health/',
-                timeout=5
-            )
-            services_status[service_name] = {
-                'status': 'healthy' if response.status_code == 200 else 'unhealthy',
-                'response_time': response.elapsed.total_seconds()
-            }
-        except Exception as e:
-            services_status[service_name] = {
-                'status': 'unhealthy',
-                'error': str(e)
-            }
-            all_healthy = False
+            body = await upstream_response.aread()
+        finally:
+            await upstream_response.aclose()
+        
+        if is_cacheable_response(upstream_response.status_code, upstream_response.headers, body):
+            entry = build_entry(upstream_response.status_code, upstream_response.headers, body, match.cache_ttl)
+            await sync_to_async(RESPONSE_CACHE.set, thread_sensitive=False)(cache_key, entry)
+            return build_cached_response(request, entry, 'MISS')
+        
+        response = HttpResponse(
+            body,
+            status=upstream_response.status_code,
+            content_type=upstream_response.headers.get('Content-Type', 'application/json')
+        )
+    else:
+        response = StreamingHttpResponse(
+            stream_response_body(upstream_response),
+            status=upstream_response.status_code,
+            content_type=upstream_response.headers.get('Content-Type', 'application/json')
+        )
+    
+    for key, value in upstream_response.headers.items():
+        if key.lower() not in EXCLUDED_RESPONSE_HEADERS:
+            response[key] = value
     
-    return JsonResponse({
+    return response
+
+
+def is_bufferable(upstream_response):
+    """Ответ можно прочитать целиком для кэша: 200, известный размер, без сжатия"""
+    content_length = upstream_response.headers.get('Content-Length')
+    return (
+        upstream_response.status_code == 200
+        and content_length is not None
+        and int(content_length) <= settings.RESPONSE_CACHE_MAX_BODY
+        and 'Content-Encoding' not in upstream_response.headers
+    )
+
+
+async def record_result(breaker, success, permit):
+    """Учесть результат запроса; в Redis - только когда счетчики пора отправить"""
+    pending = breaker.count(success, permit)
+    if pending is not None:
+        await sync_to_async(breaker.flush, thread_sensitive=False)(*pending)
+
+
+async def stream_request_body(request):
+    """
+    Отдать тело запроса httpx частями
+    ASGIHandler уже принял тело: до FILE_UPLOAD_MAX_MEMORY_SIZE оно в памяти,
+    больше - во временном файле, который читаем в потоке, не блокируя event loop
+    """
+    in_memory = int(request.META.get('CONTENT_LENGTH') or 0) <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+    read = sync_to_async(request.read, thread_sensitive=False)
+    while True:
+        chunk = request.read(STREAM_CHUNK_SIZE) if in_memory else await read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def stream_response_body(upstream_response):
+    """Отдавать сырое тело ответа сервиса частями по мере получения"""
+    try:
+        async for chunk in upstream_response.aiter_raw(STREAM_CHUNK_SIZE):
+            yield chunk
+    finally:
+        await upstream_response.aclose()
+
+
+@require_http_methods(['GET'])
+def health_check(request):
+    """
+    Проверка здоровья Gateway и всех сервисов
+    ?deep=1 - сервисы дополнительно сообщают задержку БД и Redis
+    """
+    deep = request.GET.get('deep', '').lower() in ('1', 'true')
+    report = get_health(deep)
+    all_healthy = report['all_healthy']
+    
+    data = {
         'status': 'healthy' if all_healthy else 'degraded',
         'gateway': 'healthy',
-        'services': services_status
-    }, status=200 if all_healthy else 503)
+        'services': report['services'],
+        'checked_at': report['checked_at'],
+        'upstream_pools': get_pools_stats(),
+        'circuit_breakers': get_breakers_status(set(HEALTH_SERVICES.values())),
+        'timeouts': get_timeouts_status(),
+        'dropped_log_records': dropped_records()
+    }
+    if deep:
+        data['redis'] = report['redis']
+    
+    return JsonResponse(data, status=200 if all_healthy else 503)
@@ -1,39 +1,87 @@
 import jwt
+import hashlib
 import logging
+import threading
+import time
+from collections import OrderedDict
 from django.http import JsonResponse
 from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
+from apps.gateway.router import resolve
+from apps.gateway.identity import build_identity_headers
 
 logger = logging.getLogger('gateway')
 
-# Пути которые не требуют аутентификации
-PUBLIC_PATHS = [
-    '/api/auth/login/',
-    '/api/auth/register/',
-    '/api/auth/refresh/',
-    '/api/gigs/',
-    '/api/search/',
-    '/api/posts/',
-    '/health/',
-]
-
 
 def is_public_path(path):
     """Проверить является ли путь публичным"""
-    for public_path in PUBLIC_PATHS:
-        if path.startswith(public_path):
-            return True
-    return False
+    return resolve(path).public
+
+
+class VerifiedTokenCache:
+    """
+    Ограниченный LRU кэш проверенных токенов: sha256 токена -> claims
+    Запись живет не дольше exp токена
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+
+            payload, identity_headers = entry
+            exp = payload.get('exp')
+            if exp is not None and exp <= time.time():
+                # Истекший токен проверяется заново, чтобы вернуть 'Токен истёк'
+                del self._entries[digest]
+                return None
+
+            self._entries.move_to_end(digest)
+            return entry
+
+    def set(self, digest, payload, identity_headers):
+        with self._lock:
+            self._entries[digest] = (payload, identity_headers)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
 
 
 class JWTAuthMiddleware(MiddlewareMixin):
     def __init__(self, get_response):
         self.get_response = get_response
         super().__init__(get_response)
+        self.token_cache = VerifiedTokenCache(settings.JWT_CACHE_SIZE)
         
     def __call__(self, request):
-        if is_public_path(request.path):
-            return self.get_response(request)
+        if self.async_mode:
+            return self.__acall__(request)
+        
+        response = self.authenticate(request)
+        return response or self.get_response(request)
+    
+    async def __acall__(self, request):
+        response = self.authenticate(request)
+        return response or await self.get_response(request)
+        
+    def authenticate(self, request):
+        """Проверить JWT токен. Возвращает ответ с ошибкой или None"""
+        # Один поиск по таблице маршрутов: политика доступа здесь,
+        # сервис и правило переписывания пути - в proxy view
+        request.route = resolve(request.path)
+        
+        if request.route.public:
+            return None
         
         # Получить токен из заголовка
         auth_header = request.headers.get('Authorization')
@@ -52,30 +100,40 @@ class JWTAuthMiddleware(MiddlewareMixin):
         
         token = auth_header.split(' ')[1]
         
-        # Проверить токен
-        try:
-            payload = jwt.decode(
-                token,
-                settings.JWT_SECRET_KEY,
-                algorithms=[settings.JWT_ALGORITHM]
-            )
-
-            request.user_id = payload.get('user_id')
-            request.user_email = payload.get('email')
-            
-            logger.info(f'Authenticated user: {request.user_id}')
-            
-        except jwt.ExpiredSignatureError:
-            return JsonResponse({
-                'success': False,
-                'error': 'Токен истёк'
-            }, status=401)
+        digest = self.token_cache.digest(token)
+        cached = self.token_cache.get(digest)
+        
+        if cached is not None:
+            payload, identity_headers = cached
+        else:
+            # Проверить токен
+            try:
+                payload = jwt.decode(
+                    token,
+                    settings.JWT_SECRET_KEY,
+                    algorithms=[settings.JWT_ALGORITHM]
+                )
+                
+            except jwt.ExpiredSignatureError:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Токен истёк'
+                }, status=401)
+                
+            except jwt.InvalidTokenError as e:
+                logger.warning(f'Invalid token: {str(e)}')
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Неверный токен'
+                }, status=401)
             
-        except jwt.InvalidTokenError as e:
-            logger.warning(f'Invalid token: {str(e)}')
-            return JsonResponse({
-                'success': False,
-                'error': 'Неверный токен'
-            }, status=401)
+            identity_headers = build_identity_headers(payload)
+            self.token_cache.set(digest, payload, identity_headers)
+        
+        request.user_id = payload.get('user_id')
+        request.user_email = payload.get('email')
+        request.identity_headers = identity_headers
+        
+        logger.debug(f'Authenticated user: {request.user_id}')
         
-        return self.get_response(request)
+        return None
@@ -1,41 +1,79 @@
 import logging
+import random
 import time
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 
-logger = logging.getLogger('gateway')
+access_logger = logging.getLogger('gateway.access')
 
 
 class LoggingMiddleware(MiddlewareMixin):
+    """
+    Access log: одна структурированная запись на запрос
+    Ошибки и медленные запросы пишутся всегда, успешные - выборочно
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
         super().__init__(get_response)
+        self.sample_rate = settings.ACCESS_LOG_SAMPLE_RATE
+        self.slow_ms = settings.ACCESS_LOG_SLOW_MS
         
     def process_request(self, request):
-        """Логировать входящий запрос"""
-        request.start_time = time.time()
-        ip = self.get_client_ip(request)
-
-        logger.info(
-            f'→ {request.method} {request.path} '
-            f'from {ip} '
-            f'User-Agent: {request.META.get("HTTP_USER_AGENT", "Unknown")}'
-        )
-        
+        """Запомнить время начала запроса"""
+        request.start_time = time.monotonic()
         return None
 
     def process_response(self, request, response):
-        """Логировать ответ"""
+        """Записать запрос в access log"""
         if hasattr(request, 'start_time'):
-            duration = time.time() - request.start_time
-            
-            logger.info(
-                f'← {request.method} {request.path} '
-                f'{response.status_code} '
-                f'({duration:.2f}s)'
-            )
+            duration_ms = (time.monotonic() - request.start_time) * 1000
+            sample_rate = self.get_sample_rate(response.status_code, duration_ms)
+
+            if sample_rate is not None:
+                access_logger.info(
+                    f'{request.method} {request.path} {response.status_code}',
+                    extra={'access': self.build_entry(request, response, duration_ms, sample_rate)}
+                )
         
         return response
 
+    async def __acall__(self, request):
+        """Async-режим (ASGI): логирование выполняется без переключения в поток"""
+        self.process_request(request)
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def get_sample_rate(self, status_code, duration_ms):
+        """Доля записываемых запросов этого вида или None, если запрос не попал в выборку"""
+        if status_code >= 400 or duration_ms >= self.slow_ms:
+            return 1.0
+        if self.sample_rate >= 1 or random.random() < self.sample_rate:
+            return self.sample_rate
+        return None
+
+    def build_entry(self, request, response, duration_ms, sample_rate):
+        """Поля записи: сервис, разбивка задержки, статус, клиент"""
+        route = getattr(request, 'route', None)
+        upstream_ms = getattr(request, 'upstream_ms', None)
+
+        return {
+            'request_id': getattr(request, 'request_id', None),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'route': route.route_prefix if route else None,
+            'upstream': getattr(request, 'upstream', None),
+            'duration_ms': round(duration_ms, 2),
+            'upstream_ms': round(upstream_ms, 2) if upstream_ms is not None else None,
+            'gateway_ms': round(duration_ms - (upstream_ms or 0), 2),
+            'cache': response.get('X-Cache'),
+            'user_id': getattr(request, 'user_id', None),
+            'ip': self.get_client_ip(request),
+            'user_agent': request.META.get('HTTP_USER_AGENT'),
+            'sample_rate': sample_rate,
+        }
+
     def get_client_ip(self, request):
         """Получить IP адрес клиента"""
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
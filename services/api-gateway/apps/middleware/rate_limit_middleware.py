@@ -1,42 +1,186 @@
 import logging
-from django.core.cache import cache
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from asgiref.sync import sync_to_async
 from django.http import JsonResponse
 from django.conf import settings
 from django.http.request import HttpRequest
 from django.http.response import HttpResponse
 from django.utils.deprecation import MiddlewareMixin
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from apps.gateway.router import resolve
 
 logger = logging.getLogger('gateway')
 
+# Token bucket за один round trip: пополнение, списание и TTL - атомарно.
+# Пока корзина заполнена больше чем наполовину (клиент далеко от лимита),
+# выдается пачка до ARGV[3] токенов, которую воркер тратит локально
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local lease = tonumber(ARGV[3])
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local granted = 0
+if tokens >= 1 then
+    granted = 1
+    if tokens >= capacity / 2 then
+        granted = math.min(lease, math.floor(tokens))
+    end
+    tokens = tokens - granted
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+
+return {
+    granted,
+    math.floor(tokens),
+    math.ceil((capacity - tokens) / rate),
+    math.ceil((1 - tokens) / rate)
+}
+"""
+
+# Состояние корзины после запроса: remaining - оставшиеся токены,
+# reset - секунд до полного восстановления, retry_after - до следующего токена
+RateLimitState = namedtuple('RateLimitState', ['allowed', 'remaining', 'reset', 'retry_after'])
+
+
+class TokenBucketLimiter:
+    """Token bucket в Redis с локальной арендой токенов"""
+
+    def __init__(self, lease, lease_ttl, max_local_keys=10000):
+        self.lease = max(lease, 1)
+        self.lease_ttl = lease_ttl
+        self.max_local_keys = max_local_keys
+        self._leases = OrderedDict()
+        self._lock = threading.Lock()
+        self._script = None
+
+    @property
+    def script(self):
+        if self._script is None:
+            self._script = get_redis_connection('default').register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
+
+    def take_local(self, key):
+        """Списать токен из локальной аренды без обращения к Redis"""
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is None:
+                return None
+
+            tokens, expires_at, remaining, reset = lease
+            if tokens <= 0 or expires_at < time.monotonic():
+                del self._leases[key]
+                return None
+
+            lease[0] = tokens - 1
+            return RateLimitState(True, remaining + tokens - 1, reset, 0)
+
+    def acquire(self, key, policy):
+        """Списать токен в Redis (один EVALSHA)"""
+        rate = policy.limit / policy.window
+        granted, remaining, reset, retry_after = self.script(
+            keys=[key],
+            args=[rate, policy.burst, self.lease]
+        )
+
+        if granted > 1:
+            # Остаток пачки уже списан в Redis - тратим его локально
+            with self._lock:
+                self._leases[key] = [granted - 1, time.monotonic() + self.lease_ttl, remaining, reset]
+                self._leases.move_to_end(key)
+                while len(self._leases) > self.max_local_keys:
+                    self._leases.popitem(last=False)
+
+        return RateLimitState(granted > 0, remaining + max(granted - 1, 0), reset, retry_after)
+
+
 class RateLimitMiddleware(MiddlewareMixin):
     def __init__(self, get_response):
-        self.get_response = get_response
-        self.requests_limit = settings.RATE_LIMIT_REQUESTS
-        self.window = settings.RATE_LIMIT_WINDOW
-    
+        super().__init__(get_response)
+        self.limiter = TokenBucketLimiter(
+            lease=settings.RATE_LIMIT_LOCAL_LEASE,
+            lease_ttl=settings.RATE_LIMIT_LOCAL_TTL
+        )
+
     def __call__(self, request: HttpRequest) -> HttpResponse:
+        if self.async_mode:
+            return self.__acall__(request)
+
+        policy, cache_key = self.get_bucket(request)
+        state = self.limiter.take_local(cache_key) or self.check_limit(cache_key, policy)
+
+        if state is not None and not state.allowed:
+            return self.limit_exceeded(request, policy, state)
+
+        response = self.get_response(request)
+        return self.add_headers(response, policy, state)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponse:
+        policy, cache_key = self.get_bucket(request)
+        state = self.limiter.take_local(cache_key)
+
+        if state is None:
+            state = await sync_to_async(self.check_limit, thread_sensitive=False)(cache_key, policy)
+
+        if state is not None and not state.allowed:
+            return self.limit_exceeded(request, policy, state)
+
+        response = await self.get_response(request)
+        return self.add_headers(response, policy, state)
+
+    def get_bucket(self, request):
+        """Политика маршрута и ключ корзины: отдельная для пользователя или IP"""
+        route = getattr(request, 'route', None) or resolve(request.path)
+        policy = route.rate_limit
+
+        user_id = getattr(request, 'user_id', None)
+        identity = f'user:{user_id}' if user_id else f'ip:{self.get_client_ip(request)}'
+
+        return policy, f'gateway:rate_limit:{policy.scope}:{identity}'
+
+    def check_limit(self, cache_key, policy):
+        try:
+            return self.limiter.acquire(cache_key, policy)
+        except RedisError as e:
+            # Недоступность Redis не должна останавливать весь трафик
+            logger.warning(f'Rate limit check skipped: {str(e)}')
+            return None
+
+    def add_headers(self, response, policy, state):
+        if state is not None:
+            response['X-RateLimit-Limit'] = policy.burst
+            response['X-RateLimit-Remaining'] = state.remaining
+            response['X-RateLimit-Reset'] = state.reset
+        return response
+
+    def limit_exceeded(self, request, policy, state):
+        logger.warning(f'Rate limit exceeded for {self.get_client_ip(request)} ({policy.scope})')
+        response = JsonResponse({
+            'success': False,
+            'error': f'Превышен лимит запросов. Максимум {policy.limit} запросов в {policy.window} секунд.'
+        }, status=429)
+        response['Retry-After'] = state.retry_after
+        return self.add_headers(response, policy, state)
 
-        ip = self.get_client_ip(request)
-        
-        cache_key = f'rate_limit:{ip}'
-        
-        request_count = cache.get(cache_key, 0)
-        
-        if request_count >= self.requests_limit:
-            logger.warning(f'Rate limit exceeded for {ip}')
-            return JsonResponse({
-                'success': False,
-                'error': f'Превышен лимит запросов. Максимум {self.requests_limit} запросов в {self.window} секунд.'
-            }, status=429)
-
-        cache.set(cache_key, request_count + 1, timeout=self.window)
-        
-        return self.get_response(request)
-    
     def get_client_ip(self, request):
         """Получить IP адресс клиента"""
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        
+
         if x_forwarded_for:
             ip = x_forwarded_for.split(',')[0]
         else:
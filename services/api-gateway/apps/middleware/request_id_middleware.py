@@ -0,0 +1,52 @@
+import re
+import time
+import uuid
+from django.utils.deprecation import MiddlewareMixin
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# ID от клиента принимаем только в безопасном формате, иначе создаем свой
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,128}$')
+
+
+class RequestIDMiddleware(MiddlewareMixin):
+    """
+    X-Request-ID для сквозной корреляции запроса между gateway и сервисами
+    и Server-Timing с разбивкой времени: gateway, сервис, всего
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        super().__init__(get_response)
+
+    def process_request(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        request.request_id = request_id
+        request.timing_start = time.monotonic()
+        return None
+
+    def process_response(self, request, response):
+        request_id = getattr(request, 'request_id', None)
+        if request_id is None:
+            return response
+
+        total_ms = (time.monotonic() - request.timing_start) * 1000
+        upstream_ms = getattr(request, 'upstream_ms', None)
+
+        timings = [f'gateway;dur={total_ms - (upstream_ms or 0):.1f}']
+        if upstream_ms is not None:
+            timings.append(f'upstream;dur={upstream_ms:.1f}')
+        timings.append(f'total;dur={total_ms:.1f}')
+
+        response[REQUEST_ID_HEADER] = request_id
+        response['Server-Timing'] = ', '.join(timings)
+        return response
+
+    async def __acall__(self, request):
+        """Async-режим (ASGI): без переключения в поток"""
+        self.process_request(request)
+        response = await self.get_response(request)
+        return self.process_response(request, response)
@@ -0,0 +1,83 @@
+"""
+Микро-бенчмарк поиска маршрута в gateway
+
+Сравнивает RouteTable (префиксное дерево) с прежним линейным обходом
+SERVICE_ROUTES + PUBLIC_PATHS при росте таблицы маршрутов.
+
+Запуск из каталога api-gateway:
+    python benchmarks/router_benchmark.py
+"""
+import os
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from apps.gateway.router import SERVICE_ROUTES, PUBLIC_PATHS, RouteTable  # noqa: E402
+
+NUMBER = 20_000
+REPEAT = 3
+
+# Пути из реального трафика: первый маршрут, последний маршрут, вложенный публичный путь
+PATHS = [
+    '/api/auth/login/',
+    '/api/comments/15/replies/',
+    '/api/gigs/42/reviews/',
+]
+
+
+def linear_lookup(routes, public_paths, path):
+    """Прежняя реализация: два линейных прохода по startswith"""
+    service = None
+    for route_prefix, service_url in routes.items():
+        if path.startswith(route_prefix):
+            service = service_url, route_prefix
+            break
+    public = False
+    for public_path in public_paths:
+        if path.startswith(public_path):
+            public = True
+            break
+    return service, public
+
+
+def grow_routes(factor):
+    """Таблица маршрутов в factor раз больше текущей (синтетические префиксы в начале)"""
+    routes = {}
+    for i in range(factor - 1):
+        for prefix, service_url in SERVICE_ROUTES.items():
+            routes[prefix.replace('/api/', f'/api/x{i}-', 1)] = service_url
+    routes.update(SERVICE_ROUTES)
+    return routes
+
+
+def main():
+    print(f'{"routes":>8} {"linear, ns":>12} {"trie, ns":>10}')
+
+    for factor in (1, 2, 4, 8, 16):
+        routes = grow_routes(factor)
+        table = RouteTable(routes, PUBLIC_PATHS)
+
+        linear = min(timeit.repeat(
+            lambda: [linear_lookup(routes, PUBLIC_PATHS, path) for path in PATHS],
+            number=NUMBER,
+            repeat=REPEAT
+        ))
+        trie = min(timeit.repeat(
+            lambda: [table.resolve(path) for path in PATHS],
+            number=NUMBER,
+            repeat=REPEAT
+        ))
+
+        per_lookup = NUMBER * len(PATHS)
+        print(f'{len(routes):>8} {linear / per_lookup * 1e9:>12.0f} {trie / per_lookup * 1e9:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -25,6 +25,7 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'apps.middleware.request_id_middleware.RequestIDMiddleware',
     'apps.middleware.logging_middleware.LoggingMiddleware',
     'apps.middleware.auth_middleware.JWTAuthMiddleware',
     'apps.middleware.rate_limit_middleware.RateLimitMiddleware',
@@ -74,11 +75,26 @@ MARKETPLACE_SERVICE_URL = os.getenv('MARKETPLACE_SERVICE_URL', 'http://localhost
 
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', SECRET_KEY)
 JWT_ALGORITHM = 'HS256'
+# Размер LRU кэша проверенных токенов
+JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', 10000))
+# Секрет подписи заголовков X-User-* для сервисов (общий с сервисами)
+INTERNAL_AUTH_SECRET = os.getenv('INTERNAL_AUTH_SECRET', JWT_SECRET_KEY)
 
 RATE_LIMIT_REQUESTS = int(os.getenv('RATE_LIMIT_REQUESTS', 1000))
 RATE_LIMIT_WINDOW = int(os.getenv('RATE_LIMIT_WINDOW', 60))
 RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 100))
 
+# Отдельные лимиты для маршрутов: префикс -> (запросов, окно в секундах, burst)
+RATE_LIMIT_ROUTES = {
+    '/api/auth/login/': (20, 60, 5),
+    '/api/auth/register/': (10, 60, 5),
+}
+
+# Локальная аренда токенов: клиент далеко от лимита получает пачку токенов
+# из Redis и тратит их без обращения к Redis, пока аренда не истечет
+RATE_LIMIT_LOCAL_LEASE = int(os.getenv('RATE_LIMIT_LOCAL_LEASE', 10))
+RATE_LIMIT_LOCAL_TTL = float(os.getenv('RATE_LIMIT_LOCAL_TTL', 1.0))
+
 LANGUAGE_CODE = 'ru-ru'
 TIME_ZONE = 'Europe/Moscow'
 USE_I18N = True
@@ -89,18 +105,39 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Access log: одна JSON строка на запрос. Ошибки (4xx/5xx) и запросы дольше
+# ACCESS_LOG_SLOW_MS пишутся всегда, успешные - с вероятностью ACCESS_LOG_SAMPLE_RATE
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv('ACCESS_LOG_SAMPLE_RATE', 1.0))
+ACCESS_LOG_SLOW_MS = int(os.getenv('ACCESS_LOG_SLOW_MS', 1000))
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+# Не чаще раза в столько секунд пишется warning о записях, отброшенных при переполнении очереди
+LOG_DROPPED_WARNING_INTERVAL = int(os.getenv('LOG_DROPPED_WARNING_INTERVAL', 60))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'apps.gateway.log_handlers.JSONFormatter',
+        },
+    },
     'handlers': {
         'console': {
-            'class': 'logging.StreamHandler',
+            'class': 'apps.gateway.log_handlers.QueueLogHandler',
+            'max_size': LOG_QUEUE_SIZE,
+            'dropped_warning_interval': LOG_DROPPED_WARNING_INTERVAL,
+            'formatter': 'json',
         },
     },
     'root': {
         'handlers': ['console'],
         'level': 'INFO',
     },
+    'loggers': {
+        'httpx': {
+            'level': 'WARNING',
+        },
+    },
 }
 
 (BASE_DIR / 'staticfiles').mkdir(exist_ok=True, parents=True)
@@ -108,4 +145,42 @@ LOGGING = {
 SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
 
 REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT', 30))
+
+# Пулы keep-alive соединений к микросервисам (по одному на сервис)
+UPSTREAM_POOL_MAXSIZE = int(os.getenv('UPSTREAM_POOL_MAXSIZE', 50))
+UPSTREAM_POOL_BLOCK = os.getenv('UPSTREAM_POOL_BLOCK', 'False').lower() == 'true'
+UPSTREAM_KEEPALIVE_TIMEOUT = int(os.getenv('UPSTREAM_KEEPALIVE_TIMEOUT', 30))
+
+# Circuit breaker сервисов: открывается, если за окно CIRCUIT_BREAKER_WINDOW секунд
+# доля ошибок (5xx, таймауты, ответы дольше CIRCUIT_BREAKER_SLOW_CALL) достигла порога
+CIRCUIT_BREAKER_FAILURE_RATE = float(os.getenv('CIRCUIT_BREAKER_FAILURE_RATE', 0.5))
+CIRCUIT_BREAKER_MIN_REQUESTS = int(os.getenv('CIRCUIT_BREAKER_MIN_REQUESTS', 20))
+CIRCUIT_BREAKER_WINDOW = int(os.getenv('CIRCUIT_BREAKER_WINDOW', 30))
+CIRCUIT_BREAKER_OPEN_SECONDS = int(os.getenv('CIRCUIT_BREAKER_OPEN_SECONDS', 15))
+CIRCUIT_BREAKER_SLOW_CALL = float(os.getenv('CIRCUIT_BREAKER_SLOW_CALL', 5.0))
+
+# Адаптивный таймаут маршрута: p99 задержки * множитель, но не больше REQUEST_TIMEOUT
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.getenv('ADAPTIVE_TIMEOUT_MULTIPLIER', 3.0))
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv('ADAPTIVE_TIMEOUT_MIN', 1.0))
+ADAPTIVE_TIMEOUT_SAMPLES = int(os.getenv('ADAPTIVE_TIMEOUT_SAMPLES', 500))
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = int(os.getenv('ADAPTIVE_TIMEOUT_MIN_SAMPLES', 100))
+
+# Health check: таймаут опроса сервиса и время жизни результата
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', 2.0))
+HEALTH_CACHE_TTL = float(os.getenv('HEALTH_CACHE_TTL', 5.0))
+
+# Кэш ответов публичных GET маршрутов для анонимных запросов: префикс -> TTL (секунд)
+RESPONSE_CACHE_ROUTES = {
+    '/api/gigs/': 60,
+    '/api/search/': 30,
+    '/api/posts/': 60,
+}
+# Сколько секунд после TTL отдавать устаревший ответ, обновляя его в фоне
+RESPONSE_CACHE_STALE = int(os.getenv('RESPONSE_CACHE_STALE', 30))
+# Сколько ждать ответа, который уже запрашивает другой запрос с тем же ключом
+RESPONSE_CACHE_LOCK_TIMEOUT = float(os.getenv('RESPONSE_CACHE_LOCK_TIMEOUT', 5.0))
+RESPONSE_CACHE_MAX_BODY = int(os.getenv('RESPONSE_CACHE_MAX_BODY', 1024 * 1024))
+
+# Потоковый async прокси (включается по умолчанию при запуске через config.asgi)
+ASYNC_PROXY = os.getenv('ASYNC_PROXY', 'False').lower() == 'true'
 HEALTH_CHECK_ENABLED = os.getenv('HEALTH_CHECK_ENABLED', 'True').lower() == 'true'
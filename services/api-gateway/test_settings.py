@@ -0,0 +1,31 @@
+from config.settings import *
+
+# Кэш ответов в памяти процесса; Redis breaker подменяется fakeredis в тестах
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Отключаем логирование в тестах
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': True,
+    'handlers': {
+        'null': {
+            'class': 'logging.NullHandler',
+        },
+    },
+    'root': {
+        'handlers': ['null'],
+        'level': 'CRITICAL',
+    },
+}
+
+DEBUG = False
+
+SECRET_KEY = 'test-secret-key-for-testing-only'
+
+CIRCUIT_BREAKER_MIN_REQUESTS = 2
+CIRCUIT_BREAKER_FAILURE_RATE = 0.5
+CIRCUIT_BREAKER_OPEN_SECONDS = 30
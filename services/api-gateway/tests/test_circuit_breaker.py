@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import fakeredis
+import pytest
+from django.test import RequestFactory
+
+from apps.gateway import circuit_breaker, views
+from apps.gateway.circuit_breaker import CLOSED, OPEN, CircuitBreaker, LatencyTracker, Probe
+
+SERVICE_URL = 'http://content-service:8000'
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    server = fakeredis.FakeRedis()
+    monkeypatch.setattr(circuit_breaker, 'get_redis_connection', lambda alias: server)
+    return server
+
+
+@pytest.fixture
+def breaker(redis, monkeypatch):
+    """Breaker, открытый дольше CIRCUIT_BREAKER_OPEN_SECONDS - следующий запрос станет пробным"""
+    breaker = CircuitBreaker(SERVICE_URL)
+    monkeypatch.setitem(circuit_breaker.BREAKERS, SERVICE_URL, breaker)
+
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+    breaker.opened_at -= 60
+    return breaker
+
+
+def probe_again(breaker):
+    """Следующая попытка half-open без ожидания FLUSH_INTERVAL"""
+    breaker._next_probe_check = 0
+    return breaker.allow_request()
+
+
+@pytest.fixture
+def match():
+    return SimpleNamespace(service_url=SERVICE_URL, route_prefix='/api/content/')
+
+
+class TestProbe:
+    def test_only_one_probe(self, breaker):
+        assert isinstance(breaker.allow_request(), Probe)
+        assert probe_again(breaker) is False
+
+    def test_probe_success_closes_breaker(self, breaker, redis):
+        permit = breaker.allow_request()
+        breaker.record(True, permit)
+        breaker.release(permit)
+
+        assert breaker.state == CLOSED
+        assert breaker.probe is None
+        assert not redis.exists(breaker.probe_key)
+
+    def test_probe_failure_reopens_breaker(self, breaker):
+        permit = breaker.allow_request()
+        breaker.record(False, permit)
+
+        assert breaker.state == OPEN
+        assert time.time() - breaker.opened_at < 1
+
+    def test_ordinary_result_does_not_consume_probe(self, breaker):
+        permit = breaker.allow_request()
+
+        # Ответ запроса, отправленного до открытия breaker
+        breaker.record(True)
+        assert breaker.probe is permit
+        assert breaker.state == OPEN
+
+        breaker.record(True, permit)
+        assert breaker.state == CLOSED
+
+    def test_probe_raising_is_released(self, breaker, redis, match, monkeypatch):
+        monkeypatch.setattr(views, 'prepare_body', Mock(side_effect=RuntimeError('body read failed')))
+        request = RequestFactory().post('/api/content/posts/', data={})
+
+        with pytest.raises(RuntimeError):
+            views.forward_request(request, match, f'{SERVICE_URL}/api/posts/', {})
+
+        assert breaker.probe is None
+        assert not redis.exists(breaker.probe_key)
+        assert isinstance(probe_again(breaker), Probe)
+
+    def test_released_probe_result_is_ignored(self, breaker):
+        permit = breaker.allow_request()
+        breaker.release(permit)
+        next_permit = probe_again(breaker)
+
+        # Запоздалый результат освобожденной пробы не снимает новую
+        breaker.record(True, permit)
+        assert breaker.probe is next_permit
+        assert breaker.state == OPEN
+
+    def test_stale_probe_times_out(self, breaker, redis):
+        permit = breaker.allow_request()
+        permit.deadline = time.time() - 1
+        redis.delete(breaker.probe_key)
+
+        next_permit = probe_again(breaker)
+        assert isinstance(next_permit, Probe)
+        assert permit.done
+
+        breaker.record(False, permit)
+        assert breaker.probe is next_permit
+
+
+class TestLatencyTracker:
+    def test_timeout_from_p99(self, settings):
+        settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES = 10
+        tracker = LatencyTracker()
+        for i in range(LatencyTracker.RECALCULATE_EVERY):
+            tracker.observe(0.01 * (i + 1))
+
+        assert tracker.p99 == pytest.approx(0.5)
+        assert tracker.timeout == max(settings.ADAPTIVE_TIMEOUT_MIN, 0.5 * settings.ADAPTIVE_TIMEOUT_MULTIPLIER)
+
+    def test_observe_during_recalculation(self, settings):
+        settings.ADAPTIVE_TIMEOUT_MIN_SAMPLES = 1
+        tracker = LatencyTracker()
+        tracker.RECALCULATE_EVERY = 2
+        threads = []
+
+        class InterleavedDeque(deque):
+            """Посреди чтения выборки другой поток добавляет задержку"""
+
+            def __iter__(self):
+                items = super().__iter__()
+                yield next(items)
+                thread = threading.Thread(target=tracker.observe, args=(0.3,))
+                threads.append(thread)
+                thread.start()
+                thread.join(0.1)
+                yield from items
+
+        tracker._samples = InterleavedDeque([0.1], maxlen=100)
+        tracker._since_recalculate = 1
+        tracker.observe(0.2)
+        threads[0].join()
+
+        assert tracker.p99 == 0.2
+        assert (len(tracker._samples), tracker._samples[-1]) == (3, 0.3)
@@ -0,0 +1,62 @@
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from apps.gateway import health
+from apps.gateway.health import HEALTH_SERVICES, HealthCache
+
+
+@pytest.fixture
+def caches():
+    """Кэши теста; фоновые потоки останавливаются после теста"""
+    created = []
+
+    def make(**kwargs):
+        created.append(HealthCache(**kwargs))
+        return created[-1]
+
+    yield make
+    for cache in created:
+        cache.stop()
+
+
+def report(checked_at):
+    return {'services': {}, 'all_healthy': True, 'checked_at': checked_at}
+
+
+def test_refreshes_in_background(caches, monkeypatch):
+    refreshed = threading.Event()
+    reports = iter(range(3))
+
+    def collect(deep):
+        checked_at = next(reports)
+        if checked_at == 2:
+            refreshed.set()
+        return report(checked_at)
+
+    monkeypatch.setattr(health, 'collect_health', collect)
+    cache = caches(ttl=0.05)
+
+    assert cache.get()['checked_at'] == 0
+    assert refreshed.wait(1)
+    assert cache.get()['checked_at'] >= 1
+
+
+def test_slow_check_serves_snapshot(caches, monkeypatch, settings):
+    settings.HEALTH_CHECK_TIMEOUT = 0
+    release = threading.Event()
+    collect = Mock(side_effect=lambda deep: release.wait(5) and report(1))
+    monkeypatch.setattr(health, 'collect_health', collect)
+    cache = caches(ttl=60, deep=True)
+
+    # Первый опрос еще идет - ответ без ожидания, состояние неизвестно
+    pending = cache.get()
+    assert pending['all_healthy'] is False
+    assert set(pending['services']) == set(HEALTH_SERVICES)
+    assert pending['redis'] == {'status': 'unknown'}
+
+    release.set()
+    assert cache._ready.wait(1)
+    assert cache.get() == report(1)
+    assert collect.call_count == 1
@@ -0,0 +1,29 @@
+from apps.gateway.identity import (
+    SIGNATURE_HEADER, USER_CLAIMS_HEADER, build_identity_headers, sign_identity
+)
+
+
+def test_identity_headers_sign_role_claims():
+    payload = {
+        'user_id': 42,
+        'email': 'staff@test.com',
+        'exp': 1767312000,
+        'iat': 1767311100.25,
+        'is_active': True,
+        'is_staff': True,
+        'is_seller': False,
+        'token_type': 'access',
+    }
+    headers = build_identity_headers(payload)
+
+    claims = 'iat=1767311100.25,is_active=1,is_staff=1,is_seller=0'
+    assert headers[USER_CLAIMS_HEADER] == claims
+    assert headers[SIGNATURE_HEADER] == sign_identity(42, 'staff@test.com', 1767312000, claims)
+    assert headers[SIGNATURE_HEADER] != sign_identity(42, 'staff@test.com', 1767312000)
+
+
+def test_identity_headers_without_claims():
+    headers = build_identity_headers({'user_id': 42, 'exp': 1767312000})
+
+    assert headers[USER_CLAIMS_HEADER] == ''
+    assert headers[SIGNATURE_HEADER] == sign_identity(42, '', 1767312000)
@@ -0,0 +1,31 @@
+import logging
+import queue
+
+from apps.gateway import log_handlers
+from apps.gateway.log_handlers import QueueLogHandler, dropped_records
+
+
+def test_dropped_records_counted_and_reported(monkeypatch):
+    monkeypatch.setattr(log_handlers, 'HANDLERS', [])
+    handler = QueueLogHandler(dropped_warning_interval=60)
+    # Очередь без фонового потока: записи остаются в ней
+    handler.queue = queue.Queue(2)
+    record = logging.makeLogRecord({'msg': 'request'})
+
+    for _ in range(4):
+        handler.enqueue(record)
+    assert dropped_records() == 2
+
+    handler.queue.get_nowait()
+    handler.queue.get_nowait()
+    handler.enqueue(record)
+    warning = handler.queue.queue[-1]
+    assert warning.levelno == logging.WARNING
+    assert warning.getMessage() == 'Log queue full: dropped 2 records (2 total)'
+
+    # Следующий warning - не раньше dropped_warning_interval
+    handler.enqueue(record)
+    handler.queue.get_nowait()
+    handler.enqueue(record)
+    assert dropped_records() == 3
+    assert [item.getMessage() for item in handler.queue.queue] == [warning.getMessage(), 'request']
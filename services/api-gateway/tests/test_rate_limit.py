@@ -0,0 +1,111 @@
+import json
+from unittest.mock import Mock
+
+import fakeredis
+import pytest
+from django.http import HttpResponse
+from django.test import RequestFactory
+from redis.exceptions import ConnectionError
+
+from apps.gateway.router import RateLimitPolicy
+from apps.middleware import rate_limit_middleware
+from apps.middleware.rate_limit_middleware import RateLimitMiddleware, TokenBucketLimiter
+
+KEY = 'gateway:rate_limit:test:ip:127.0.0.1'
+# 10 токенов в секунду, корзина на 5
+FAST = RateLimitPolicy('test', 10, 1, 5)
+# Токен в минуту, корзина на 10 - пополнением за время теста можно пренебречь
+SLOW = RateLimitPolicy('test', 1, 60, 10)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    server = fakeredis.FakeRedis()
+    monkeypatch.setattr(rate_limit_middleware, 'get_redis_connection', lambda alias: server)
+    return server
+
+
+def take(limiter, policy):
+    return limiter.take_local(KEY) or limiter.acquire(KEY, policy)
+
+
+def test_burst_then_denied(redis):
+    limiter = TokenBucketLimiter(lease=1, lease_ttl=1)
+
+    states = [limiter.acquire(KEY, FAST) for _ in range(6)]
+
+    assert [state.allowed for state in states] == [True] * 5 + [False]
+    assert [state.remaining for state in states[:5]] == [4, 3, 2, 1, 0]
+    assert states[-1].retry_after == 1
+    assert states[-1].reset == 1
+
+
+def test_refill(redis):
+    limiter = TokenBucketLimiter(lease=1, lease_ttl=1)
+    for _ in range(5):
+        limiter.acquire(KEY, FAST)
+    assert not limiter.acquire(KEY, FAST).allowed
+
+    # 0.3 секунды назад: пополнится 3 токена
+    redis.hset(KEY, 'ts', float(redis.hget(KEY, 'ts')) - 0.3)
+
+    assert [limiter.acquire(KEY, FAST).allowed for _ in range(4)] == [True, True, True, False]
+
+
+def test_lease_spent_locally(redis):
+    limiter = TokenBucketLimiter(lease=3, lease_ttl=60)
+
+    first = limiter.acquire(KEY, SLOW)
+    assert (first.allowed, first.remaining) == (True, 9)
+    assert float(redis.hget(KEY, 'tokens')) == pytest.approx(7, abs=0.01)
+
+    assert [limiter.take_local(KEY).remaining for _ in range(2)] == [8, 7]
+    assert limiter.take_local(KEY) is None
+
+
+def test_expired_lease_not_used(redis):
+    limiter = TokenBucketLimiter(lease=3, lease_ttl=0)
+    limiter.acquire(KEY, SLOW)
+
+    assert limiter.take_local(KEY) is None
+
+
+def test_leases_do_not_overspend_bucket(redis):
+    # Два воркера с арендой делят одну корзину
+    workers = [TokenBucketLimiter(lease=3, lease_ttl=60) for _ in range(2)]
+
+    allowed = 0
+    for i in range(30):
+        if take(workers[i % 2], SLOW).allowed:
+            allowed += 1
+
+    assert allowed == SLOW.burst
+
+
+def middleware(response=None):
+    return RateLimitMiddleware(lambda request: response or HttpResponse('ok'))
+
+
+def test_middleware_denies_with_retry_after(redis):
+    rate_limiter = middleware()
+    request = RequestFactory().get('/api/auth/login/')
+
+    responses = [rate_limiter(request) for _ in range(6)]
+
+    assert [response.status_code for response in responses] == [200] * 5 + [429]
+    assert responses[0]['X-RateLimit-Limit'] == '5'
+    assert responses[-1]['X-RateLimit-Remaining'] == '0'
+    # 20 запросов в 60 секунд: следующий токен через 3 секунды
+    assert responses[-1]['Retry-After'] == '3'
+    assert json.loads(responses[-1].content)['success'] is False
+
+
+def test_middleware_allows_when_redis_fails(monkeypatch):
+    connection = Mock()
+    connection.register_script.return_value = Mock(side_effect=ConnectionError('refused'))
+    monkeypatch.setattr(rate_limit_middleware, 'get_redis_connection', lambda alias: connection)
+
+    response = middleware()(RequestFactory().get('/api/content/posts/'))
+
+    assert response.status_code == 200
+    assert 'X-RateLimit-Limit' not in response
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+from django.core.cache import cache
+from django.test import RequestFactory
+
+from apps.gateway.response_cache import ResponseCache, build_entry, is_cacheable_response
+
+KEY = 'response:test'
+
+
+@pytest.fixture
+def response_cache():
+    cache.clear()
+    return ResponseCache(stale=30, lock_timeout=5)
+
+
+def request(**headers):
+    return RequestFactory().get('/api/content/posts/', headers=headers)
+
+
+def entry(body=b'{"posts": []}', age=0, ttl=10):
+    entry = build_entry(200, {'Content-Type': 'application/json'}, body, ttl)
+    entry['stored_at'] -= age
+    return entry
+
+
+def lookup_in_thread(response_cache, results):
+    thread = threading.Thread(
+        target=lambda: results.append(response_cache.lookup(request(), KEY, fetch=None))
+    )
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize('status_code, headers, body, cacheable', [
+    (200, {}, b'{}', True),
+    (404, {}, b'{}', False),
+    (200, {'Set-Cookie': 'sessionid=1'}, b'{}', False),
+    (200, {'Cache-Control': 'private, max-age=60'}, b'{}', False),
+    (200, {'Cache-Control': 'no-store'}, b'{}', False),
+    (200, {}, b'x' * (1024 * 1024 + 1), False),
+])
+def test_is_cacheable_response(status_code, headers, body, cacheable):
+    assert is_cacheable_response(status_code, headers, body) is cacheable
+
+
+def test_hit(response_cache):
+    response_cache.set(KEY, entry(age=3))
+
+    response, owns_lock = response_cache.lookup(request(), KEY, fetch=None)
+
+    assert not owns_lock
+    assert response.status_code == 200
+    assert response.content == b'{"posts": []}'
+    assert response['X-Cache'] == 'HIT'
+    assert response['Age'] == '3'
+    assert response['Cache-Control'] == 'public, max-age=7'
+
+
+def test_not_modified(response_cache):
+    stored = entry()
+    response_cache.set(KEY, stored)
+
+    response, _ = response_cache.lookup(request(If_None_Match=stored['etag']), KEY, fetch=None)
+
+    assert response.status_code == 304
+    assert response.content == b''
+    assert response['ETag'] == stored['etag']
+
+
+def test_stale_served_and_refreshed_once(response_cache):
+    response_cache.set(KEY, entry(age=15))
+    refreshed = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        refreshed.wait(1)
+        return entry(body=b'{"posts": [1]}')
+
+    first, _ = response_cache.lookup(request(), KEY, fetch)
+    second, _ = response_cache.lookup(request(), KEY, fetch)
+    refreshed.set()
+
+    assert first['X-Cache'] == second['X-Cache'] == 'STALE'
+    assert first.content == b'{"posts": []}'
+    # Одно фоновое обновление на ключ
+    deadline = time.monotonic() + 1
+    while cache.get(f'{KEY}:lock') is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert calls == [1]
+    assert response_cache.get(KEY)['body'] == b'{"posts": [1]}'
+
+
+def test_miss_coalesced(response_cache):
+    assert response_cache.lookup(request(), KEY, fetch=None) == (None, True)
+
+    results = []
+    waiter = lookup_in_thread(response_cache, results)
+    time.sleep(0.1)
+    response_cache.set(KEY, entry())
+    response_cache.release_lock(KEY)
+    waiter.join(1)
+
+    response, owns_lock = results[0]
+    assert not owns_lock
+    assert response['X-Cache'] == 'HIT'
+
+
+def test_uncacheable_response_releases_waiters(response_cache):
+    assert response_cache.lookup(request(), KEY, fetch=None) == (None, True)
+
+    results = []
+    started = time.monotonic()
+    waiter = lookup_in_thread(response_cache, results)
+    time.sleep(0.1)
+    # Ответ 404 не сохраняется - блокировка снимается без записи
+    response_cache.release_lock(KEY)
+    waiter.join(1)
+
+    assert results == [(None, False)]
+    assert time.monotonic() - started < 1
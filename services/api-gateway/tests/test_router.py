@@ -0,0 +1,92 @@
+import pytest
+
+from apps.gateway.router import DEFAULT_RATE_LIMIT, RateLimitPolicy, RouteTable, resolve
+
+USERS = 'http://user-service:8000'
+ADMIN = 'http://admin-service:8000'
+GIGS = 'http://freelance-service:8000'
+
+LOGIN_LIMIT = RateLimitPolicy('/api/auth/login/', 20, 60, 5)
+
+TABLE = RouteTable(
+    routes={
+        '/api/auth/': USERS,
+        '/api/users/': USERS,
+        '/api/users/admin/': ADMIN,
+        '/api/gigs/': GIGS,
+    },
+    public_paths=['/api/auth/login/', '/api/gigs/', '/api/users/public/'],
+    rate_limits={'/api/auth/login/': LOGIN_LIMIT},
+    cache_ttls={'/api/gigs/': 60, '/api/gigs/drafts/': 0},
+)
+
+
+@pytest.mark.parametrize('path, service_url, route_prefix', [
+    ('/api/users/', USERS, '/api/users/'),
+    ('/api/users/5/', USERS, '/api/users/'),
+    # Самый длинный префикс
+    ('/api/users/admin/', ADMIN, '/api/users/admin/'),
+    ('/api/users/admin/stats/', ADMIN, '/api/users/admin/'),
+    ('/api/users/administrators/', USERS, '/api/users/'),
+    # Без завершающего '/' последний сегмент не участвует, как в str.startswith
+    ('/api/gigs/1', GIGS, '/api/gigs/'),
+    ('/api/gigs', None, None),
+    ('/api/users/admin', USERS, '/api/users/'),
+    ('/api/unknown/', None, None),
+    ('/', None, None),
+    ('', None, None),
+])
+def test_longest_prefix(path, service_url, route_prefix):
+    match = TABLE.resolve(path)
+    assert (match.service_url, match.route_prefix) == (service_url, route_prefix)
+
+
+@pytest.mark.parametrize('path, public', [
+    ('/api/auth/login/', True),
+    ('/api/auth/logout/', False),
+    # Дочерние пути наследуют public
+    ('/api/gigs/1/', True),
+    # public может быть задан глубже маршрута
+    ('/api/users/public/5/', True),
+    ('/api/users/5/', False),
+    ('/api/unknown/', False),
+])
+def test_public_inherited(path, public):
+    assert TABLE.resolve(path).public is public
+
+
+@pytest.mark.parametrize('path, cache_ttl', [
+    ('/api/gigs/', 60),
+    ('/api/gigs/1/', 60),
+    # Более длинный префикс переопределяет TTL
+    ('/api/gigs/drafts/', 0),
+    ('/api/gigs/drafts/1/', 0),
+    ('/api/users/', None),
+])
+def test_cache_ttl_override(path, cache_ttl):
+    assert TABLE.resolve(path).cache_ttl == cache_ttl
+
+
+@pytest.mark.parametrize('path, policy', [
+    ('/api/auth/login/', LOGIN_LIMIT),
+    ('/api/auth/login/confirm/', LOGIN_LIMIT),
+    ('/api/auth/register/', DEFAULT_RATE_LIMIT),
+    ('/api/users/', DEFAULT_RATE_LIMIT),
+    ('/api/unknown/', DEFAULT_RATE_LIMIT),
+])
+def test_rate_limit_inherited(path, policy):
+    assert TABLE.resolve(path).rate_limit == policy
+
+
+def test_settings_table():
+    assert resolve('/api/users/5/').rate_limit == DEFAULT_RATE_LIMIT
+    assert resolve('/api/auth/login/').rate_limit.scope == '/api/auth/login/'
+    assert resolve('/api/gigs/1/').public
+    assert resolve('/api/gigs/1/').cache_ttl == 60
+
+
+def test_rewrite_strips_duplicate_prefix():
+    match = TABLE.resolve('/api/users/api/profile/')
+    assert match.service_url == USERS
+    assert match.rewrite('/api/users/api/profile/') == '/api/profile/'
+    assert match.rewrite('/api/auth/login/') == '/api/auth/login/'
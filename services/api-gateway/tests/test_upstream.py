@@ -0,0 +1,80 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from apps.gateway import upstream
+from apps.gateway.upstream import UpstreamPool, get_async_client
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Ставит куку и возвращает полученный Cookie и порт клиента (новое соединение - новый порт)"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = json.dumps({'cookie': self.headers.get('Cookie'), 'port': self.client_address[1]}).encode()
+        self.send_response(200)
+        self.send_header('Set-Cookie', f'sessionid=user-{self.path.strip("/")}; Path=/')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def service_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_cookies_not_replayed(service_url):
+    pool = UpstreamPool(service_url, max_connections=2, keepalive_timeout=60)
+
+    first = pool.request('GET', f'{service_url}/1/')
+    assert first.headers['Set-Cookie'].startswith('sessionid=user-1')
+
+    # Следующий запрос (другого клиента) уходит без куки первого
+    second = pool.request('GET', f'{service_url}/2/')
+    assert second.json()['cookie'] is None
+    assert len(pool.session.cookies) == 0
+
+
+def test_async_client_cookies_not_replayed(service_url, monkeypatch):
+    monkeypatch.setattr(upstream, 'ASYNC_CLIENTS', {})
+
+    async def scenario():
+        client = get_async_client(service_url)
+        try:
+            await client.get(f'{service_url}/1/')
+            response = await client.get(f'{service_url}/2/')
+            return response.json()['cookie'], len(client.cookies.jar)
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(scenario()) == (None, 0)
+
+
+def test_idle_reset_opens_new_connection(service_url):
+    pool = UpstreamPool(service_url, max_connections=2, keepalive_timeout=60)
+
+    first = pool.request('GET', f'{service_url}/1/').json()['port']
+    reused = pool.request('GET', f'{service_url}/1/').json()['port']
+    assert reused == first
+    assert pool.idle_resets == 0
+
+    # Простой дольше keepalive_timeout: старые соединения сбрасываются
+    pool._last_used -= 120
+    after_idle = pool.request('GET', f'{service_url}/1/').json()['port']
+
+    assert after_idle != first
+    assert pool.idle_resets == 1
+    assert pool.stats()['requests_total'] == 3
@@ -0,0 +1,23 @@
+import asyncio
+
+import pytest
+from django.test import RequestFactory
+
+from apps.gateway.views import STREAM_CHUNK_SIZE, stream_request_body
+
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+@pytest.mark.parametrize('max_memory_size', [10 * 1024 * 1024, 1024])
+def test_stream_request_body_in_chunks(settings, max_memory_size):
+    # Тело в памяти и во временном файле (читается в потоке)
+    settings.FILE_UPLOAD_MAX_MEMORY_SIZE = max_memory_size
+    body = bytes(range(256)) * (STREAM_CHUNK_SIZE // 128 + 1)
+    request = RequestFactory().post('/api/content/posts/', data=body, content_type='application/octet-stream')
+
+    chunks = asyncio.run(collect(stream_request_body(request)))
+
+    assert b''.join(chunks) == body
+    assert max(len(chunk) for chunk in chunks) == STREAM_CHUNK_SIZE
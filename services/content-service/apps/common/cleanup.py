@@ -0,0 +1,81 @@
+"""
+Удаление данных пользователя по запросу user-service
+
+Записи удаляются частями по USER_CLEANUP_CHUNK_SIZE, каждая часть - в своей
+транзакции: удаление тяжелого аккаунта не держит длинных блокировок, а
+повтор после обрыва продолжает с того, что осталось.
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from apps.comments.models import Comment
+from apps.content.models import Channel
+from apps.interactions.models import CommentLike, Like, View
+from apps.memberships.models import ChannelMembership
+from apps.posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def delete_in_chunks(queryset, chunk_size):
+    """Удалить записи queryset частями; возвращает число удаленных записей queryset"""
+    deleted = 0
+    while ids := list(queryset.order_by().values_list('pk', flat=True)[:chunk_size]):
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+    return deleted
+
+
+def recount_posts(post_ids, chunk_size):
+    """Пересчитать like_count и comment_count постов одним UPDATE на часть"""
+    post_type = ContentType.objects.get_for_model(Post)
+    likes = (
+        Like.objects.filter(content_type=post_type, object_id=OuterRef('pk'))
+        .order_by().values('object_id').annotate(total=Count('pk')).values('total')
+    )
+    comments = (
+        Comment.objects.filter(post=OuterRef('pk'))
+        .order_by().values('post').annotate(total=Count('pk')).values('total')
+    )
+    for i in range(0, len(post_ids), chunk_size):
+        Post.objects.filter(id__in=post_ids[i:i + chunk_size]).update(
+            like_count=Coalesce(Subquery(likes), 0),
+            comment_count=Coalesce(Subquery(comments), 0),
+        )
+
+
+def cleanup_user_data(user_id):
+    """Удалить контент пользователя; возвращает число удаленных записей по типам"""
+    chunk_size = settings.USER_CLEANUP_CHUNK_SIZE
+    post_type = ContentType.objects.get_for_model(Post)
+
+    # Посты других авторов, чьи счетчики изменятся
+    affected_posts = set(
+        Like.objects.filter(user_id=user_id, content_type=post_type).values_list('object_id', flat=True)
+    ) | set(
+        Comment.objects.filter(author_id=user_id).values_list('post_id', flat=True)
+    )
+
+    deleted = {
+        'likes': delete_in_chunks(Like.objects.filter(user_id=user_id), chunk_size),
+        'comment_likes': delete_in_chunks(CommentLike.objects.filter(user_id=user_id), chunk_size),
+        'memberships': delete_in_chunks(ChannelMembership.objects.filter(user_id=user_id), chunk_size),
+        'comments': delete_in_chunks(Comment.objects.filter(author_id=user_id), chunk_size),
+        'posts': delete_in_chunks(Post.objects.filter(author_id=user_id), chunk_size),
+        'channels': delete_in_chunks(Channel.objects.filter(owner_id=user_id), chunk_size),
+    }
+    # Просмотры нужны статистике постов - только обезличиваются
+    views = View.objects.filter(user_id=user_id)
+    while ids := list(views.order_by().values_list('pk', flat=True)[:chunk_size]):
+        View.objects.filter(pk__in=ids).update(user_id=None)
+
+    recount_posts(sorted(affected_posts), chunk_size)
+
+    logger.info(f'User {user_id} data deleted: {deleted}')
+    return deleted
@@ -1,10 +1,13 @@
-import requests
 import logging
 from django.conf import settings
 
+from apps.common.internal_auth import signed_json
+from apps.common.tracing import traced_request
+
 logger = logging.getLogger(__name__)
 
 NOTIFICATION_SERVICE_URL = getattr(settings, 'NOTIFICATION_SERVICE_URL', 'http://localhost:8001')
+BROADCAST_PATH = '/api/notifications/broadcast/'
 
 
 def send_notification(user_id, event, title, message, notification_type='in_app', email_to=None, data=None):
@@ -28,7 +31,8 @@ def send_notification(user_id, event, title, message, notification_type='in_app'
         return None
     
     try:
-        response = requests.post(
+        response = traced_request(
+            'POST',
             f'{NOTIFICATION_SERVICE_URL}/api/notifications/send/',
             json={
                 'user_id': user_id,
@@ -52,3 +56,39 @@ def send_notification(user_id, event, title, message, notification_type='in_app'
     except Exception as e:
         logger.error(f"Error sending notification: {e}")
         return None
+
+
+def send_broadcast(audience, event, title, message, data=None):
+    """
+    Отправить рассылку всей аудитории (например, 'channel:5' - участникам канала)
+    Хранится в notification-service одной строкой, а не уведомлением на каждого участника
+
+    Returns:
+        int: ID созданной рассылки или None
+    """
+    try:
+        # Рассылки создаются только подписанными запросами сервисов
+        body, headers = signed_json('POST', BROADCAST_PATH, {
+            'audience': audience,
+            'event': event,
+            'title': title,
+            'message': message,
+            'data': data or {}
+        })
+        response = traced_request(
+            'POST',
+            f'{NOTIFICATION_SERVICE_URL}{BROADCAST_PATH}',
+            data=body,
+            headers=headers,
+            timeout=5
+        )
+
+        if response.status_code == 201:
+            return response.json()['broadcast_id']
+
+        logger.warning(f"Failed to send broadcast: {response.status_code}")
+        return None
+
+    except Exception as e:
+        logger.error(f"Error sending broadcast: {e}")
+        return None
@@ -0,0 +1,89 @@
+import contextvars
+import json
+import logging
+import re
+import time
+import uuid
+
+import requests
+
+SERVICE_NAME = 'content-service'
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Span каждого перехода (входящий запрос, вызов другого сервиса) - одна JSON
+# строка в логгер spans; локальный сборщик логов группирует их по request_id
+span_logger = logging.getLogger('spans')
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,128}$')
+
+
+def get_request_id():
+    """ID текущего запроса (None вне запроса)"""
+    return _request_id.get()
+
+
+def tracing_headers():
+    """Заголовки для передачи ID запроса в другой сервис"""
+    request_id = _request_id.get()
+    return {REQUEST_ID_HEADER: request_id} if request_id else {}
+
+
+def record_span(kind, name, started, status):
+    span_logger.info(json.dumps({
+        'request_id': _request_id.get(),
+        'service': SERVICE_NAME,
+        'kind': kind,
+        'name': name,
+        'status': status,
+        'duration_ms': round((time.monotonic() - started) * 1000, 2),
+    }))
+
+
+def traced_request(method, url, session=None, **kwargs):
+    """
+    HTTP запрос в другой сервис с X-Request-ID и span вызова
+    Исключения requests пробрасываются как есть
+    """
+    kwargs['headers'] = {**tracing_headers(), **(kwargs.get('headers') or {})}
+    started = time.monotonic()
+    status = None
+
+    try:
+        response = (session or requests).request(method, url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        record_span('client', f'{method} {url}', started, status)
+
+
+class RequestIDMiddleware:
+    """
+    Принять X-Request-ID от gateway (или создать), сделать его доступным
+    клиентам других сервисов и вернуть в ответе вместе с Server-Timing
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, '')
+        if not REQUEST_ID_PATTERN.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        request.request_id = request_id
+        token = _request_id.set(request_id)
+        started = time.monotonic()
+        status = None
+
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+        finally:
+            record_span('server', f'{request.method} {request.path}', started, status)
+            _request_id.reset(token)
+
+        response[REQUEST_ID_HEADER] = request_id
+        response['Server-Timing'] = f'app;dur={(time.monotonic() - started) * 1000:.1f}'
+        return response
@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.common.api import publish_user_event
+from .models import Post
+
+
+@receiver(post_save, sender=Post)
+def publish_post_created(sender, instance, created, **kwargs):
+    if created:
+        author_id = instance.author_id
+        transaction.on_commit(lambda: publish_user_event('post_created', author_id))
+
+
+@receiver(post_delete, sender=Post)
+def publish_post_deleted(sender, instance, **kwargs):
+    # Вызывается и при каскадном удалении вместе с каналом
+    author_id = instance.author_id
+    transaction.on_commit(lambda: publish_user_event('post_deleted', author_id))
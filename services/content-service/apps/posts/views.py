@@ -6,6 +6,7 @@ from django.shortcuts import get_object_or_404
 from django.views.decorators.http import require_http_methods
 
 from apps.common.api import get_user, get_users_batch
+from apps.common.notifications import send_broadcast
 from apps.content.models import Channel, ChannelRole
 from apps.memberships.models import ChannelMembership
 from .models import Post
@@ -92,6 +93,15 @@ def post_create(request, channel_slug):
         
         author_data = get_user(request.user.id)
         
+        # Одна рассылка на канал вместо уведомления каждому участнику
+        send_broadcast(
+            f'channel:{channel.id}',
+            'post_created',
+            f'Новый пост в канале {channel.name}',
+            post.title,
+            data={'channel_slug': channel.slug, 'post_slug': post.slug}
+        )
+        
         logger.info(f'Post created: {post.title} in {channel_slug} by user {request.user.id}')
         
         return JsonResponse({
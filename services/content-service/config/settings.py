@@ -29,6 +29,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.common.tracing.RequestIDMiddleware',
+    'apps.common.api.UserLoaderMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -129,6 +131,27 @@ CACHES = {
 
 NOTIFICATION_SERVICE_URL = os.getenv('NOTIFICATION_SERVICE_URL', 'http://localhost:8001')
 USER_SERVICE_URL = os.getenv('USER_SERVICE_URL', 'http://localhost:8000')
+
+# Общий для всех сервисов кэш пользователей (см. apps/common/api.py)
+USER_CACHE_REDIS_URL = os.getenv('USER_CACHE_REDIS_URL', 'redis://localhost:6379/6')
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 300))
+USER_CACHE_LOCAL_TTL = int(os.getenv('USER_CACHE_LOCAL_TTL', 30))
+USER_CACHE_LOCAL_SIZE = int(os.getenv('USER_CACHE_LOCAL_SIZE', 10000))
+# Не больше USERS_BATCH_MAX_SIZE user-service
+USER_BATCH_SIZE = int(os.getenv('USER_BATCH_SIZE', 1000))
+
+# Подпись внутренних запросов между сервисами (apps/common/internal_auth.py), общий со всеми сервисами
+INTERNAL_AUTH_SECRET = os.getenv('INTERNAL_AUTH_SECRET', SIMPLE_JWT['SIGNING_KEY'])
+# Сколько секунд действительна подпись внутреннего запроса
+INTERNAL_AUTH_MAX_AGE = int(os.getenv('INTERNAL_AUTH_MAX_AGE', 300))
+
+# Размер части при удалении данных пользователя (/api/internal/user-cleanup/)
+USER_CLEANUP_CHUNK_SIZE = int(os.getenv('USER_CLEANUP_CHUNK_SIZE', 500))
+# Максимум пользователей в запросе /api/internal/user-stats/ (сверка статистики user-service)
+USER_STATS_MAX_IDS = int(os.getenv('USER_STATS_MAX_IDS', 1000))
+# Максимум пользователей в запросе /api/internal/user-audiences/ (аудитории рассылок notification-service)
+USER_AUDIENCES_MAX_IDS = int(os.getenv('USER_AUDIENCES_MAX_IDS', 1000))
+
 API_GATEWAY_URL = os.getenv('API_GATEWAY_URL', 'http://localhost:8080')
 
 LOGGING = {
@@ -1,10 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
 from apps.posts import views as post_views
-from apps.common.views import health_check
+from apps.common.views import health_check, user_audiences, user_cleanup, user_stats
 
 urlpatterns = [
     path('health/', health_check, name='health_check'),
+    path('api/internal/user-cleanup/', user_cleanup, name='user_cleanup'),
+    path('api/internal/user-stats/', user_stats, name='user_stats'),
+    path('api/internal/user-audiences/', user_audiences, name='user_audiences'),
     
     path('admin/', admin.site.urls),
     
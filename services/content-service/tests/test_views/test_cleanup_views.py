@@ -0,0 +1,136 @@
+import pytest
+import json
+from django.test import Client
+from django.contrib.contenttypes.models import ContentType
+
+from apps.comments.models import Comment
+from apps.common.internal_auth import internal_auth_headers
+from apps.content.models import Channel
+from apps.memberships.models import ChannelMembership
+from apps.posts.models import Post
+from apps.interactions.models import Like, View
+
+
+def post_internal(client, path, payload, signed=True):
+    body = json.dumps(payload).encode()
+    headers = internal_auth_headers('POST', path, body) if signed else {}
+    return client.post(path, body, content_type='application/json', headers=headers)
+
+
+@pytest.mark.django_db
+@pytest.mark.views
+class TestUserCleanupView:
+
+    def setup_method(self):
+        self.client = Client()
+
+        self.channel = Channel.objects.create(name='Other Channel', slug='other-channel', owner_id=2)
+        self.other_post = Post.objects.create(
+            title='Other Post', slug='other-post', content='Test content', channel=self.channel, author_id=2
+        )
+
+        own_channel = Channel.objects.create(name='Own Channel', slug='own-channel', owner_id=1)
+        for i in range(3):
+            Post.objects.create(
+                title=f'Own Post {i}', slug=f'own-post-{i}', content='Test content', channel=own_channel, author_id=1
+            )
+
+        post_type = ContentType.objects.get_for_model(Post)
+        Like.objects.create(user_id=1, content_type=post_type, object_id=self.other_post.id)
+        Like.objects.create(user_id=3, content_type=post_type, object_id=self.other_post.id)
+        Comment.objects.create(post=self.other_post, author_id=1, content='Comment')
+        View.objects.create(post=self.other_post, user_id=1)
+        Post.objects.filter(id=self.other_post.id).update(like_count=2, comment_count=1)
+
+    def test_cleanup_deletes_user_data_in_chunks(self, settings):
+        """Данные пользователя удаляются частями, счетчики чужих постов пересчитываются"""
+        settings.USER_CLEANUP_CHUNK_SIZE = 2
+
+        response = post_internal(self.client, '/api/internal/user-cleanup/', {'user_id': 1})
+
+        assert response.status_code == 200
+        deleted = response.json()['deleted']
+        assert deleted['posts'] == 3
+        assert deleted['likes'] == 1
+        assert deleted['comments'] == 1
+        assert deleted['channels'] == 1
+
+        assert not Post.objects.filter(author_id=1).exists()
+        assert View.objects.get().user_id is None
+        self.other_post.refresh_from_db()
+        assert self.other_post.like_count == 1
+        assert self.other_post.comment_count == 0
+
+    def test_cleanup_requires_user_id(self):
+        response = post_internal(self.client, '/api/internal/user-cleanup/', {})
+
+        assert response.status_code == 400
+
+    def test_cleanup_requires_internal_signature(self):
+        """Без подписи или с подписью другого тела данные не удаляются"""
+        response = post_internal(self.client, '/api/internal/user-cleanup/', {'user_id': 1}, signed=False)
+        assert response.status_code == 401
+
+        headers = internal_auth_headers('POST', '/api/internal/user-cleanup/', b'{"user_id": 2}')
+        response = self.client.post(
+            '/api/internal/user-cleanup/',
+            json.dumps({'user_id': 1}),
+            content_type='application/json',
+            headers=headers
+        )
+        assert response.status_code == 401
+        assert Post.objects.filter(author_id=1).count() == 3
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.views
+class TestUserStatsView:
+
+    def test_user_stats_counts_posts(self):
+        client = Client()
+        channel = Channel.objects.create(name='Channel', slug='channel', owner_id=1)
+        for i in range(2):
+            Post.objects.create(title=f'Post {i}', slug=f'post-{i}', content='Test content', channel=channel, author_id=1)
+
+        response = post_internal(client, '/api/internal/user-stats/', {'user_ids': [1, 2]})
+
+        assert response.status_code == 200
+        assert response.json()['stats'] == {'1': {'posts_count': 2}, '2': {'posts_count': 0}}
+
+    def test_user_stats_requires_internal_signature(self):
+        response = post_internal(Client(), '/api/internal/user-stats/', {'user_ids': [1]}, signed=False)
+
+        assert response.status_code == 401
+
+    def test_user_audiences_from_memberships(self):
+        client = Client()
+        first = Channel.objects.create(name='First', slug='first', owner_id=5)
+        second = Channel.objects.create(name='Second', slug='second', owner_id=5)
+        ChannelMembership.objects.create(channel=first, user_id=1)
+        ChannelMembership.objects.create(channel=second, user_id=1)
+        ChannelMembership.objects.create(channel=second, user_id=2)
+
+        response = post_internal(client, '/api/internal/user-audiences/', {'user_ids': [1, 2, 3]})
+
+        assert response.status_code == 200
+        audiences = response.json()['audiences']
+        assert sorted(audiences['1']) == [f'channel:{first.id}', f'channel:{second.id}']
+        assert audiences['2'] == [f'channel:{second.id}']
+        assert audiences['3'] == []
+
+    def test_user_audiences_requires_internal_signature(self):
+        response = post_internal(Client(), '/api/internal/user-audiences/', {'user_ids': [1]}, signed=False)
+
+        assert response.status_code == 401
+
+    def test_post_events_published_after_commit(self, monkeypatch):
+        events = []
+        monkeypatch.setattr('apps.posts.signals.publish_user_event', lambda event, user_id: events.append((event, user_id)))
+        channel = Channel.objects.create(name='Channel', slug='channel', owner_id=1)
+
+        post = Post.objects.create(title='Post', slug='post', content='Test content', channel=channel, author_id=1)
+        post.title = 'Updated'
+        post.save()
+        post.delete()
+
+        assert events == [('post_created', 1), ('post_deleted', 1)]
@@ -283,8 +283,9 @@ class TestPostCreateView:
             owner_id=1
         )
     
+    @patch('apps.posts.views.send_broadcast')
     @patch('apps.posts.views.get_user')
-    def test_create_post_success(self, mock_get_user):
+    def test_create_post_success(self, mock_get_user, mock_send_broadcast):
         """
         Тест: Успешное создание поста (участник канала)
         
@@ -338,6 +339,10 @@ class TestPostCreateView:
         assert post.title == 'New Post'
         assert post.author_id == 1
         
+        # Одна рассылка участникам канала
+        mock_send_broadcast.assert_called_once()
+        assert mock_send_broadcast.call_args.args[0] == f'channel:{self.channel.id}'
+        
     def test_create_post_not_member(self):
         """
         Тест: Создание поста без membership (403)
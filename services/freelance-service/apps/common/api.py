@@ -1,87 +1,340 @@
-import requests
+"""
+Клиент user-service с двухуровневым кэшем
+
+Данные пользователей нужны почти каждому list/detail view. Поиск идет по цепочке:
+in-process TTL LRU -> общий Redis (USER_CACHE_REDIS_URL, один для всех сервисов) ->
+user-service, причем в user-service запрашиваются только промахи. При изменении
+пользователя user-service удаляет его записи из Redis и публикует ID в канал
+USER_CACHE_CHANNEL - каждый процесс убирает их из своего локального кэша.
+Изменения, влияющие на статистику пользователя, публикуются в поток
+USER_EVENTS_STREAM того же Redis (publish_user_event).
+
+В пределах запроса пользователи загружаются через UserLoader: ID, объявленные
+заранее (prime_users), уходят в user-service одним batch запросом, а результат
+запоминается до конца запроса.
+
+Модуль одинаковый во всех сервисах, которые обращаются к user-service.
+"""
+import contextvars
+import json
 import logging
+import threading
+import time
+from collections import OrderedDict
+
+import msgpack
+import redis
+import requests
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from apps.common.tracing import traced_request
 
 logger = logging.getLogger(__name__)
 
 USER_SERVICE_URL = getattr(settings, 'USER_SERVICE_URL', 'http://localhost:8000')
+USER_CACHE_REDIS_URL = getattr(settings, 'USER_CACHE_REDIS_URL', 'redis://localhost:6379/6')
+USER_CACHE_TTL = getattr(settings, 'USER_CACHE_TTL', 300)
+USER_CACHE_LOCAL_TTL = getattr(settings, 'USER_CACHE_LOCAL_TTL', 30)
+USER_CACHE_LOCAL_SIZE = getattr(settings, 'USER_CACHE_LOCAL_SIZE', 10000)
+USER_CACHE_CHANNEL = 'users:invalidate'
+# События для статистики пользователей в user-service (в том же Redis, что и кэш)
+USER_EVENTS_STREAM = 'users:events'
+USER_EVENTS_MAXLEN = 100000
+
+# Краткие данные пользователя из /api/users/batch/ - только поля, которые читают views
+SUMMARY = 'summary'
+USER_FIELDS = ['id', 'email', 'first_name', 'last_name', 'avatar_url', 'is_moderator']
+USER_BATCH_SIZE = getattr(settings, 'USER_BATCH_SIZE', 1000)
+MSGPACK_CONTENT_TYPE = 'application/x-msgpack'
+
+
+def cache_key(kind, user_id):
+    return f'users:{kind}:{user_id}'
+
+
+class LocalTTLCache:
+    """LRU кэш процесса с временем жизни записей"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, kind, user_ids):
+        now = time.monotonic()
+        found = {}
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get((kind, user_id))
+                if entry is None:
+                    continue
+                value, expires_at = entry
+                if expires_at < now:
+                    del self._entries[(kind, user_id)]
+                    continue
+                self._entries.move_to_end((kind, user_id))
+                found[user_id] = value
+        return found
+
+    def set_many(self, kind, values):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for user_id, value in values.items():
+                self._entries[(kind, user_id)] = (value, expires_at)
+                self._entries.move_to_end((kind, user_id))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._entries.pop((SUMMARY, user_id), None)
+
+
+class UserClient:
+    """Пул соединений к user-service и двухуровневый кэш пользователей"""
+
+    def __init__(self, service_url, redis_url):
+        self.service_url = service_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=20)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.local = LocalTTLCache(USER_CACHE_LOCAL_SIZE, USER_CACHE_LOCAL_TTL)
+        self.redis = redis.Redis.from_url(redis_url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def get_users(self, user_ids):
+        """
+        Краткие данные пользователей
+        Из user-service запрашиваются только промахи кэша; если он недоступен -
+        возвращается то, что нашлось в кэше
+        """
+        self.ensure_listener()
+
+        found = self.get_cached(SUMMARY, user_ids)
+        misses = [user_id for user_id in user_ids if user_id not in found]
+
+        if misses:
+            fetched = self.fetch_batch(misses)
+            self.store(SUMMARY, fetched)
+            found.update(fetched)
+
+        return [found[user_id] for user_id in user_ids if user_id in found]
+
+    def fetch_batch(self, user_ids):
+        """Запросить пользователей частями по USER_BATCH_SIZE (лимит user-service)"""
+        found = {}
+        for i in range(0, len(user_ids), USER_BATCH_SIZE):
+            found.update(self.fetch_chunk(user_ids[i:i + USER_BATCH_SIZE]))
+        return found
+
+    def fetch_chunk(self, user_ids):
+        try:
+            response = traced_request(
+                'POST',
+                f'{self.service_url}/api/users/batch/',
+                session=self.session,
+                data=msgpack.packb({'user_ids': user_ids, 'fields': USER_FIELDS}),
+                headers={'Content-Type': MSGPACK_CONTENT_TYPE, 'Accept': MSGPACK_CONTENT_TYPE},
+                timeout=10
+            )
+        except requests.RequestException as e:
+            logger.error(f"Error fetching users batch: {e}")
+            return {}
+
+        if response.status_code != 200:
+            logger.warning(f"Batch user fetch failed: {response.status_code}")
+            return {}
+
+        unpacker = msgpack.Unpacker()
+        unpacker.feed(response.content)
+        return {user['id']: user for user in unpacker}
+
+    def get_cached(self, kind, user_ids):
+        """Сначала локальный кэш, затем Redis для оставшихся"""
+        found = self.local.get_many(kind, user_ids)
+        misses = [user_id for user_id in user_ids if user_id not in found]
+        if not misses:
+            return found
+
+        try:
+            values = self.redis.mget([cache_key(kind, user_id) for user_id in misses])
+        except redis.RedisError as e:
+            logger.warning(f"User cache read failed: {e}")
+            return found
+
+        from_redis = {
+            user_id: json.loads(value)
+            for user_id, value in zip(misses, values)
+            if value is not None
+        }
+        self.local.set_many(kind, from_redis)
+        found.update(from_redis)
+        return found
+
+    def store(self, kind, values):
+        if not values:
+            return
+        self.local.set_many(kind, values)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id, value in values.items():
+                pipe.set(cache_key(kind, user_id), json.dumps(value), ex=USER_CACHE_TTL)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"User cache write failed: {e}")
+
+    def ensure_listener(self):
+        """Подписаться на инвалидацию из user-service (один поток на процесс)"""
+        if self._listener is not None:
+            return
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self.listen, name='user-cache-invalidation', daemon=True)
+                self._listener.start()
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(USER_CACHE_CHANNEL)
+                for message in pubsub.listen():
+                    self.local.delete(int(message['data']))
+            except (redis.RedisError, ValueError) as e:
+                logger.warning(f"User cache invalidation listener error: {e}")
+            # Записи, пропущенные при обрыве, истекут по USER_CACHE_LOCAL_TTL
+            time.sleep(5)
+
+
+user_client = UserClient(USER_SERVICE_URL, USER_CACHE_REDIS_URL)
+
+
+def publish_user_event(event, user_id):
+    """
+    Опубликовать событие пользователя (post_created, gig_activated, ...) для user-service
+    Вызывать после коммита; событие, потерянное при недоступности Redis, исправит ночная сверка
+    """
+    try:
+        user_client.redis.xadd(
+            USER_EVENTS_STREAM,
+            {'event': event, 'user_id': user_id},
+            maxlen=USER_EVENTS_MAXLEN,
+            approximate=True
+        )
+    except redis.RedisError as e:
+        logger.warning(f"User event publish failed: {e}")
+
+
+class UserLoader:
+    """
+    Пользователи в пределах одного запроса
+    ID, объявленные через prime(), накапливаются и загружаются одним batch
+    запросом при первом load(); результаты (и отсутствие пользователя)
+    запоминаются до конца запроса
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._pending = set()
+        self._loaded = {}
+
+    def prime(self, *user_ids):
+        for user_id in user_ids:
+            if user_id and int(user_id) not in self._loaded:
+                self._pending.add(int(user_id))
+
+    def load(self, user_id):
+        return self.load_many([user_id])[0]
+
+    def load_many(self, user_ids):
+        user_ids = [int(user_id) for user_id in user_ids if user_id]
+        self.prime(*user_ids)
+        self.dispatch()
+        return [self._loaded.get(user_id) for user_id in user_ids]
+
+    def dispatch(self):
+        if not self._pending:
+            return
+        pending = list(self._pending)
+        self._pending.clear()
+
+        found = {user['id']: user for user in self.client.get_users(pending)}
+        for user_id in pending:
+            self._loaded[user_id] = found.get(user_id)
+
+
+_loader = contextvars.ContextVar('user_loader', default=None)
+
+
+def get_loader():
+    """Loader текущего запроса (вне запроса - новый, без общей памяти)"""
+    return _loader.get() or UserLoader(user_client)
+
+
+def prime_users(*user_ids):
+    """Объявить пользователей, которые понадобятся дальше в запросе"""
+    get_loader().prime(*user_ids)
+
+
+class UserLoaderMiddleware:
+    """Создать UserLoader на время запроса"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _loader.set(UserLoader(user_client))
+        try:
+            return self.get_response(request)
+        finally:
+            _loader.reset(token)
 
 
 def get_user(user_id):
     """
     Получить данные одного пользователя из user-service
-    
+
     Args:
         user_id: ID пользователя
-        
+
     Returns:
         dict: Данные пользователя или None
     """
     if not user_id:
         return None
-    
-    try:
-        response = requests.get(
-            f'{USER_SERVICE_URL}/api/profile/',
-            params={'user_id': user_id},
-            timeout=5
-        )
-        
-        if response.status_code == 200:
-            return response.json()['profile']
-        
-        logger.warning(f"Failed to get user {user_id}: {response.status_code}")
-        return None
-        
-    except requests.RequestException as e:
-        logger.error(f"Error fetching user {user_id}: {e}")
-        return None
+
+    return get_loader().load(user_id)
 
 
 def get_users_batch(user_ids):
     """
     Получить данные нескольких пользователей одним запросом
-    
+
     Args:
         user_ids: Список ID пользователей
-        
+
     Returns:
         list: Список dict'ов с данными пользователей
     """
     if not user_ids:
         return []
-    
-    user_ids = list(set(filter(None, user_ids)))
-    
-    if not user_ids:
-        return []
-    
-    try:
-        response = requests.post(
-            f'{USER_SERVICE_URL}/api/users/batch/',
-            json={'user_ids': user_ids},
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            return response.json()['users']
-        
-        logger.warning(f"Batch user fetch failed: {response.status_code}")
-        return []
-        
-    except requests.RequestException as e:
-        logger.error(f"Error fetching users batch: {e}")
-        return []
+
+    user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids if user_id))
+
+    return [user for user in get_loader().load_many(user_ids) if user is not None]
 
 
 def verify_user_exists(user_id):
     """
     Проверить, существует ли пользователь
-    
+
     Args:
         user_id: ID пользователя
-        
+
     Returns:
         bool: True если существует, False если нет
     """
@@ -0,0 +1,51 @@
+"""
+Удаление данных пользователя по запросу user-service
+
+Записи удаляются частями по USER_CLEANUP_CHUNK_SIZE, каждая часть - в своей
+транзакции: удаление тяжелого аккаунта не держит длинных блокировок, а
+повтор после обрыва продолжает с того, что осталось.
+
+Заказы, отзывы и споры остаются - это история второй стороны сделки.
+Услуги с заказами не удаляются (заказ ссылается на услугу), а архивируются.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from apps.favorites.models import Favorite
+from apps.gigs.models import GIG_STATUS_CHOICES, Gig
+from apps.portfolio.models import PortfolioItem
+from apps.proposals.models import CustomProposal
+
+logger = logging.getLogger(__name__)
+
+
+def delete_in_chunks(queryset, chunk_size):
+    """Удалить записи queryset частями; возвращает число удаленных записей queryset"""
+    deleted = 0
+    while ids := list(queryset.order_by().values_list('pk', flat=True)[:chunk_size]):
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+    return deleted
+
+
+def cleanup_user_data(user_id):
+    """Удалить данные пользователя; возвращает число удаленных записей по типам"""
+    chunk_size = settings.USER_CLEANUP_CHUNK_SIZE
+    gigs = Gig.objects.filter(seller_id=user_id)
+
+    deleted = {
+        'favorites': delete_in_chunks(Favorite.objects.filter(user_id=user_id), chunk_size),
+        'proposals': delete_in_chunks(
+            CustomProposal.objects.filter(Q(seller_id=user_id) | Q(buyer_id=user_id)), chunk_size
+        ),
+        'portfolio_items': delete_in_chunks(PortfolioItem.objects.filter(seller_id=user_id), chunk_size),
+        'gigs': delete_in_chunks(gigs.filter(orders__isnull=True), chunk_size),
+        'gigs_archived': gigs.exclude(status=GIG_STATUS_CHOICES.ARCHIVED).update(status=GIG_STATUS_CHOICES.ARCHIVED),
+    }
+
+    logger.info(f'User {user_id} data deleted: {deleted}')
+    return deleted
@@ -0,0 +1,39 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from apps.common.api import publish_user_event
+from .models import GIG_STATUS_CHOICES, Gig
+
+
+def publish_after_commit(events, seller_id):
+    if events:
+        transaction.on_commit(lambda: [publish_user_event(event, seller_id) for event in events])
+
+
+@receiver(post_init, sender=Gig)
+def remember_status(sender, instance, **kwargs):
+    # Через __dict__: поле может быть отложено (.only()), обращение к нему - запрос
+    instance._saved_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Gig)
+def publish_gig_changes(sender, instance, created, **kwargs):
+    was_active = not created and instance._saved_status == GIG_STATUS_CHOICES.ACTIVE
+    is_active = instance.status == GIG_STATUS_CHOICES.ACTIVE
+    instance._saved_status = instance.status
+
+    events = ['gig_created'] if created else []
+    if is_active and not was_active:
+        events.append('gig_activated')
+    elif was_active and not is_active:
+        events.append('gig_deactivated')
+    publish_after_commit(events, instance.seller_id)
+
+
+@receiver(post_delete, sender=Gig)
+def publish_gig_deleted(sender, instance, **kwargs):
+    events = ['gig_deleted']
+    if instance._saved_status == GIG_STATUS_CHOICES.ACTIVE:
+        events.append('gig_deactivated')
+    publish_after_commit(events, instance.seller_id)
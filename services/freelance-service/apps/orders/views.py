@@ -7,7 +7,7 @@ from django.views.decorators.http import require_http_methods
 from django.db.models import Q
 
 from apps.gigs.models import Gig, GigPackage
-from apps.common.api import get_user, get_users_batch
+from apps.common.api import get_user, get_users_batch, prime_users
 from apps.orders.models import Order
 from .models import Order, OrderRequirement, Dispute, DisputeMessage
 from .forms import OrderCreateForm, OrderDeliveryForm
@@ -105,6 +105,7 @@ def order_detail(request, order_id):
             'error': 'У вас нет доступа к этому заказу'
         }, status=403)
     
+    prime_users(order.buyer_id, order.seller_id)
     buyer = get_user(order.buyer_id)
     seller = get_user(order.seller_id)
     
@@ -255,6 +256,7 @@ def order_create(request):
         for rf in requirements_files
     ]
     
+    prime_users(order.buyer_id, order.seller_id)
     buyer = get_user(order.buyer_id)
     seller = get_user(order.seller_id)
     
@@ -339,6 +341,7 @@ def order_update_status(request, order_id):
     order.status = new_status
     order.save(update_fields=['status', 'updated_at'])
     
+    prime_users(order.buyer_id, order.seller_id)
     buyer = get_user(order.buyer_id)
     seller = get_user(order.seller_id)
     
@@ -434,6 +437,7 @@ def order_deliver(request, order_id):
     order.delivered_at = timezone.now()
     order.save(update_fields=['status', 'delivered_at', 'updated_at'])
     
+    prime_users(order.buyer_id, order.seller_id)
     buyer = get_user(order.buyer_id)
     seller = get_user(order.seller_id)
     
@@ -519,6 +523,7 @@ def order_complete(request, order_id):
             'amount': float(order.price)
         }
     )   
+    prime_users(order.buyer_id, order.seller_id)
     buyer = get_user(order.buyer_id)
     seller = get_user(order.seller_id)
     
@@ -606,6 +611,7 @@ def order_cancel(request, order_id):
         }
     )
     
+    prime_users(order.buyer_id, order.seller_id)
     buyer = get_user(order.buyer_id)
     seller = get_user(order.seller_id)
     
@@ -820,6 +826,12 @@ def dispute_detail(request, dispute_id):
         id=dispute_id
     )
     
+    # Проверка модератора и участники спора - одним запросом в user-service
+    prime_users(
+        request.user.id, dispute.order.buyer_id, dispute.order.seller_id,
+        dispute.created_by_id, dispute.resolved_by_id
+    )
+    
     is_participant = (
         dispute.order.buyer_id == request.user.id or
         dispute.order.seller_id == request.user.id
@@ -1115,6 +1127,7 @@ def dispute_resolve(request, dispute_id):
     
     logger.info(f'Dispute resolved: {dispute.id} by moderator {request.user.id}, winner: {winner_side}')
     
+    prime_users(order.buyer_id, order.seller_id)
     buyer = get_user(order.buyer_id)
     seller = get_user(order.seller_id)
     moderator = user_data
@@ -5,7 +5,7 @@ from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.views.decorators.http import require_http_methods
 
-from apps.common.api import get_user, get_users_batch
+from apps.common.api import get_user, get_users_batch, prime_users
 from apps.common.notifications import send_notification
 from .models import CustomProposal
 from apps.gigs.models import Gig
@@ -107,6 +107,7 @@ def proposal_detail(request, proposal_id):
     
     proposal.mark_as_expired()
     
+    prime_users(proposal.buyer_id, proposal.seller_id)
     buyer = get_user(proposal.buyer_id)
     seller = get_user(proposal.seller_id)
     
@@ -212,6 +213,7 @@ def proposal_create(request):
         }
     )
 
+    prime_users(proposal.buyer_id, proposal.seller_id)
     buyer = get_user(proposal.buyer_id)
     seller = get_user(proposal.seller_id)
     
@@ -298,6 +300,7 @@ def proposal_accept(request, proposal_id):
     proposal.accepted_at = timezone.now()
     proposal.save(update_fields=['status', 'accepted_at'])
     
+    prime_users(proposal.seller_id, proposal.buyer_id)
     seller = get_user(proposal.seller_id)
     buyer = get_user(proposal.buyer_id)
     
@@ -352,6 +355,7 @@ def proposal_reject(request, proposal_id):
     proposal.rejected_at = timezone.now()
     proposal.save(update_fields=['status', 'rejected_at'])
     
+    prime_users(proposal.seller_id, proposal.buyer_id)
     seller = get_user(proposal.seller_id)
     buyer = get_user(proposal.buyer_id)
     
@@ -1,9 +1,11 @@
 from django.contrib import admin
 from django.urls import path, include
-from apps.common.views import health_check
+from apps.common.views import health_check, user_cleanup, user_stats
 
 urlpatterns = [
     path('health/', health_check, name='health_check'),
+    path('api/internal/user-cleanup/', user_cleanup, name='user_cleanup'),
+    path('api/internal/user-stats/', user_stats, name='user_stats'),
     
     path("admin/", admin.site.urls),
     
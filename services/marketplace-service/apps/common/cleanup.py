@@ -0,0 +1,41 @@
+"""
+Удаление данных пользователя по запросу user-service
+
+Записи удаляются частями по USER_CLEANUP_CHUNK_SIZE, каждая часть - в своей
+транзакции: удаление тяжелого аккаунта не держит длинных блокировок, а
+повтор после обрыва продолжает с того, что осталось.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from apps.favorites.models import Favorite
+from apps.products.models import Product
+from apps.reviews.models import Review
+
+logger = logging.getLogger(__name__)
+
+
+def delete_in_chunks(queryset, chunk_size):
+    """Удалить записи queryset частями; возвращает число удаленных записей queryset"""
+    deleted = 0
+    while ids := list(queryset.order_by().values_list('pk', flat=True)[:chunk_size]):
+        with transaction.atomic():
+            queryset.model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+    return deleted
+
+
+def cleanup_user_data(user_id):
+    """Удалить данные пользователя; возвращает число удаленных записей по типам"""
+    chunk_size = settings.USER_CLEANUP_CHUNK_SIZE
+
+    deleted = {
+        'favorites': delete_in_chunks(Favorite.objects.filter(user_id=user_id), chunk_size),
+        'reviews': delete_in_chunks(Review.objects.filter(author_id=user_id), chunk_size),
+        'products': delete_in_chunks(Product.objects.filter(seller_id=user_id), chunk_size),
+    }
+
+    logger.info(f'User {user_id} data deleted: {deleted}')
+    return deleted
@@ -0,0 +1,62 @@
+"""
+Подпись внутренних запросов между сервисами (общий INTERNAL_AUTH_SECRET)
+
+Отправитель подписывает метод, путь, время и SHA-256 тела запроса.
+Внутренний эндпоинт (internal_only) принимает запрос только с верной
+подписью не старше INTERNAL_AUTH_MAX_AGE секунд, иначе отвечает 401.
+"""
+import hashlib
+import hmac
+import json
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+
+TIMESTAMP_HEADER = 'X-Internal-Timestamp'
+SIGNATURE_HEADER = 'X-Internal-Signature'
+
+
+def sign_request(method, path, timestamp, body):
+    message = f'{method.upper()}|{path}|{timestamp}|{hashlib.sha256(body).hexdigest()}'.encode()
+    return hmac.new(settings.INTERNAL_AUTH_SECRET.encode(), message, hashlib.sha256).hexdigest()
+
+
+def internal_auth_headers(method, path, body):
+    """Заголовки подписи запроса с телом body (bytes)"""
+    timestamp = str(int(time.time()))
+    return {
+        TIMESTAMP_HEADER: timestamp,
+        SIGNATURE_HEADER: sign_request(method, path, timestamp, body),
+    }
+
+
+def signed_json(method, path, payload):
+    """Тело JSON запроса и заголовки с подписью: traced_request(..., data=body, headers=headers)"""
+    body = json.dumps(payload).encode()
+    return body, {'Content-Type': 'application/json', **internal_auth_headers(method, path, body)}
+
+
+def verify_request(request):
+    timestamp = request.headers.get(TIMESTAMP_HEADER, '')
+    signature = request.headers.get(SIGNATURE_HEADER, '')
+    try:
+        if abs(time.time() - int(timestamp)) > settings.INTERNAL_AUTH_MAX_AGE:
+            return False
+    except ValueError:
+        return False
+    return hmac.compare_digest(signature, sign_request(request.method, request.path, timestamp, request.body))
+
+
+def internal_only(view):
+    """Эндпоинт только для подписанных запросов других сервисов"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not verify_request(request):
+            return JsonResponse({
+                'success': False,
+                'error': 'Internal authentication required'
+            }, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
@@ -1,7 +1,8 @@
-import requests
 import logging
 from django.conf import settings
 
+from apps.common.tracing import traced_request
+
 logger = logging.getLogger(__name__)
 
 NOTIFICATION_SERVICE_URL = getattr(settings, 'NOTIFICATION_SERVICE_URL', 'http://localhost:8001')
@@ -28,7 +29,8 @@ def send_notification(user_id, event, title, message, notification_type='in_app'
         return None
     
     try:
-        response = requests.post(
+        response = traced_request(
+            'POST',
             f'{NOTIFICATION_SERVICE_URL}/api/notifications/send/',
             json={
                 'user_id': user_id,
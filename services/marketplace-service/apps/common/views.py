@@ -1,19 +1,84 @@
+import json
+import logging
+import time
+
 from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.db import connection
+from django_redis import get_redis_connection
 
-@require_http_methods(['GET'])
-def health_check(request):
-    
+from apps.common.cleanup import cleanup_user_data
+from apps.common.internal_auth import internal_only
+
+logger = logging.getLogger(__name__)
+
+
+def check_database():
+    """Статус БД и задержка запроса в мс"""
+    started = time.monotonic()
     try:
         with connection.cursor() as cursor:
             cursor.execute("SELECT 1")
-        db_status = 'healthy'
     except Exception:
-        db_status = 'unhealthy'
+        return 'unhealthy', None
+    return 'healthy', round((time.monotonic() - started) * 1000, 2)
 
-    return JsonResponse({
+
+def check_redis():
+    """Статус Redis и задержка PING в мс"""
+    started = time.monotonic()
+    try:
+        get_redis_connection('default').ping()
+    except Exception:
+        return 'unhealthy', None
+    return 'healthy', round((time.monotonic() - started) * 1000, 2)
+
+
+@require_http_methods(['GET'])
+def health_check(request):
+    """
+    Проверка здоровья сервиса
+    ?deep=1 - дополнительно Redis и задержки зависимостей (для gateway /health/?deep=1)
+    """
+    db_status, db_latency = check_database()
+
+    data = {
         'status': 'healthy' if db_status == 'healthy' else 'degraded',
-        'service': 'freelance-service',
+        'service': 'marketplace-service',
         'database': db_status
+    }
+
+    if request.GET.get('deep', '').lower() in ('1', 'true'):
+        redis_status, redis_latency = check_redis()
+        data['redis'] = redis_status
+        data['latency_ms'] = {'database': db_latency, 'redis': redis_latency}
+        if redis_status != 'healthy':
+            data['status'] = 'degraded'
+
+    return JsonResponse(data)
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+@internal_only
+def user_cleanup(request):
+    """
+    Удалить данные пользователя (внутренний эндпоинт, вызывает outbox relay user-service)
+    POST /api/internal/user-cleanup/ {"user_id": 1}
+    Повторный вызов безопасен: удаляется то, что осталось
+    """
+    try:
+        user_id = int(json.loads(request.body)['user_id'])
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return JsonResponse({
+            'success': False,
+            'error': 'user_id required'
+        }, status=400)
+
+    deleted = cleanup_user_data(user_id)
+
+    return JsonResponse({
+        'success': True,
+        'deleted': deleted
     })
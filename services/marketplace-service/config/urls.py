@@ -1,9 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
-from apps.common.views import health_check
+from apps.common.views import health_check, user_cleanup
 
 urlpatterns = [
     path('health/', health_check, name='health_check'),
+    path('api/internal/user-cleanup/', user_cleanup, name='user_cleanup'),
     
     path("admin/", admin.site.urls),
     path('api/products/', include('apps.products.urls')),
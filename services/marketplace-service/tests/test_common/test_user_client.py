@@ -0,0 +1,91 @@
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import fakeredis
+import pytest
+
+from apps.common import api
+from apps.common.api import SUMMARY, USER_CACHE_CHANNEL, LocalTTLCache, UserClient, cache_key
+
+
+def user(user_id):
+    return {'id': user_id, 'email': f'user{user_id}@example.com'}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Время локального кэша"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(api, 'time', SimpleNamespace(monotonic=lambda: now.value, sleep=time.sleep))
+    return now
+
+
+@pytest.fixture
+def user_client():
+    client = UserClient('http://user-service:8000', 'redis://localhost:6379/6')
+    client.redis = fakeredis.FakeRedis()
+    client.local = LocalTTLCache(max_size=100, ttl=30)
+    client.fetch_chunk = Mock(side_effect=lambda user_ids: {user_id: user(user_id) for user_id in user_ids})
+    return client
+
+
+@pytest.fixture
+def no_listener(user_client, monkeypatch):
+    monkeypatch.setattr(user_client, 'ensure_listener', lambda: None)
+    return user_client
+
+
+class TestUserClient:
+
+    def test_local_ttl_hit_and_miss(self, no_listener, clock):
+        client = no_listener
+
+        assert client.get_users([1, 2]) == [user(1), user(2)]
+        client.fetch_chunk.assert_called_once_with([1, 2])
+        assert json.loads(client.redis.get(cache_key(SUMMARY, 1))) == user(1)
+
+        # Локальный кэш: ни Redis, ни user-service
+        client.redis.flushall()
+        assert client.get_users([1, 2]) == [user(1), user(2)]
+        assert client.fetch_chunk.call_count == 1
+
+        # Локальная запись истекла - промах, затем Redis
+        clock.value += 31
+        client.redis.set(cache_key(SUMMARY, 1), json.dumps(user(1)))
+        assert client.get_users([1, 2]) == [user(1), user(2)]
+        client.fetch_chunk.assert_called_with([2])
+
+    def test_local_cache_evicts_least_recently_used(self):
+        cache = LocalTTLCache(max_size=2, ttl=30)
+        cache.set_many(SUMMARY, {1: user(1), 2: user(2)})
+        cache.get_many(SUMMARY, [1])
+        cache.set_many(SUMMARY, {3: user(3)})
+
+        assert set(cache.get_many(SUMMARY, [1, 2, 3])) == {1, 3}
+
+    def test_invalidation_evicts_both_tiers(self, user_client):
+        client = user_client
+        assert client.get_users([1]) == [user(1)]
+        deadline = time.monotonic() + 2
+        while not client.redis.pubsub_numsub(USER_CACHE_CHANNEL)[0][1] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        # Как user-service (apps/common/user_cache.py): удалить из Redis и опубликовать ID
+        client.redis.delete(cache_key(SUMMARY, 1))
+        client.redis.publish(USER_CACHE_CHANNEL, 1)
+        while client.local.get_many(SUMMARY, [1]) and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert client.local.get_many(SUMMARY, [1]) == {}
+        assert client.redis.get(cache_key(SUMMARY, 1)) is None
+        assert client.get_users([1]) == [user(1)]
+        assert client.fetch_chunk.call_count == 2
+
+    def test_user_service_down_returns_cached(self, no_listener):
+        client = no_listener
+        client.get_users([1])
+        client.fetch_chunk.side_effect = lambda user_ids: {}
+
+        assert client.get_users([1, 2]) == [user(1)]
@@ -0,0 +1,72 @@
+import json
+import pytest
+from decimal import Decimal
+from django.test import Client
+from apps.favorites.models import Favorite
+from apps.products.models import Product, STATUS_CHOICES
+from apps.reviews.models import Review
+from apps.categories.models import Category
+from apps.common.internal_auth import internal_auth_headers
+
+
+def post_internal(client, path, payload, signed=True):
+    body = json.dumps(payload).encode()
+    headers = internal_auth_headers('POST', path, body) if signed else {}
+    return client.post(path, body, content_type='application/json', headers=headers)
+
+
+@pytest.mark.django_db
+@pytest.mark.views
+class TestUserCleanupView:
+
+    def setup_method(self):
+
+        self.client = Client()
+        self.category = Category.objects.create(name='Electronics', slug='electronics')
+
+    def create_product(self, title, seller_id):
+        return Product.objects.create(
+            title=title,
+            description='Test',
+            price=Decimal('99.99'),
+            category=self.category,
+            seller_id=seller_id,
+            status=STATUS_CHOICES.ACTIVE,
+            city='Moscow'
+        )
+
+    def test_cleanup_deletes_user_data(self, settings):
+
+        settings.USER_CLEANUP_CHUNK_SIZE = 2
+        other_product = self.create_product('Other Product', seller_id=2)
+        for i in range(3):
+            own_product = self.create_product(f'Own Product {i}', seller_id=1)
+        Favorite.objects.create(user_id=2, product=own_product)
+        Favorite.objects.create(user_id=1, product=other_product)
+        Review.objects.create(product=other_product, author_id=1, rating=5, comment='Great product!')
+
+        response = post_internal(self.client, '/api/internal/user-cleanup/', {'user_id': 1})
+
+        assert response.status_code == 200
+        assert response.json()['deleted'] == {'favorites': 1, 'reviews': 1, 'products': 3}
+        assert list(Product.objects.all()) == [other_product]
+        assert not Favorite.objects.exists()
+        assert not Review.objects.exists()
+
+    def test_cleanup_invalid_user_id(self):
+
+        response = post_internal(self.client, '/api/internal/user-cleanup/', {'user_id': 'abc'})
+
+        assert response.status_code == 400
+
+    def test_cleanup_requires_internal_signature(self, settings):
+
+        product = self.create_product('Own Product', seller_id=1)
+
+        response = post_internal(self.client, '/api/internal/user-cleanup/', {'user_id': 1}, signed=False)
+        assert response.status_code == 401
+
+        settings.INTERNAL_AUTH_MAX_AGE = -1
+        response = post_internal(self.client, '/api/internal/user-cleanup/', {'user_id': 1})
+        assert response.status_code == 401
+        assert list(Product.objects.all()) == [product]
@@ -0,0 +1,75 @@
+"""
+Аудитории рассылок пользователя определяет сервер, а не клиент
+
+Аудитории - каналы, в которых пользователь состоит (content-service,
+подписанный /api/internal/user-audiences/). Ответ кэшируется на
+AUDIENCE_CACHE_TTL секунд; пользователи без записи в кэше запрашиваются
+одним запросом. Аудитория 'all' сюда не входит - ее добавляет лента.
+"""
+import logging
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.common.internal_auth import signed_json
+from apps.common.tracing import traced_request
+
+logger = logging.getLogger(__name__)
+
+USER_AUDIENCES_PATH = '/api/internal/user-audiences/'
+
+
+def audiences_key(user_id):
+    return f'audiences:{user_id}'
+
+
+def fetch_audiences(user_ids):
+    """Аудитории пользователей из content-service: {user_id: [audience, ...]}"""
+    body, headers = signed_json('POST', USER_AUDIENCES_PATH, {'user_ids': user_ids})
+    response = traced_request(
+        'POST',
+        f'{settings.CONTENT_SERVICE_URL}{USER_AUDIENCES_PATH}',
+        data=body,
+        headers=headers,
+        timeout=5
+    )
+    response.raise_for_status()
+    return {int(user_id): audiences for user_id, audiences in response.json()['audiences'].items()}
+
+
+def get_audiences(user_ids):
+    """
+    Аудитории пользователей (не больше BROADCAST_MAX_AUDIENCES на пользователя)
+    content-service недоступен - пустой список без записи в кэш: лента покажет
+    личные уведомления и рассылки 'all'
+    """
+    keys = {audiences_key(user_id): user_id for user_id in user_ids}
+    cached = cache.get_many(list(keys))
+    result = {keys[key]: audiences for key, audiences in cached.items()}
+
+    missing = [user_id for user_id in user_ids if user_id not in result]
+    if not missing:
+        return result
+
+    try:
+        fetched = fetch_audiences(missing)
+    except (requests.RequestException, KeyError, ValueError) as e:
+        logger.warning(f'Audiences unavailable for users {missing}: {str(e)}')
+        result.update({user_id: [] for user_id in missing})
+        return result
+
+    fetched = {
+        user_id: fetched.get(user_id, [])[:settings.BROADCAST_MAX_AUDIENCES]
+        for user_id in missing
+    }
+    cache.set_many(
+        {audiences_key(user_id): audiences for user_id, audiences in fetched.items()},
+        timeout=settings.AUDIENCE_CACHE_TTL
+    )
+    result.update(fetched)
+    return result
+
+
+def get_user_audiences(user_id):
+    return get_audiences([user_id])[user_id]
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from urllib.parse import parse_qs
+
+import redis
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .audiences import get_user_audiences
+from .feed import decode_cursor, get_feed_since
+from .models import Broadcast
+from .push import audience_group, feed_message, user_group
+from .revocation import is_token_revoked
+
+logger = logging.getLogger(__name__)
+
+# Коды закрытия соединения (4000-4999 - коды приложения)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_BAD_REQUEST = 4400
+CLOSE_UNAVAILABLE = 4503
+
+# Токен передается в Sec-WebSocket-Protocol: ['bearer', <access>], а не в URL (URL попадает в логи daphne)
+TOKEN_SUBPROTOCOL = 'bearer'
+
+
+def subprotocol_token(subprotocols):
+    """Токен - элемент после TOKEN_SUBPROTOCOL в списке subprotocols или None"""
+    try:
+        return subprotocols[subprotocols.index(TOKEN_SUBPROTOCOL) + 1]
+    except (ValueError, IndexError):
+        return None
+
+
+def authenticate(token):
+    """(user_id, время выдачи, exp) из access токена или None"""
+    if not token:
+        return None
+    try:
+        access_token = AccessToken(token)
+        exp = access_token['exp']
+        # Токен без iat: время выдачи - по exp
+        lifetime = settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds()
+        issued_at = access_token.payload.get('iat', exp - lifetime)
+        return int(access_token['user_id']), float(issued_at), exp
+    except (TokenError, KeyError, TypeError, ValueError):
+        return None
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Новые уведомления пользователя в реальном времени
+    ws://.../ws/notifications/?since=<cursor>, Sec-WebSocket-Protocol: bearer, <access>
+    since - cursor последнего полученного сообщения: сначала придет пропущенное
+    Аудитории рассылок - каналы пользователя (apps/notifications/audiences.py)
+    Отозванный токен не принимается, соединение закрывается при истечении токена
+    """
+
+    async def connect(self):
+        params = parse_qs(self.scope['query_string'].decode())
+        self.subscriptions = []
+        self.expiry = None
+
+        identity = authenticate(subprotocol_token(self.scope.get('subprotocols', [])))
+        if identity is None:
+            await self.close(code=CLOSE_UNAUTHORIZED)
+            return
+        user_id, issued_at, exp = identity
+
+        try:
+            revoked = await sync_to_async(is_token_revoked, thread_sensitive=False)(user_id, issued_at)
+        except redis.RedisError as e:
+            # Без проверки отзыва не пускаем: клиент переподключится
+            logger.warning(f'Revocation check failed for user {user_id}: {str(e)}')
+            await self.close(code=CLOSE_UNAVAILABLE)
+            return
+        if revoked:
+            logger.warning(f'Revoked token used for WebSocket of user {user_id}')
+            await self.close(code=CLOSE_UNAUTHORIZED)
+            return
+
+        since = params.get('since', [None])[0]
+        try:
+            cursor = decode_cursor(since) if since else None
+        except ValueError:
+            cursor = None
+        if since and cursor is None:
+            await self.close(code=CLOSE_BAD_REQUEST)
+            return
+
+        audiences = await sync_to_async(get_user_audiences, thread_sensitive=False)(user_id)
+
+        # Подписка до чтения пропущенного: новое не потеряется, возможен повтор (клиент сверяет source и id)
+        self.subscriptions = [user_group(user_id)] + [
+            audience_group(audience) for audience in {Broadcast.AUDIENCE_ALL, *audiences}
+        ]
+        for group in self.subscriptions:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept(subprotocol=TOKEN_SUBPROTOCOL)
+        self.expiry = asyncio.create_task(self.close_on_expiry(exp))
+
+        if cursor is not None:
+            items, complete = await database_sync_to_async(get_feed_since)(
+                user_id, audiences, cursor, settings.WS_RESUME_LIMIT
+            )
+            for item in items:
+                await self.send_json(feed_message(item))
+            if not complete:
+                # Пропущено больше WS_RESUME_LIMIT - клиент перечитывает ленту через HTTP
+                await self.send_json({'type': 'resync'})
+
+        logger.info(f'WebSocket connected for user {user_id}, {len(self.subscriptions)} groups')
+
+    async def close_on_expiry(self, exp):
+        """Закрыть соединение, когда истекает токен: клиент переподключится с новым"""
+        await asyncio.sleep(max(exp - time.time(), 0))
+        await self.close(code=CLOSE_UNAUTHORIZED)
+
+    async def disconnect(self, code):
+        if self.expiry is not None:
+            self.expiry.cancel()
+        for group in self.subscriptions:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # Канал только для сервера -> клиент
+        pass
+
+    async def feed_item(self, event):
+        await self.send_json(event['item'])
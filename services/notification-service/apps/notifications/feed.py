@@ -0,0 +1,230 @@
+"""
+Лента уведомлений пользователя: личные Notification и рассылки его аудиторий
+
+Рассылка (Broadcast) хранится один раз на аудиторию ('all', 'channel:<id>'),
+прочтение отмечается BroadcastReceipt (одна рассылка) или BroadcastReadMarker
+(все до read_until), поэтому запись не зависит от числа получателей.
+Рассылки старше BROADCAST_UNREAD_DAYS дней считаются прочитанными.
+
+Обе выборки упорядочены по (created_at, источник, id) по убыванию и объединяются
+при чтении. Курсор - ключ последнего элемента страницы; следующая страница
+берет из каждого источника строки строго после него (keyset, без OFFSET).
+get_feed_since по тому же ключу отдает пропущенное после переподключения WebSocket.
+"""
+import base64
+import binascii
+import heapq
+import json
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import (
+    NOTIFICATION_STATUS_CHOICES,
+    NOTIFICATION_TYPE_CHOICES,
+    Broadcast,
+    BroadcastReadMarker,
+    BroadcastReceipt,
+    Notification,
+)
+
+SOURCE_NOTIFICATION = 'notification'
+SOURCE_BROADCAST = 'broadcast'
+# Порядок источников при одинаковом created_at
+SOURCE_RANKS = {SOURCE_BROADCAST: 0, SOURCE_NOTIFICATION: 1}
+
+
+def encode_cursor(item):
+    value = json.dumps([item['created_at'].isoformat(), item['source'], item['id']])
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(value):
+    """(created_at, ранг источника, id) из курсора; ValueError, если курсор испорчен"""
+    try:
+        created_at, source, id = json.loads(base64.urlsafe_b64decode(value.encode()))
+        return datetime.fromisoformat(created_at), SOURCE_RANKS[source], int(id)
+    except (TypeError, KeyError, json.JSONDecodeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f'Invalid cursor: {e}')
+
+
+def after_cursor(queryset, cursor, source):
+    """Строки источника, идущие после курсора в порядке (-created_at, -ранг, -id)"""
+    if cursor is None:
+        return queryset
+    created_at, cursor_rank, cursor_id = cursor
+    rank = SOURCE_RANKS[source]
+
+    # Условие created_at <= X отдельно от OR: оно задает границу диапазона в индексе
+    # (..., -created_at, -id), иначе чтение начинается с самых новых строк
+    if rank < cursor_rank:
+        return queryset.filter(created_at__lte=created_at)
+    if rank > cursor_rank:
+        return queryset.filter(created_at__lt=created_at)
+    return queryset.filter(Q(created_at__lt=created_at) | Q(id__lt=cursor_id), created_at__lte=created_at)
+
+
+def newer_than_cursor(queryset, cursor, source):
+    """Строки источника новее курсора (обратное к after_cursor)"""
+    created_at, cursor_rank, cursor_id = cursor
+    rank = SOURCE_RANKS[source]
+
+    if rank > cursor_rank:
+        return queryset.filter(created_at__gte=created_at)
+    if rank < cursor_rank:
+        return queryset.filter(created_at__gt=created_at)
+    return queryset.filter(Q(created_at__gt=created_at) | Q(id__gt=cursor_id), created_at__gte=created_at)
+
+
+def audience_broadcasts(audiences):
+    """Действующие рассылки для 'all' и переданных аудиторий"""
+    return Broadcast.objects.filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()),
+        audience__in={Broadcast.AUDIENCE_ALL, *audiences},
+    )
+
+
+def broadcast_read_filter(user_id, read_until):
+    """Условие "рассылка прочитана пользователем" (по отметке или квитанции)"""
+    condition = Exists(BroadcastReceipt.objects.filter(broadcast=OuterRef('pk'), user_id=user_id))
+    if read_until is not None:
+        condition = Q(condition) | Q(created_at__lte=read_until)
+    return condition
+
+
+def unread_cutoff(now=None):
+    """Рассылки не новее этого момента считаются прочитанными (BROADCAST_UNREAD_DAYS)"""
+    return (now or timezone.now()) - timedelta(days=settings.BROADCAST_UNREAD_DAYS)
+
+
+def get_read_until(user_id):
+    """Отметка read-all пользователя, но не раньше unread_cutoff()"""
+    read_until = BroadcastReadMarker.objects.filter(user_id=user_id).values_list('read_until', flat=True).first()
+    cutoff = unread_cutoff()
+    return max(read_until, cutoff) if read_until else cutoff
+
+
+def count_unread_broadcasts(user_id, audiences):
+    return audience_broadcasts(audiences).exclude(broadcast_read_filter(user_id, get_read_until(user_id))).count()
+
+
+def serialize_notification(n):
+    return {
+        'id': n.id,
+        'source': SOURCE_NOTIFICATION,
+        'type': n.type,
+        'event': n.event,
+        'title': n.title,
+        'message': n.message,
+        'data': n.data,
+        'status': n.status,
+        'read_at': n.read_at,
+        'created_at': n.created_at,
+    }
+
+
+def serialize_broadcast(b, read_until=None):
+    read_at = getattr(b, 'receipt_read_at', None)
+    if read_at is None and read_until is not None and b.created_at <= read_until:
+        read_at = read_until
+    return {
+        'id': b.id,
+        'source': SOURCE_BROADCAST,
+        'type': NOTIFICATION_TYPE_CHOICES.IN_APP,
+        'event': b.event,
+        'title': b.title,
+        'message': b.message,
+        'data': b.data,
+        'status': NOTIFICATION_STATUS_CHOICES.READ if read_at else NOTIFICATION_STATUS_CHOICES.SENT,
+        'read_at': read_at,
+        'created_at': b.created_at,
+    }
+
+
+def item_json(item):
+    """Элемент ленты для JSON ответа или сообщения WebSocket"""
+    return {
+        **item,
+        'read_at': item['read_at'].isoformat() if item['read_at'] else None,
+        'created_at': item['created_at'].isoformat(),
+    }
+
+
+def user_notifications(user_id, status=None, type=None, unread_only=False, cursor=None):
+    """
+    Личные уведомления после курсора в порядке ленты
+    Фильтры совпадают с индексами Notification: (user_id[, status | type], -created_at, -id)
+    и частичным индексом непрочитанных
+    """
+    notifications = Notification.objects.filter(user_id=user_id)
+    if status:
+        notifications = notifications.filter(status=status)
+    if type:
+        notifications = notifications.filter(type=type)
+    if unread_only:
+        notifications = notifications.filter(read_at__isnull=True)
+    return after_cursor(notifications, cursor, SOURCE_NOTIFICATION).order_by('-created_at', '-id')
+
+
+def get_feed(user_id, audiences=(), status=None, type=None, unread_only=False, cursor=None, limit=50):
+    """
+    Страница ленты: (элементы, курсор следующей страницы или None)
+    Из каждого источника читается не больше limit + 1 строк
+    """
+    notifications = user_notifications(user_id, status, type, unread_only, cursor)
+    sources = [(serialize_notification(n) for n in notifications[:limit + 1])]
+
+    # Рассылки - in-app, их статус только sent или read
+    if type in (None, '', NOTIFICATION_TYPE_CHOICES.IN_APP) and status in (
+        None, '', NOTIFICATION_STATUS_CHOICES.SENT, NOTIFICATION_STATUS_CHOICES.READ
+    ):
+        read_until = get_read_until(user_id)
+        read = broadcast_read_filter(user_id, read_until)
+        broadcasts = audience_broadcasts(audiences)
+        if unread_only or status == NOTIFICATION_STATUS_CHOICES.SENT:
+            broadcasts = broadcasts.exclude(read)
+        elif status == NOTIFICATION_STATUS_CHOICES.READ:
+            broadcasts = broadcasts.filter(read)
+        broadcasts = after_cursor(broadcasts, cursor, SOURCE_BROADCAST).annotate(
+            receipt_read_at=Subquery(
+                BroadcastReceipt.objects.filter(broadcast=OuterRef('pk'), user_id=user_id).values('read_at')[:1]
+            )
+        ).order_by('-created_at', '-id')
+        sources.append(serialize_broadcast(b, read_until) for b in broadcasts[:limit + 1])
+
+    def sort_key(item):
+        return item['created_at'], SOURCE_RANKS[item['source']], item['id']
+
+    items = list(islice(heapq.merge(*sources, key=sort_key, reverse=True), limit + 1))
+    if len(items) > limit:
+        return items[:limit], encode_cursor(items[limit - 1])
+    return items, None
+
+
+def get_feed_since(user_id, audiences, cursor, limit):
+    """
+    Элементы новее курсора, старые сначала: (элементы, все ли вошли в limit)
+    Если не все - клиенту нужно перечитать ленту через HTTP
+    """
+    read_until = get_read_until(user_id)
+    notifications = newer_than_cursor(
+        Notification.objects.filter(user_id=user_id), cursor, SOURCE_NOTIFICATION
+    ).order_by('created_at', 'id')
+    broadcasts = newer_than_cursor(audience_broadcasts(audiences), cursor, SOURCE_BROADCAST).annotate(
+        receipt_read_at=Subquery(
+            BroadcastReceipt.objects.filter(broadcast=OuterRef('pk'), user_id=user_id).values('read_at')[:1]
+        )
+    ).order_by('created_at', 'id')
+
+    def sort_key(item):
+        return item['created_at'], SOURCE_RANKS[item['source']], item['id']
+
+    items = list(islice(heapq.merge(
+        (serialize_notification(n) for n in notifications[:limit + 1]),
+        (serialize_broadcast(b, read_until) for b in broadcasts[:limit + 1]),
+        key=sort_key
+    ), limit + 1))
+    return items[:limit], len(items) <= limit
@@ -0,0 +1,77 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+DEFAULT_SIZES = [10, 100, 1000, 5000]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить создание N уведомлений запросами /api/notifications/send/ по одному '
+        'и одним запросом /api/notifications/send-batch/ (данные откатываются)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size', action='append', type=int, dest='sizes',
+            help=f'Уведомлений в пачке, можно несколько (по умолчанию {", ".join(map(str, DEFAULT_SIZES))})'
+        )
+        parser.add_argument('--users', type=int, default=500, help='Разных получателей в пачке')
+        parser.add_argument('--email-share', type=float, default=0.2, help='Доля email уведомлений')
+
+    def handle(self, *args, **options):
+        client = Client()
+
+        self.stdout.write(f"{'size':>6}{'mode':>8}{'total ms':>11}{'per item ms':>13}{'queries':>9}")
+        for size in options['sizes'] or DEFAULT_SIZES:
+            payloads = self.build_payloads(size, options['users'], options['email_share'])
+
+            def one_by_one():
+                for payload in payloads:
+                    client.post(reverse('notifications:send_notification'), json.dumps(payload), content_type='application/json')
+
+            def batch():
+                client.post(
+                    reverse('notifications:send_notifications_batch'),
+                    json.dumps({'notifications': payloads}),
+                    content_type='application/json'
+                )
+
+            for mode, run in (('single', one_by_one), ('batch', batch)):
+                elapsed, queries = self.measure(run)
+                self.stdout.write(f'{size:>6}{mode:>8}{elapsed * 1000:>11.1f}{elapsed * 1000 / size:>13.3f}{queries:>9}')
+
+    def build_payloads(self, size, users, email_share):
+        email_every = round(1 / email_share) if email_share else 0
+        return [
+            {
+                'user_id': index % users + 1,
+                'type': 'email' if email_every and index % email_every == 0 else 'in_app',
+                'event': 'benchmark',
+                'title': f'Benchmark {index}',
+                'message': 'Benchmark notification',
+                'email_to': f'user{index % users + 1}@example.com',
+            }
+            for index in range(size)
+        ]
+
+    def measure(self, run):
+        """Время и число запросов к БД; созданное откатывается, email не ставятся в очередь"""
+        try:
+            with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+                started = time.monotonic()
+                run()
+                elapsed = time.monotonic() - started
+                raise Rollback
+        except Rollback:
+            pass
+        return elapsed, len(queries)
@@ -0,0 +1,136 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from apps.notifications.feed import decode_cursor, get_feed, user_notifications
+from apps.notifications.models import NOTIFICATION_STATUS_CHOICES, NOTIFICATION_TYPE_CHOICES, Notification
+
+BENCHMARK_EVENT = 'benchmark_feed'
+INSERT_BATCH_SIZE = 10000
+
+# Фильтры ленты: (название, status, type, unread_only)
+FILTERS = [
+    ('all', None, None, False),
+    ('status', NOTIFICATION_STATUS_CHOICES.SENT, None, False),
+    ('type', None, NOTIFICATION_TYPE_CHOICES.IN_APP, False),
+    ('unread', None, None, True),
+]
+
+
+@contextmanager
+def explicit_created_at():
+    """bulk_create с заданным created_at: auto_now_add иначе перезаписывает его текущим временем"""
+    field = Notification._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполнить Notification тестовыми строками и сравнить время страницы ленты '
+        'по курсору и через OFFSET на разной глубине (данные удаляются после замера)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Всего уведомлений')
+        parser.add_argument('--users', type=int, default=1000, help='Получателей')
+        parser.add_argument(
+            '--hot-share', type=float, default=0.2,
+            help='Доля строк у одного пользователя, ленту которого листает замер'
+        )
+        parser.add_argument('--limit', type=int, default=50, help='Размер страницы')
+        parser.add_argument('--keep', action='store_true', help='Не удалять тестовые строки')
+        parser.add_argument('--explain', action='store_true', help='Показать план запроса самой глубокой страницы')
+
+    def handle(self, *args, **options):
+        hot_user_id = options['users'] + 1_000_000_000
+        limit = options['limit']
+
+        started = time.monotonic()
+        self.seed(options['rows'], options['users'], hot_user_id, options['hot_share'])
+        self.stdout.write(f"Seeded {options['rows']} notifications in {time.monotonic() - started:.1f} s")
+
+        try:
+            self.stdout.write(f"{'filter':>8}{'page':>8}{'rows before':>13}{'cursor ms':>11}{'offset ms':>11}")
+            for name, status, type, unread_only in FILTERS:
+                cursor = self.measure_filter(name, hot_user_id, status, type, unread_only, limit)
+                if options['explain'] and cursor is not None:
+                    self.stdout.write(f'{name}: ' + user_notifications(
+                        hot_user_id, status, type, unread_only, cursor
+                    )[:limit + 1].explain())
+        finally:
+            if not options['keep']:
+                Notification.objects.filter(event=BENCHMARK_EVENT).delete()
+
+    def seed(self, rows, users, hot_user_id, hot_share):
+        """
+        Уведомления с разными created_at, статусами и типами
+        Каждая строка с номером, кратным 1 / hot_share, - у hot_user_id
+        """
+        hot_every = round(1 / hot_share) if hot_share else 0
+        types = [NOTIFICATION_TYPE_CHOICES.IN_APP] * 7 + [NOTIFICATION_TYPE_CHOICES.EMAIL] * 2 + [NOTIFICATION_TYPE_CHOICES.PUSH]
+        statuses = [NOTIFICATION_STATUS_CHOICES.SENT] * 6 + [NOTIFICATION_STATUS_CHOICES.READ] * 3 + [NOTIFICATION_STATUS_CHOICES.FAILED]
+        start = timezone.now() - timedelta(seconds=rows)
+        rng = random.Random(0)
+
+        with explicit_created_at():
+            for batch_start in range(0, rows, INSERT_BATCH_SIZE):
+                batch = []
+                for index in range(batch_start, min(batch_start + INSERT_BATCH_SIZE, rows)):
+                    created_at = start + timedelta(seconds=index)
+                    status = rng.choice(statuses)
+                    batch.append(Notification(
+                        user_id=hot_user_id if hot_every and index % hot_every == 0 else index % users + 1,
+                        type=rng.choice(types),
+                        status=status,
+                        event=BENCHMARK_EVENT,
+                        title=f'Benchmark {index}',
+                        message='Benchmark notification',
+                        read_at=created_at if status == NOTIFICATION_STATUS_CHOICES.READ else None,
+                        created_at=created_at,
+                    ))
+                Notification.objects.bulk_create(batch)
+
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Notification._meta.db_table}')
+
+    def measure_filter(self, name, user_id, status, type, unread_only, limit):
+        """
+        Листать ленту курсором до конца; на страницах 1, 10, 100, ... и последней
+        сравнить запрос страницы по курсору с той же страницей через OFFSET
+        Возвращает курсор последней страницы
+        """
+        page = 0
+        cursor = None
+        while True:
+            page += 1
+            _, next_cursor = get_feed(user_id, (), status, type, unread_only, cursor, limit)
+
+            if next_cursor is None or self.is_sample(page):
+                offset = (page - 1) * limit
+                cursor_ms = self.timed(user_notifications(user_id, status, type, unread_only, cursor)[:limit + 1])
+                offset_ms = self.timed(user_notifications(user_id, status, type, unread_only)[offset:offset + limit])
+                self.stdout.write(f'{name:>8}{page:>8}{offset:>13}{cursor_ms:>11.2f}{offset_ms:>11.2f}')
+
+            if next_cursor is None:
+                return cursor
+            cursor = decode_cursor(next_cursor)
+
+    def timed(self, queryset):
+        started = time.monotonic()
+        list(queryset)
+        return (time.monotonic() - started) * 1000
+
+    def is_sample(self, page):
+        while page % 10 == 0:
+            page //= 10
+        return page == 1
@@ -15,7 +15,7 @@ class NOTIFICATION_STATUS_CHOICES(models.TextChoices):
 
 
 class Notification(models.Model):
-    user_id = models.IntegerField(db_index=True)
+    user_id = models.IntegerField()
     type = models.CharField(max_length=20, choices=NOTIFICATION_TYPE_CHOICES, default='in_app')
     status = models.CharField(max_length=20, choices=NOTIFICATION_STATUS_CHOICES, default='pending')
     event = models.CharField(max_length=100)
@@ -35,8 +35,18 @@ class Notification(models.Model):
         verbose_name = 'Уведомление'
         verbose_name_plural = 'Уведомления'
         ordering = ['-created_at']
+        # Под каждый фильтр ленты (apps/notifications/feed.py) - индекс в порядке выдачи,
+        # страница по курсору читает из индекса только limit + 1 строк
         indexes = [
-            models.Index(fields=['user_id', 'status']),
+            models.Index(fields=['user_id', '-created_at', '-id']),
+            models.Index(fields=['user_id', 'status', '-created_at', '-id']),
+            models.Index(fields=['user_id', 'type', '-created_at', '-id']),
+            # Непрочитанные: лента unread_only, счетчик и read-all без чтения прочитанных строк
+            models.Index(
+                fields=['user_id', '-created_at', '-id'],
+                condition=models.Q(read_at__isnull=True),
+                name='notification_unread_idx'
+            ),
             models.Index(fields=['status'])
         ]
     
@@ -44,10 +54,19 @@ class Notification(models.Model):
         return f'{self.type} - {self.title} (User: {self.user_id})'
     
     def mark_as_read(self):
-        if not self.read_at:
-            self.read_at = timezone.now()
-            self.status = 'read'
-            self.save(update_fields=['read_at', 'status', 'updated_at'])
+        """Отметить прочитанным; True, если уведомление было непрочитанным (для счетчика)"""
+        if self.read_at:
+            return False
+        now = timezone.now()
+        # Условный UPDATE: при одновременных запросах прочтение засчитывается один раз
+        updated = Notification.objects.filter(pk=self.pk, read_at__isnull=True).update(
+            read_at=now,
+            status='read',
+            updated_at=now
+        )
+        self.read_at = now
+        self.status = 'read'
+        return bool(updated)
     
     def mark_as_sent(self):
         self.status = 'sent'
@@ -77,6 +96,57 @@ class NotificationPreference(models.Model):
         
     def __str__(self):
         return f'Preferences for User: {self.user_id}'
-    
-    
-    
+
+
+class Broadcast(models.Model):
+    """
+    Уведомление для аудитории, хранится один раз (apps/notifications/feed.py)
+    audience: 'all' - все пользователи, 'channel:<id>' - участники канала
+    """
+    AUDIENCE_ALL = 'all'
+
+    audience = models.CharField(max_length=100, default=AUDIENCE_ALL)
+    event = models.CharField(max_length=100)
+    title = models.CharField(max_length=200)
+    message = models.TextField(max_length=2000)
+    data = models.JSONField(default=dict, blank=True)
+    expires_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Рассылка'
+        verbose_name_plural = 'Рассылки'
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['audience', '-created_at', '-id']),
+        ]
+
+    def __str__(self):
+        return f'{self.audience} - {self.title}'
+
+
+class BroadcastReceipt(models.Model):
+    """Прочтение рассылки пользователем - строка есть только у прочитавших"""
+    broadcast = models.ForeignKey(Broadcast, on_delete=models.CASCADE, related_name='receipts')
+    user_id = models.IntegerField()
+    read_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Прочтение рассылки'
+        verbose_name_plural = 'Прочтения рассылок'
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'broadcast'], name='unique_broadcast_receipt'),
+        ]
+
+
+class BroadcastReadMarker(models.Model):
+    """Все рассылки до read_until прочитаны пользователем (mark_all_read) - одна строка на пользователя"""
+    user_id = models.IntegerField(unique=True)
+    read_until = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Отметка прочтения рассылок'
+        verbose_name_plural = 'Отметки прочтения рассылок'
+
+    def __str__(self):
+        return f'Broadcasts read until {self.read_until} (User: {self.user_id})'
@@ -0,0 +1,52 @@
+"""
+Доставка новых уведомлений клиентам по WebSocket (Django Channels)
+
+Каждое соединение (apps/notifications/consumers.py) подписано на группу
+пользователя и группы его аудиторий рассылок. После коммита создания
+уведомления и рассылки публикуются в эти группы через CHANNEL_LAYERS (Redis).
+"""
+import hashlib
+import logging
+import re
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .feed import encode_cursor, item_json
+
+logger = logging.getLogger(__name__)
+
+FEED_MESSAGE_TYPE = 'feed.item'
+
+
+def user_group(user_id):
+    return f'notifications.user.{user_id}'
+
+
+def audience_group(audience):
+    # Имя группы Channels: буквы, цифры, '-', '_', '.' и короче 100 символов
+    name = re.sub(r'[^0-9A-Za-z_.-]', '_', audience)
+    if name != audience or len(name) > 60:
+        name = hashlib.sha1(audience.encode()).hexdigest()
+    return f'notifications.audience.{name}'
+
+
+def feed_message(item):
+    """Сообщение клиенту: элемент ленты и курсор для продолжения после переподключения"""
+    return {**item_json(item), 'cursor': encode_cursor(item)}
+
+
+def publish(messages):
+    """Отправить [(группа, элемент ленты)]; ошибка слоя не ломает запрос - клиент догонит по курсору"""
+    layer = get_channel_layer()
+    if layer is None or not messages:
+        return
+
+    async def send_all():
+        for group, item in messages:
+            await layer.group_send(group, {'type': FEED_MESSAGE_TYPE, 'item': feed_message(item)})
+
+    try:
+        async_to_sync(send_all)()
+    except Exception as e:
+        logger.warning(f'WebSocket publish failed for {len(messages)} messages: {e}')
@@ -0,0 +1,26 @@
+"""
+Отзыв access токенов
+
+user-service при деактивации, смене ролей и удалении пользователя пишет время
+отзыва в общий Redis (USER_CACHE_REDIS_URL, ключ users:revoked:<user_id>) на
+время жизни токена. Токен, выданный раньше отзыва, не принимается.
+"""
+import redis
+from django.conf import settings
+
+USER_REVOKED_KEY = 'users:revoked:{user_id}'
+
+_redis = redis.Redis.from_url(settings.USER_CACHE_REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+
+def get_connection():
+    return _redis
+
+
+def is_token_revoked(user_id, issued_at):
+    """
+    Токен выдан до отзыва (время с долями секунды, как в user-service)
+    Ошибка Redis пробрасывается: вызывающий решает, пускать ли без проверки
+    """
+    revoked_at = get_connection().get(USER_REVOKED_KEY.format(user_id=user_id))
+    return revoked_at is not None and issued_at < float(revoked_at)
@@ -1,5 +1,5 @@
 from celery import shared_task
-from django.core.mail import send_mail
+from django.core.mail import get_connection, send_mail
 from django.conf import settings
 import logging
 
@@ -62,6 +62,57 @@ def send_email_task(self, notification_id):
         raise  # Повторить задачу
 
 
+@shared_task(
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    retry_kwargs={'max_retries': 5}
+)
+def send_email_batch_task(notification_ids):
+    """
+    Отправка пачки email уведомлений через одно SMTP соединение
+
+    Повторяется целиком, только если не удалось открыть соединение;
+    неотправленные письма повторяются по одному через send_email_task
+    """
+    from .models import Notification
+    from django.utils import timezone
+
+    notifications = list(Notification.objects.filter(id__in=notification_ids, status='pending'))
+    sent = []
+    failed = []
+
+    with get_connection(fail_silently=False) as connection:
+        for notification in notifications:
+            if not notification.email_to:
+                logger.warning(f"No email_to for notification {notification.id}")
+                notification.mark_as_failed("No recipient email")
+                continue
+
+            try:
+                send_mail(
+                    subject=notification.email_subject or notification.title,
+                    message=notification.message,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    recipient_list=[notification.email_to],
+                    html_message=notification.email_html,
+                    fail_silently=False,
+                    connection=connection,
+                )
+                sent.append(notification.id)
+            except Exception as e:
+                logger.error(f"Failed to send email for notification {notification.id}: {e}")
+                failed.append(notification.id)
+
+    now = timezone.now()
+    Notification.objects.filter(id__in=sent).update(status='sent', sent_at=now, updated_at=now)
+
+    for notification_id in failed:
+        send_email_task.delay(notification_id)
+
+    logger.info(f"Email batch: {len(sent)} sent, {len(failed)} retried separately")
+
+
 @shared_task
 def send_push_notification_task(notification_id):
     """Отправка push уведомления (Firebase)"""
@@ -114,3 +165,14 @@ def retry_failed_notifications():
             send_push_notification_task.delay(notification.id)
 
     logger.info(f"Retrying {failed.count()} failed notifications")
+
+
+@shared_task
+def reconcile_unread_counters():
+    """
+    Пересчитать счетчики непрочитанных в Redis по БД
+    Запускается Celery Beat каждые UNREAD_RECONCILE_INTERVAL секунд
+    """
+    from .unread import reconcile_unread
+
+    reconcile_unread()
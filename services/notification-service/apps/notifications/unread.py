@@ -0,0 +1,299 @@
+"""
+Счетчики непрочитанных уведомлений в Redis - чтение без запросов к БД
+
+Личные уведомления: notifications:unread:<user_id> увеличивается после коммита
+создания и уменьшается при прочтении (mark_as_read, mark_all_read).
+Рассылки (apps/notifications/feed.py) считаются по индексу:
+- notifications:audience:<audience> - ZSET id -> created_at;
+- notifications:broadcast_expires - HASH id -> expires_at для рассылок со сроком;
+- notifications:read_until:<user_id> и notifications:broadcasts_read:<user_id> -
+  отметка read-all и прочитанные после нее рассылки.
+
+У каждого вида ключей свой префикс: сверка удаляет лишние ключи по шаблону.
+
+В индексе только рассылки не старше BROADCAST_UNREAD_DAYS: более старые
+считаются прочитанными, и index_broadcast удаляет их из ZSET аудитории.
+
+Ошибки Redis не ломают запросы, а гонки между транзакциями могут сдвинуть
+счетчик, поэтому reconcile_unread_counters (Celery Beat, UNREAD_RECONCILE_INTERVAL)
+сверяет все с БД частями по UNREAD_RECONCILE_CHUNK_SIZE. Счетчик меняется
+compare-and-set: если за время сверки он изменился, его поправит следующая.
+"""
+import logging
+from itertools import islice
+
+import redis
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from .feed import unread_cutoff
+from .models import Broadcast, BroadcastReadMarker, BroadcastReceipt, Notification
+
+logger = logging.getLogger(__name__)
+
+UNREAD_KEY = 'notifications:unread:{user_id}'
+AUDIENCE_KEY = 'notifications:audience:{audience}'
+EXPIRES_KEY = 'notifications:broadcast_expires'
+READ_UNTIL_KEY = 'notifications:read_until:{user_id}'
+READ_KEY = 'notifications:broadcasts_read:{user_id}'
+
+# Записать значения по БД только в счетчики, которые не изменились с момента чтения
+# KEYS - счетчики; ARGV - прочитанные значения ('' - ключа не было), затем значения по БД
+COMPARE_AND_SET_SCRIPT = """
+local count = #KEYS
+local changed = 0
+for i = 1, count do
+    local current = redis.call('GET', KEYS[i]) or ''
+    local value = ARGV[count + i]
+    if current == ARGV[i] and (current == '' and '0' or current) ~= value then
+        if value == '0' then
+            redis.call('DEL', KEYS[i])
+        else
+            redis.call('SET', KEYS[i], value)
+        end
+        changed = changed + 1
+    end
+end
+return changed
+"""
+
+# Отметка read-all только сдвигается вперед: сверка не откатит более новую
+# KEYS - отметки; ARGV - время по БД
+SET_LATER_SCRIPT = """
+for i = 1, #KEYS do
+    local current = tonumber(redis.call('GET', KEYS[i]))
+    if not current or current < tonumber(ARGV[i]) then
+        redis.call('SET', KEYS[i], ARGV[i])
+    end
+end
+return #KEYS
+"""
+
+
+def get_connection():
+    return get_redis_connection('default')
+
+
+def increment_unread(counts):
+    """Увеличить счетчики {user_id: число новых уведомлений}"""
+    if not counts:
+        return
+    try:
+        pipe = get_connection().pipeline(transaction=False)
+        for user_id, count in counts.items():
+            pipe.incrby(UNREAD_KEY.format(user_id=user_id), count)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f'Unread counters increment failed for {len(counts)} users: {e}')
+
+
+def decrement_unread(user_id, count=1):
+    if not count:
+        return
+    try:
+        get_connection().decrby(UNREAD_KEY.format(user_id=user_id), count)
+    except redis.RedisError as e:
+        logger.warning(f'Unread counter decrement failed for user {user_id}: {e}')
+
+
+def index_broadcast(broadcast):
+    """Добавить рассылку в индекс аудитории и удалить из него рассылки старше BROADCAST_UNREAD_DAYS"""
+    key = AUDIENCE_KEY.format(audience=broadcast.audience)
+    try:
+        pipe = get_connection().pipeline(transaction=False)
+        pipe.zadd(key, {broadcast.id: broadcast.created_at.timestamp()})
+        pipe.zremrangebyscore(key, '-inf', unread_cutoff().timestamp())
+        if broadcast.expires_at:
+            pipe.hset(EXPIRES_KEY, broadcast.id, broadcast.expires_at.timestamp())
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f'Broadcast {broadcast.id} indexing failed: {e}')
+
+
+def mark_broadcast_read(user_id, broadcast_id):
+    try:
+        get_connection().sadd(READ_KEY.format(user_id=user_id), broadcast_id)
+    except redis.RedisError as e:
+        logger.warning(f'Broadcast read mark failed for user {user_id}: {e}')
+
+
+def mark_all_read(user_id, read_count, read_until):
+    """Личные: минус read_count; рассылки: новая отметка read_until, прочитанные до нее не нужны"""
+    try:
+        pipe = get_connection().pipeline(transaction=False)
+        if read_count:
+            pipe.decrby(UNREAD_KEY.format(user_id=user_id), read_count)
+        pipe.set(READ_UNTIL_KEY.format(user_id=user_id), read_until.timestamp())
+        pipe.delete(READ_KEY.format(user_id=user_id))
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f'Mark all read failed in Redis for user {user_id}: {e}')
+
+
+def get_unread_count(user_id, audiences=()):
+    """
+    Непрочитанные личные уведомления и рассылки для 'all' и audiences
+    Два-три обращения к Redis; при недоступности Redis - None
+    """
+    audience_keys = [AUDIENCE_KEY.format(audience=audience) for audience in {Broadcast.AUDIENCE_ALL, *audiences}]
+    try:
+        connection = get_connection()
+        unread, read_until, read = connection.pipeline(transaction=False).get(
+            UNREAD_KEY.format(user_id=user_id)
+        ).get(
+            READ_UNTIL_KEY.format(user_id=user_id)
+        ).smembers(
+            READ_KEY.format(user_id=user_id)
+        ).execute()
+
+        # Не старше BROADCAST_UNREAD_DAYS: ZSET читается только за это окно
+        since = max(float(read_until or 0), unread_cutoff().timestamp())
+        pipe = connection.pipeline(transaction=False)
+        for key in audience_keys:
+            pipe.zrangebyscore(key, f'({since}', '+inf')
+        broadcast_ids = set().union(*pipe.execute()) - read
+        if broadcast_ids:
+            broadcast_ids = list(broadcast_ids)
+            now = timezone.now().timestamp()
+            expires = connection.hmget(EXPIRES_KEY, broadcast_ids)
+            broadcast_ids = [id for id, expires_at in zip(broadcast_ids, expires) if not expires_at or float(expires_at) > now]
+    except redis.RedisError as e:
+        logger.warning(f'Unread count unavailable for user {user_id}: {e}')
+        return None
+
+    # Счетчик мог уйти ниже нуля из-за гонки до ближайшей сверки
+    return max(int(unread or 0), 0) + len(broadcast_ids)
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def key_id(key):
+    """Число в конце ключа или члена множества: user_id или id рассылки"""
+    return int(key.decode().rsplit(':', 1)[-1])
+
+
+def reconcile_counters(connection, chunk_size):
+    """
+    Счетчики личных уведомлений: сначала пользователи с непрочитанными в БД,
+    потом ключи Redis без них. Значения Redis читаются до COUNT по БД, запись -
+    compare-and-set, поэтому изменения во время сверки не затираются
+    Возвращает (число пользователей, число исправленных счетчиков)
+    """
+    script = connection.register_script(COMPARE_AND_SET_SCRIPT)
+    unread = Notification.objects.filter(read_at__isnull=True)
+
+    def apply(user_ids):
+        keys = [UNREAD_KEY.format(user_id=user_id) for user_id in user_ids]
+        expected = [value.decode() if value is not None else '' for value in connection.mget(keys)]
+        counts = dict(
+            unread.filter(user_id__in=user_ids).values('user_id').annotate(count=Count('id')).values_list('user_id', 'count')
+        )
+        return script(keys=keys, args=expected + [counts.get(user_id, 0) for user_id in user_ids])
+
+    users = changed = 0
+    last_user_id = None
+    while True:
+        user_ids = unread.order_by('user_id').values_list('user_id', flat=True).distinct()
+        if last_user_id is not None:
+            user_ids = user_ids.filter(user_id__gt=last_user_id)
+        user_ids = list(user_ids[:chunk_size])
+        if not user_ids:
+            break
+        last_user_id = user_ids[-1]
+        users += len(user_ids)
+        changed += apply(user_ids)
+
+    for keys in chunks(connection.scan_iter(match=UNREAD_KEY.format(user_id='*'), count=chunk_size), chunk_size):
+        user_ids = [key_id(key) for key in keys]
+        with_unread = set(unread.filter(user_id__in=user_ids).values_list('user_id', flat=True).distinct())
+        stale = [user_id for user_id in user_ids if user_id not in with_unread]
+        if stale:
+            changed += apply(stale)
+
+    return users, changed
+
+
+def remove_stale(connection, pattern, members, remove, active_ids, last_id):
+    """
+    Удалить из ключей по шаблону id рассылок, которых нет среди active_ids
+    Рассылки новее last_id не трогаем - их добавили после начала сверки
+    """
+    for key in connection.scan_iter(match=pattern, count=1000):
+        stale = [member for member in members(key) if key_id(member) <= last_id and key_id(member) not in active_ids]
+        for chunk in chunks(stale, 1000):
+            remove(key, *chunk)
+
+
+def reconcile_broadcasts(connection, chunk_size):
+    """
+    Индекс рассылок, сроки и прочитанные рассылки по БД частями
+    Учитываются только действующие рассылки не старше BROADCAST_UNREAD_DAYS
+    Возвращает число рассылок в индексе
+    """
+    now = timezone.now()
+    last_id = Broadcast.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    active = Broadcast.objects.filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=now),
+        created_at__gt=unread_cutoff(now),
+        id__lte=last_id,
+    )
+
+    active_ids = set()
+    rows = active.values_list('id', 'audience', 'created_at', 'expires_at').iterator(chunk_size=chunk_size)
+    for chunk in chunks(rows, chunk_size):
+        pipe = connection.pipeline(transaction=False)
+        for id, audience, created_at, expires_at in chunk:
+            pipe.zadd(AUDIENCE_KEY.format(audience=audience), {id: created_at.timestamp()})
+            if expires_at:
+                pipe.hset(EXPIRES_KEY, id, expires_at.timestamp())
+            active_ids.add(id)
+        pipe.execute()
+
+    remove_stale(
+        connection, AUDIENCE_KEY.format(audience='*'),
+        lambda key: connection.zrange(key, 0, -1), connection.zrem, active_ids, last_id
+    )
+    remove_stale(
+        connection, EXPIRES_KEY,
+        connection.hkeys, connection.hdel, active_ids, last_id
+    )
+
+    receipts = BroadcastReceipt.objects.filter(broadcast__in=active).values_list('user_id', 'broadcast_id')
+    for chunk in chunks(receipts.iterator(chunk_size=chunk_size), chunk_size):
+        pipe = connection.pipeline(transaction=False)
+        for user_id, broadcast_id in chunk:
+            pipe.sadd(READ_KEY.format(user_id=user_id), broadcast_id)
+        pipe.execute()
+
+    remove_stale(
+        connection, READ_KEY.format(user_id='*'),
+        connection.smembers, connection.srem, active_ids, last_id
+    )
+
+    script = connection.register_script(SET_LATER_SCRIPT)
+    markers = BroadcastReadMarker.objects.values_list('user_id', 'read_until')
+    for chunk in chunks(markers.iterator(chunk_size=chunk_size), chunk_size):
+        script(
+            keys=[READ_UNTIL_KEY.format(user_id=user_id) for user_id, _ in chunk],
+            args=[read_until.timestamp() for _, read_until in chunk]
+        )
+
+    return len(active_ids)
+
+
+def reconcile_unread():
+    """Сверить счетчики и индекс рассылок с БД; возвращает число пользователей со счетчиком"""
+    connection = get_connection()
+    chunk_size = settings.UNREAD_RECONCILE_CHUNK_SIZE
+
+    users, changed = reconcile_counters(connection, chunk_size)
+    broadcasts = reconcile_broadcasts(connection, chunk_size)
+
+    logger.info(f'Unread counters reconciled: {users} users, {changed} counters fixed, {broadcasts} broadcasts indexed')
+    return users
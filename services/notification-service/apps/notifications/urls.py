@@ -6,9 +6,17 @@ app_name = 'notifications'
 urlpatterns = [
     
     path('api/notifications/send/', views.send_notification, name='send_notification'),
+    path('api/notifications/send-batch/', views.send_notifications_batch, name='send_notifications_batch'),
+    path('api/notifications/broadcast/', views.create_broadcast, name='create_broadcast'),
     path('api/notifications/user/<int:user_id>/', views.get_user_notifications, name='get_user_notifications'),
     path('api/notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
+    path('api/notifications/user/<int:user_id>/unread-count/', views.get_unread_count, name='get_unread_count'),
     path('api/notifications/user/<int:user_id>/read-all/', views.mark_all_read, name='mark_all_read'),
+    path(
+        'api/notifications/user/<int:user_id>/broadcasts/<int:broadcast_id>/read/',
+        views.mark_broadcast_read,
+        name='mark_broadcast_read'
+    ),
     path('api/notifications/preferences/<int:user_id>/', views.get_preferences, name='get_preferences'),
     path('api/notifications/preferences/<int:user_id>/update/', views.update_preferences, name='update_preferences'),
     
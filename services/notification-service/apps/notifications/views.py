@@ -1,17 +1,142 @@
 import json
 import logging
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.db.models import Q
 
-from .models import Notification, NotificationPreference
-from .tasks import send_email_task
+from apps.common.internal_auth import internal_only
+from . import unread
+from .audiences import get_user_audiences
+from .feed import (
+    count_unread_broadcasts,
+    decode_cursor,
+    get_feed,
+    item_json,
+    serialize_broadcast,
+    serialize_notification,
+)
+from .push import audience_group, publish, user_group
+from .models import (
+    NOTIFICATION_STATUS_CHOICES,
+    NOTIFICATION_TYPE_CHOICES,
+    Broadcast,
+    BroadcastReadMarker,
+    BroadcastReceipt,
+    Notification,
+    NotificationPreference,
+)
+from .tasks import send_email_batch_task
 
 logger = logging.getLogger(__name__)
 
+def validate_notification(payload):
+    """Ошибка в данных уведомления или None"""
+    if not isinstance(payload, dict):
+        return 'Уведомление должно быть объектом'
+    if not payload.get('user_id') or not payload.get('event') or not payload.get('title') or not payload.get('message'):
+        return 'Все поля обязательны для заполнения (user_id, event, title, message)'
+    try:
+        int(payload['user_id'])
+    except (TypeError, ValueError):
+        return 'user_id must be an integer'
+    if payload.get('type', NOTIFICATION_TYPE_CHOICES.IN_APP) not in NOTIFICATION_TYPE_CHOICES.values:
+        return 'Unknown notification type'
+    return None
+
+
+def preference_error(type, prefs):
+    """Ошибка, если тип уведомлений выключен у пользователя (нет настроек - все включено)"""
+    if prefs is None:
+        return None
+    if type == NOTIFICATION_TYPE_CHOICES.EMAIL and not prefs.email_enabled:
+        return 'Email notifications disabled'
+    if type == NOTIFICATION_TYPE_CHOICES.IN_APP and not prefs.in_app_enabled:
+        return 'In-app notifications disabled'
+    return None
+
+
+def enqueue_emails(notification_ids):
+    """Поставить отправку email в очередь частями по NOTIFICATION_EMAIL_CHUNK_SIZE"""
+    chunk_size = settings.NOTIFICATION_EMAIL_CHUNK_SIZE
+    for start in range(0, len(notification_ids), chunk_size):
+        send_email_batch_task.delay(notification_ids[start:start + chunk_size])
+
+
+def create_notifications(payloads):
+    """
+    Создать уведомления с учетом настроек пользователей
+    Настройки читаются одним IN запросом, уведомления вставляются bulk_create
+    сразу в итоговом статусе (in-app - sent), email ставятся в очередь после коммита
+    Возвращает (созданные уведомления, ошибки [{'index', 'error'}])
+    """
+    errors = []
+    valid = []
+    for index, payload in enumerate(payloads):
+        error = validate_notification(payload)
+        if error:
+            errors.append({'index': index, 'error': error})
+        else:
+            valid.append((index, payload))
+
+    prefs = NotificationPreference.objects.in_bulk(
+        {int(payload['user_id']) for _, payload in valid}, field_name='user_id'
+    )
+
+    now = timezone.now()
+    notifications = []
+    for index, payload in valid:
+        user_id = int(payload['user_id'])
+        type = payload.get('type', NOTIFICATION_TYPE_CHOICES.IN_APP)
+        error = preference_error(type, prefs.get(user_id))
+        if error:
+            errors.append({'index': index, 'error': error})
+            continue
+
+        in_app = type == NOTIFICATION_TYPE_CHOICES.IN_APP
+        notifications.append(Notification(
+            user_id=user_id,
+            type=type,
+            event=payload['event'],
+            title=payload['title'],
+            message=payload['message'],
+            data=payload.get('data', {}),
+            email_to=payload.get('email_to'),
+            status=NOTIFICATION_STATUS_CHOICES.SENT if in_app else NOTIFICATION_STATUS_CHOICES.PENDING,
+            sent_at=now if in_app else None
+        ))
+
+    with transaction.atomic():
+        created = Notification.objects.bulk_create(notifications, batch_size=settings.NOTIFICATION_BULK_CREATE_BATCH_SIZE)
+        email_ids = [n.id for n in created if n.type == NOTIFICATION_TYPE_CHOICES.EMAIL]
+        if email_ids:
+            transaction.on_commit(lambda: enqueue_emails(email_ids))
+        unread_counts = Counter(n.user_id for n in created)
+        transaction.on_commit(lambda: unread.increment_unread(unread_counts))
+        transaction.on_commit(lambda: publish([(user_group(n.user_id), serialize_notification(n)) for n in created]))
+
+    errors.sort(key=lambda item: item['index'])
+    return created, errors
+
+
+def create_notification(payload):
+    """
+    Создать одно уведомление
+    Возвращает (notification, None) или (None, ошибка)
+    """
+    created, errors = create_notifications([payload])
+    if errors:
+        return None, errors[0]['error']
+    return created[0], None
+
+
 @require_http_methods(['POST'])
 def send_notification(request):
     
@@ -23,106 +148,189 @@ def send_notification(request):
             'error': 'Invalid JSON'
         }, status=400)
     
-    user_id = data.get('user_id')
-    type = data.get('type')
-    event = data.get('event')
-    title = data.get('title')
-    message = data.get('message')
-    data_extra = data.get('data', {})
-    email_to = data.get('email_to')
-    
-    if not user_id or not event or not title or not message:
+    notification, error = create_notification(data)
+    if error:
         return JsonResponse({
             'success': False,
-            'error': 'Все поля обязательны для заполнения (user_id, event, title, message)'
+            'error': error
         }, status=400)
-
-    prefs, _ = NotificationPreference.objects.get_or_create(
-        user_id=user_id,
-        defaults={'email_enabled': True, 'in_app_enabled': True}
-    )
     
-    if type == 'email' and not prefs.email_enabled:
+    logger.info(f'Notification created: {notification.id}')
+    
+    return JsonResponse({
+        'success': True,
+        'notification_id': notification.id,
+        'message': 'Notification created'
+    }, status=201)
+
+
+@require_http_methods(['POST'])
+def send_notifications_batch(request):
+    """
+    Создать несколько уведомлений одним запросом (не больше NOTIFICATION_BATCH_MAX_SIZE)
+    POST /api/notifications/send-batch/  {"notifications": [...]}
+    Отклоненные элементы возвращаются в errors [{'index', 'error'}], остальные создаются
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
         return JsonResponse({
             'success': False,
-            'error': 'Email notifications disabled'
+            'error': 'Invalid JSON'
         }, status=400)
-    if type == 'in_app' and not prefs.in_app_enabled:
+    
+    items = data.get('notifications')
+    if not isinstance(items, list):
         return JsonResponse({
             'success': False,
-            'error': 'In-app notifications disabled'
+            'error': 'notifications must be a list'
         }, status=400)
     
-    notification = Notification.objects.create(
-        user_id=user_id,
-        type=type,
-        event=event,
-        title=title,
-        message=message,
-        data=data_extra,
-        email_to=email_to,
-        status='pending'
-    )
+    if len(items) > settings.NOTIFICATION_BATCH_MAX_SIZE:
+        return JsonResponse({
+            'success': False,
+            'error': f'No more than {settings.NOTIFICATION_BATCH_MAX_SIZE} notifications per request'
+        }, status=400)
     
-    if type == 'email':
-        send_email_task.delay(notification.id)
-    elif type == 'in_app':
-        notification.mark_as_sent()
+    created, errors = create_notifications(items)
     
-    logger.info(f'Notification created: {notification.id}')
+    logger.info(f'Notification batch: {len(created)} created, {len(errors)} rejected')
     
     return JsonResponse({
         'success': True,
-        'notification_id': notification.id,
-        'message': 'Notification created'
+        'created': len(created),
+        'notification_ids': [n.id for n in created],
+        'errors': errors
     }, status=201)
     
+@csrf_exempt
+@require_http_methods(['POST'])
+@internal_only
+def create_broadcast(request):
+    """
+    Создать рассылку для аудитории - одна строка на всех получателей
+    Только подписанные запросы сервисов (apps/common/internal_auth.py)
+    POST /api/notifications/broadcast/
+    {"audience": "channel:5", "event": ..., "title": ..., "message": ..., "data": {}, "expires_at": null}
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid JSON'
+        }, status=400)
+
+    if not isinstance(data, dict) or not data.get('event') or not data.get('title') or not data.get('message'):
+        return JsonResponse({
+            'success': False,
+            'error': 'Все поля обязательны для заполнения (event, title, message)'
+        }, status=400)
+
+    audience = data.get('audience') or Broadcast.AUDIENCE_ALL
+    raw_expires_at = data.get('expires_at')
+    try:
+        # parse_datetime: None - не ISO формат, ValueError - несуществующая дата (2025-02-30)
+        expires_at = parse_datetime(raw_expires_at) if isinstance(raw_expires_at, str) else None
+    except ValueError:
+        expires_at = None
+
+    if (
+        not isinstance(audience, str)
+        or len(audience) > Broadcast._meta.get_field('audience').max_length
+        or (raw_expires_at and expires_at is None)
+    ):
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid audience or expires_at'
+        }, status=400)
+
+    broadcast = Broadcast.objects.create(
+        audience=audience,
+        event=data['event'],
+        title=data['title'],
+        message=data['message'],
+        data=data.get('data', {}),
+        expires_at=expires_at
+    )
+    transaction.on_commit(lambda: unread.index_broadcast(broadcast))
+    transaction.on_commit(lambda: publish([(audience_group(broadcast.audience), serialize_broadcast(broadcast))]))
+
+    logger.info(f'Broadcast created: {broadcast.id} for {audience}')
+
+    return JsonResponse({
+        'success': True,
+        'broadcast_id': broadcast.id,
+        'message': 'Broadcast created'
+    }, status=201)
+
+
 @require_http_methods(['GET'])
 def get_user_notifications(request, user_id):
+    """
+    Личные уведомления и рассылки пользователя, новые сначала
+    GET /api/notifications/user/<user_id>/?cursor=...&limit=50
+    Аудитории рассылок - каналы пользователя (apps/notifications/audiences.py)
+    """
     status = request.GET.get('status')
     type = request.GET.get('type')
     unread_only = request.GET.get('unread_only', 'false').lower() == 'true'
-    
-    all_notifications = Notification.objects.filter(user_id=user_id)
 
-    if status:
-        all_notifications = all_notifications.filter(status=status)
-    if type:
-        all_notifications = all_notifications.filter(type=type)
-    if unread_only:
-        all_notifications = all_notifications.filter(read_at__isnull=True)
+    try:
+        limit = min(int(request.GET.get('limit', settings.NOTIFICATIONS_PAGE_SIZE)), settings.NOTIFICATIONS_PAGE_MAX_SIZE)
+        cursor = decode_cursor(request.GET['cursor']) if request.GET.get('cursor') else None
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    if limit < 1:
+        return JsonResponse({
+            'success': False,
+            'error': 'limit must be positive'
+        }, status=400)
+
+    audiences = get_user_audiences(user_id)
+    items, next_cursor = get_feed(user_id, audiences, status, type, unread_only, cursor, limit)
 
-    all_notifications = all_notifications.order_by('-created_at')
+    unread_count = unread.get_unread_count(user_id, audiences)
+    if unread_count is None:
+        # Redis недоступен - считаем по БД
+        unread_count = Notification.objects.filter(
+            user_id=user_id,
+            read_at__isnull=True
+        ).count() + count_unread_broadcasts(user_id, audiences)
 
-    unread_count = Notification.objects.filter(
-        user_id=user_id,
-        read_at__isnull=True
-    ).count()
-
-    notifications = all_notifications[:50]
-
-    data = [
-        {
-            'id': n.id,
-            'type': n.type,
-            'event': n.event,
-            'title': n.title,
-            'message': n.message,
-            'data': n.data,
-            'status': n.status,
-            'read_at': n.read_at.isoformat() if n.read_at else None,
-            'created_at': n.created_at.isoformat(),
-        }
-        for n in notifications
-    ]
+    data = [item_json(item) for item in items]
 
     return JsonResponse({
         'success': True,
         'count': len(data),
         'unread_count': unread_count,
+        'next_cursor': next_cursor,
         'data': data
     }, status=200)
 
+@require_http_methods(['GET'])
+def get_unread_count(request, user_id):
+    """
+    Число непрочитанных уведомлений и рассылок - только Redis, без запросов к БД
+    GET /api/notifications/user/<user_id>/unread-count/
+    """
+    unread_count = unread.get_unread_count(user_id, get_user_audiences(user_id))
+    if unread_count is None:
+        response = JsonResponse({
+            'success': False,
+            'error': 'Unread count temporarily unavailable'
+        }, status=503)
+        response['Retry-After'] = 5
+        return response
+
+    return JsonResponse({
+        'success': True,
+        'unread_count': unread_count
+    }, status=200)
+
 @require_http_methods(['POST'])
 def mark_notification_read(request, notification_id):
     notification = get_object_or_404(Notification, id=notification_id)
@@ -133,7 +341,8 @@ def mark_notification_read(request, notification_id):
             'error': 'Только уведомления типа in-app можно пометить как прочитанные'
         }, status=400)
     
-    notification.mark_as_read()
+    if notification.mark_as_read():
+        transaction.on_commit(lambda: unread.decrement_unread(notification.user_id))
     
     logger.info(f'Notification marked as read: {notification_id}')
     
@@ -142,6 +351,24 @@ def mark_notification_read(request, notification_id):
         'message': 'Notifications marked as read'
     }, status=200)
 
+@require_http_methods(['POST'])
+def mark_broadcast_read(request, user_id, broadcast_id):
+    """
+    Отметить рассылку прочитанной пользователем
+    POST /api/notifications/user/<user_id>/broadcasts/<broadcast_id>/read/
+    """
+    broadcast = get_object_or_404(Broadcast, id=broadcast_id)
+    _, created = BroadcastReceipt.objects.get_or_create(broadcast=broadcast, user_id=user_id)
+    if created:
+        transaction.on_commit(lambda: unread.mark_broadcast_read(user_id, broadcast_id))
+
+    logger.info(f'Broadcast {broadcast_id} marked as read by user {user_id}')
+
+    return JsonResponse({
+        'success': True,
+        'message': 'Broadcast marked as read'
+    }, status=200)
+
 @require_http_methods(['POST'])
 def mark_all_read(request, user_id):
     notifications = Notification.objects.filter(
@@ -150,10 +377,14 @@ def mark_all_read(request, user_id):
         read_at__isnull=True
     )
     
+    now = timezone.now()
     count = notifications.update(
-        read_at=timezone.now(),
+        read_at=now,
         status='read'
     )
+    # Рассылки до этого момента считаются прочитанными - без строки на каждую
+    BroadcastReadMarker.objects.update_or_create(user_id=user_id, defaults={'read_until': now})
+    transaction.on_commit(lambda: unread.mark_all_read(user_id, count, now))
     
     logger.info(f'Marked {count} notifications as read for user {user_id}')
     
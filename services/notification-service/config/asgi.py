@@ -1,10 +1,9 @@
 """
 ASGI config for config project.
 
-It exposes the ASGI callable as a module-level variable named ``application``.
-
-For more information on this file, see
-https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+HTTP - Django, WebSocket - Channels (apps/notifications/routing.py).
+websocket_application - только WebSocket, для отдельного daphne процесса,
+чтобы не открывать наружу внутренний HTTP API.
 """
 
 import os
@@ -13,4 +12,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
-application = get_asgi_application()
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+
+from apps.notifications.routing import websocket_urlpatterns  # noqa: E402
+
+websocket_application = ProtocolTypeRouter({
+    'websocket': URLRouter(websocket_urlpatterns),
+})
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': URLRouter(websocket_urlpatterns),
+})
@@ -21,10 +21,12 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework_simplejwt',
     'corsheaders',
+    'channels',
     'apps.notifications',
 ]
 
 MIDDLEWARE = [
+    'apps.common.tracing.RequestIDMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -120,9 +122,42 @@ CACHES = {
     }
 }
 
+# WebSocket (Django Channels): группы пользователей и аудиторий в Redis
+ASGI_APPLICATION = 'config.asgi.application'
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {
+            'hosts': [os.getenv('CHANNEL_LAYERS_REDIS_URL', REDIS_URL)],
+        },
+    }
+}
+# Общий Redis сервисов: время отзыва токенов от user-service (apps/notifications/revocation.py)
+USER_CACHE_REDIS_URL = os.getenv('USER_CACHE_REDIS_URL', 'redis://localhost:6379/6')
+# Сколько пропущенных уведомлений отправить после переподключения с since
+WS_RESUME_LIMIT = int(os.getenv('WS_RESUME_LIMIT', 100))
+
 USER_SERVICE_URL = os.getenv('USER_SERVICE_URL', 'http://localhost:8000')
+CONTENT_SERVICE_URL = os.getenv('CONTENT_SERVICE_URL', 'http://localhost:8003')
 API_GATEWAY_URL = os.getenv('API_GATEWAY_URL', 'http://localhost:8080')
 
+# Подпись внутренних запросов между сервисами (apps/common/internal_auth.py), общий со всеми сервисами
+INTERNAL_AUTH_SECRET = os.getenv('INTERNAL_AUTH_SECRET', SIMPLE_JWT['SIGNING_KEY'])
+# Сколько секунд действительна подпись внутреннего запроса
+INTERNAL_AUTH_MAX_AGE = int(os.getenv('INTERNAL_AUTH_MAX_AGE', 300))
+
+# /api/notifications/send-batch/: максимум уведомлений в запросе, размер INSERT и пачки email на задачу
+NOTIFICATION_BATCH_MAX_SIZE = int(os.getenv('NOTIFICATION_BATCH_MAX_SIZE', 5000))
+NOTIFICATION_BULK_CREATE_BATCH_SIZE = int(os.getenv('NOTIFICATION_BULK_CREATE_BATCH_SIZE', 500))
+NOTIFICATION_EMAIL_CHUNK_SIZE = int(os.getenv('NOTIFICATION_EMAIL_CHUNK_SIZE', 100))
+
+# Лента /api/notifications/user/<id>/: размер страницы и максимум аудиторий рассылок пользователя
+NOTIFICATIONS_PAGE_SIZE = int(os.getenv('NOTIFICATIONS_PAGE_SIZE', 50))
+NOTIFICATIONS_PAGE_MAX_SIZE = int(os.getenv('NOTIFICATIONS_PAGE_MAX_SIZE', 100))
+BROADCAST_MAX_AUDIENCES = int(os.getenv('BROADCAST_MAX_AUDIENCES', 100))
+# Сколько секунд кэшируются аудитории пользователя (каналы из content-service)
+AUDIENCE_CACHE_TTL = int(os.getenv('AUDIENCE_CACHE_TTL', 60))
+
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
@@ -142,6 +177,19 @@ CELERY_TASK_TIME_LIMIT = 30 * 60
 CELERY_TASK_ACKS_LATE = True
 CELERY_TASK_REJECT_ON_WORKER_LOST = True
 
+# Сверка счетчиков непрочитанных в Redis с БД (apps/notifications/unread.py)
+UNREAD_RECONCILE_INTERVAL = int(os.getenv('UNREAD_RECONCILE_INTERVAL', 600))
+# Сколько пользователей или рассылок сверка читает из БД и пишет в Redis за раз
+UNREAD_RECONCILE_CHUNK_SIZE = int(os.getenv('UNREAD_RECONCILE_CHUNK_SIZE', 1000))
+# Рассылки старше стольких дней считаются прочитанными и удаляются из индекса в Redis
+BROADCAST_UNREAD_DAYS = int(os.getenv('BROADCAST_UNREAD_DAYS', 30))
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-unread-counters': {
+        'task': 'apps.notifications.tasks.reconcile_unread_counters',
+        'schedule': UNREAD_RECONCILE_INTERVAL,
+    },
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
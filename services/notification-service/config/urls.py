@@ -7,6 +7,6 @@ urlpatterns = [
     
     path("admin/", admin.site.urls),
 
-    path('api/notifications/', include('apps.notifications.urls', namespace='notifications')),
+    path('', include('apps.notifications.urls', namespace='notifications')),
     
 ]
@@ -0,0 +1,47 @@
+from config.settings import *
+
+# Используем in-memory SQLite для быстрых тестов
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+# Кэш в памяти процесса; Redis счетчиков непрочитанных подменяется fakeredis в тестах
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Группы WebSocket без Redis
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    }
+}
+
+# Celery задачи выполняются сразу, письма - в django.core.mail.outbox
+CELERY_TASK_ALWAYS_EAGER = True
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# Отключаем логирование в тестах
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': True,
+    'handlers': {
+        'null': {
+            'class': 'logging.NullHandler',
+        },
+    },
+    'root': {
+        'handlers': ['null'],
+        'level': 'CRITICAL',
+    },
+}
+
+DEBUG = False
+
+SECRET_KEY = 'test-secret-key-for-testing-only'
+INTERNAL_AUTH_SECRET = 'test-internal-secret'
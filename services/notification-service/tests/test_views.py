@@ -0,0 +1,399 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+import fakeredis
+import pytest
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.common.internal_auth import internal_auth_headers
+from apps.notifications import audiences, consumers, revocation, unread
+from apps.notifications.consumers import NotificationConsumer
+from apps.notifications.feed import encode_cursor, serialize_notification
+from apps.notifications.models import Broadcast, Notification, NotificationPreference
+
+USER_ID = 1
+CHANNEL_AUDIENCE = 'channel:5'
+
+
+@pytest.fixture(autouse=True)
+def redis(monkeypatch):
+    connection = fakeredis.FakeRedis()
+    monkeypatch.setattr(unread, 'get_connection', lambda: connection)
+    monkeypatch.setattr(revocation, 'get_connection', lambda: connection)
+    return connection
+
+
+@pytest.fixture(autouse=True)
+def user_audiences(monkeypatch):
+    """Аудитории пользователя вместо запроса в content-service"""
+    cache.clear()
+    fetch = lambda user_ids: {user_id: [CHANNEL_AUDIENCE] for user_id in user_ids}
+    monkeypatch.setattr(audiences, 'fetch_audiences', fetch)
+
+
+@pytest.fixture
+def client():
+    return Client()
+
+
+def post_json(client, path, payload, signed=False):
+    body = json.dumps(payload).encode()
+    headers = internal_auth_headers('POST', path, body) if signed else {}
+    return client.post(path, body, content_type='application/json', headers=headers)
+
+
+def notification_payload(user_id=USER_ID, **kwargs):
+    return {'user_id': user_id, 'event': 'post_liked', 'title': 'Title', 'message': 'Message', **kwargs}
+
+
+def unread_count(client, user_id=USER_ID):
+    response = client.get(f'/api/notifications/user/{user_id}/unread-count/')
+    assert response.status_code == 200
+    return response.json()['unread_count']
+
+
+@pytest.mark.django_db
+@pytest.mark.views
+class TestSendBatch:
+
+    def test_batch_filters_by_preferences(self, client):
+        NotificationPreference.objects.create(user_id=2, in_app_enabled=False)
+        NotificationPreference.objects.create(user_id=3, email_enabled=False)
+
+        response = post_json(client, '/api/notifications/send-batch/', {'notifications': [
+            notification_payload(1),
+            notification_payload(2),
+            notification_payload(3, type='email', email_to='user3@test.com'),
+            notification_payload(3),
+            {'user_id': 4, 'event': 'post_liked'},
+        ]})
+
+        assert response.status_code == 201
+        data = response.json()
+        assert data['created'] == 2
+        assert data['errors'] == [
+            {'index': 1, 'error': 'In-app notifications disabled'},
+            {'index': 2, 'error': 'Email notifications disabled'},
+            {'index': 4, 'error': 'Все поля обязательны для заполнения (user_id, event, title, message)'},
+        ]
+        assert sorted(Notification.objects.values_list('user_id', flat=True)) == [1, 3]
+
+    def test_batch_size_limit(self, client, settings):
+        settings.NOTIFICATION_BATCH_MAX_SIZE = 2
+
+        response = post_json(client, '/api/notifications/send-batch/', {
+            'notifications': [notification_payload() for _ in range(3)]
+        })
+
+        assert response.status_code == 400
+        assert not Notification.objects.exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.views
+class TestBroadcast:
+
+    def test_broadcast_requires_internal_signature(self, client):
+        payload = {'audience': CHANNEL_AUDIENCE, 'event': 'post_created', 'title': 'Title', 'message': 'Message'}
+
+        response = post_json(client, '/api/notifications/broadcast/', payload)
+        assert response.status_code == 401
+
+        response = post_json(client, '/api/notifications/broadcast/', payload, signed=True)
+        assert response.status_code == 201
+        assert Broadcast.objects.get().audience == CHANNEL_AUDIENCE
+
+    @pytest.mark.parametrize('fields', [
+        {'audience': 5},
+        {'audience': ['channel:5']},
+        {'audience': 'x' * 200},
+        {'expires_at': 5},
+        {'expires_at': 'tomorrow'},
+        {'expires_at': '2025-02-30T10:00:00'},
+    ])
+    def test_broadcast_invalid_fields(self, client, fields):
+        payload = {'event': 'post_created', 'title': 'Title', 'message': 'Message', **fields}
+
+        response = post_json(client, '/api/notifications/broadcast/', payload, signed=True)
+
+        assert response.status_code == 400
+        assert response.json()['success'] is False
+        assert not Broadcast.objects.exists()
+
+    def test_feed_ignores_client_audience(self, client):
+        Broadcast.objects.create(audience='channel:99', event='post_created', title='Other', message='Message')
+        Broadcast.objects.create(audience=CHANNEL_AUDIENCE, event='post_created', title='Own', message='Message')
+
+        response = client.get(f'/api/notifications/user/{USER_ID}/?audience=channel:99')
+
+        assert [item['title'] for item in response.json()['data']] == ['Own']
+
+
+@pytest.mark.django_db
+@pytest.mark.views
+class TestFeedPaging:
+
+    def test_paging_across_sources_with_equal_timestamps(self, client):
+        created_at = timezone.now() - timedelta(hours=1)
+        for i in range(3):
+            Notification.objects.create(user_id=USER_ID, type='in_app', status='sent', event='e', title=f'n{i}', message='m')
+            Broadcast.objects.create(audience=CHANNEL_AUDIENCE, event='e', title=f'b{i}', message='m')
+        Broadcast.objects.create(audience=Broadcast.AUDIENCE_ALL, event='e', title='all', message='m')
+        Notification.objects.update(created_at=created_at)
+        Broadcast.objects.update(created_at=created_at)
+
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            data = client.get(f'/api/notifications/user/{USER_ID}/', params).json()
+            assert data['count'] <= 2
+            seen += [(item['source'], item['id']) for item in data['data']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+
+        # Одинаковое время: сначала личные, потом рассылки, внутри источника - по убыванию id
+        notification_ids = sorted(Notification.objects.values_list('id', flat=True), reverse=True)
+        broadcast_ids = sorted(Broadcast.objects.values_list('id', flat=True), reverse=True)
+        assert seen == [('notification', id) for id in notification_ids] + [('broadcast', id) for id in broadcast_ids]
+
+    def test_invalid_cursor(self, client):
+        response = client.get(f'/api/notifications/user/{USER_ID}/', {'cursor': 'broken'})
+
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+@pytest.mark.views
+class TestUnreadCount:
+
+    def test_counter_follows_create_read_and_read_all(self, client, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            post_json(client, '/api/notifications/send-batch/', {
+                'notifications': [notification_payload() for _ in range(3)]
+            })
+            broadcast = Broadcast.objects.create(audience=CHANNEL_AUDIENCE, event='e', title='b', message='m')
+            unread.index_broadcast(broadcast)
+        assert unread_count(client) == 4
+
+        notification = Notification.objects.first()
+        with django_capture_on_commit_callbacks(execute=True):
+            client.post(f'/api/notifications/{notification.id}/read/')
+            # Повторное прочтение счетчик не уменьшает
+            client.post(f'/api/notifications/{notification.id}/read/')
+        assert unread_count(client) == 3
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post(f'/api/notifications/user/{USER_ID}/read-all/')
+        assert response.json()['count'] == 2
+        assert unread_count(client) == 0
+
+        # Рассылка после read-all снова непрочитанная
+        with django_capture_on_commit_callbacks(execute=True):
+            post_json(client, '/api/notifications/broadcast/', {
+                'audience': CHANNEL_AUDIENCE, 'event': 'e', 'title': 'new', 'message': 'm'
+            }, signed=True)
+        assert unread_count(client) == 1
+        assert unread_count(client, user_id=2) == 2
+
+    def test_unread_count_unavailable_without_redis(self, client, monkeypatch):
+        server = fakeredis.FakeServer()
+        server.connected = False
+        monkeypatch.setattr(unread, 'get_connection', lambda: fakeredis.FakeRedis(server=server))
+
+        response = client.get(f'/api/notifications/user/{USER_ID}/unread-count/')
+
+        assert response.status_code == 503
+        assert response['Retry-After'] == '5'
+
+        # Лента считает непрочитанные по БД
+        Notification.objects.create(user_id=USER_ID, type='in_app', status='sent', event='e', title='t', message='m')
+        response = client.get(f'/api/notifications/user/{USER_ID}/')
+        assert response.json()['unread_count'] == 1
+
+
+@pytest.mark.django_db
+class TestReconcile:
+
+    def create_unread(self, user_id, count):
+        for _ in range(count):
+            Notification.objects.create(user_id=user_id, type='in_app', status='sent', event='e', title='t', message='m')
+
+    def test_reconcile_in_chunks(self, redis, settings):
+        settings.UNREAD_RECONCILE_CHUNK_SIZE = 2
+        for user_id in range(1, 6):
+            self.create_unread(user_id, user_id)
+        redis.set(unread.UNREAD_KEY.format(user_id=1), 7)
+        redis.set(unread.UNREAD_KEY.format(user_id=99), 3)
+
+        assert unread.reconcile_unread() == 5
+
+        assert [int(redis.get(unread.UNREAD_KEY.format(user_id=user_id))) for user_id in range(1, 6)] == [1, 2, 3, 4, 5]
+        assert not redis.exists(unread.UNREAD_KEY.format(user_id=99))
+
+    def test_reconcile_keeps_concurrent_increment(self, redis, monkeypatch):
+        self.create_unread(USER_ID, 2)
+        key = unread.UNREAD_KEY.format(user_id=USER_ID)
+        redis.set(key, 5)
+        mget = redis.mget
+
+        def mget_then_increment(keys):
+            values = mget(keys)
+            # Уведомление создано между чтением счетчика и записью сверки
+            redis.incr(key)
+            return values
+
+        monkeypatch.setattr(redis, 'mget', mget_then_increment)
+        unread.reconcile_unread()
+
+        assert int(redis.get(key)) == 6
+
+    def test_reconcile_prunes_broadcast_index(self, client, redis, settings):
+        settings.BROADCAST_UNREAD_DAYS = 30
+        old = Broadcast.objects.create(audience=CHANNEL_AUDIENCE, event='e', title='old', message='m')
+        expired = Broadcast.objects.create(
+            audience=CHANNEL_AUDIENCE, event='e', title='expired', message='m',
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        fresh = Broadcast.objects.create(audience=CHANNEL_AUDIENCE, event='e', title='fresh', message='m')
+        Broadcast.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=31))
+        key = unread.AUDIENCE_KEY.format(audience=CHANNEL_AUDIENCE)
+        redis.zadd(key, {old.id: time_ago(days=31), expired.id: time_ago(), fresh.id: time_ago()})
+
+        unread.reconcile_unread()
+
+        assert [int(id) for id in redis.zrange(key, 0, -1)] == [fresh.id]
+        assert unread_count(client) == 1
+        # По БД старая рассылка тоже прочитана
+        items = client.get(f'/api/notifications/user/{USER_ID}/', {'unread_only': 'true'}).json()['data']
+        assert [item['title'] for item in items] == ['fresh']
+
+    def test_index_broadcast_prunes_old(self, redis):
+        key = unread.AUDIENCE_KEY.format(audience=CHANNEL_AUDIENCE)
+        redis.zadd(key, {'1000000': time_ago(days=31)})
+
+        unread.index_broadcast(Broadcast.objects.create(audience=CHANNEL_AUDIENCE, event='e', title='t', message='m'))
+
+        assert redis.zcard(key) == 1
+        assert redis.zscore(key, '1000000') is None
+
+
+def time_ago(**kwargs):
+    return (timezone.now() - timedelta(**kwargs)).timestamp()
+
+
+def access_token(user_id=USER_ID, lifetime=None):
+    """Access токен как у user-service: iat с долями секунды"""
+    token = AccessToken()
+    token['user_id'] = user_id
+    token['iat'] = time.time()
+    if lifetime is not None:
+        token.set_exp(lifetime=lifetime)
+    return str(token)
+
+
+def connect(path='/ws/notifications/', token=None):
+    """Подключение с токеном в Sec-WebSocket-Protocol"""
+    return WebsocketCommunicator(
+        NotificationConsumer.as_asgi(), path, subprotocols=['bearer', token or access_token()]
+    )
+
+
+async def receive_all(communicator):
+    messages = []
+    while not await communicator.receive_nothing(timeout=0.2):
+        messages.append(await communicator.receive_json_from())
+    return messages
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.websocket
+class TestWebSocket:
+
+    def test_resume_since_cursor(self):
+        first = Notification.objects.create(user_id=USER_ID, type='in_app', status='sent', event='e', title='first', message='m')
+        Notification.objects.create(user_id=USER_ID, type='in_app', status='sent', event='e', title='second', message='m')
+        Broadcast.objects.create(audience=CHANNEL_AUDIENCE, event='e', title='third', message='m')
+        Broadcast.objects.create(audience='channel:99', event='e', title='other', message='m')
+        Notification.objects.create(user_id=2, type='in_app', status='sent', event='e', title='foreign', message='m')
+        since = encode_cursor(serialize_notification(first))
+
+        async def scenario():
+            communicator = connect(f'/ws/notifications/?since={since}')
+            connected, subprotocol = await communicator.connect()
+            assert (connected, subprotocol) == (True, 'bearer')
+            messages = await receive_all(communicator)
+            await communicator.disconnect()
+            return messages
+
+        messages = asyncio.run(scenario())
+
+        assert [message['title'] for message in messages] == ['second', 'third']
+        assert all(message['cursor'] for message in messages)
+
+    def test_resume_overflow_requests_resync(self, settings):
+        settings.WS_RESUME_LIMIT = 1
+        first = Notification.objects.create(user_id=USER_ID, type='in_app', status='sent', event='e', title='first', message='m')
+        for i in range(2):
+            Notification.objects.create(user_id=USER_ID, type='in_app', status='sent', event='e', title=f'n{i}', message='m')
+        since = encode_cursor(serialize_notification(first))
+
+        async def scenario():
+            communicator = connect(f'/ws/notifications/?since={since}')
+            await communicator.connect()
+            messages = await receive_all(communicator)
+            await communicator.disconnect()
+            return messages
+
+        messages = asyncio.run(scenario())
+
+        assert [message.get('title') for message in messages] == ['n0', None]
+        assert messages[-1] == {'type': 'resync'}
+
+    def test_rejects_invalid_token(self):
+        async def scenario():
+            communicator = connect(token='broken')
+            return await communicator.connect()
+
+        assert asyncio.run(scenario()) == (False, consumers.CLOSE_UNAUTHORIZED)
+
+    def test_ignores_token_in_query_string(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), f'/ws/notifications/?token={access_token()}')
+            return await communicator.connect()
+
+        assert asyncio.run(scenario()) == (False, consumers.CLOSE_UNAUTHORIZED)
+
+    def test_rejects_revoked_token(self, redis):
+        token = access_token()
+        redis.set(f'users:revoked:{USER_ID}', repr(time.time()))
+
+        async def scenario():
+            return await connect(token=token).connect()
+
+        assert asyncio.run(scenario()) == (False, consumers.CLOSE_UNAUTHORIZED)
+
+        # Токен, выданный после отзыва, принимается
+        async def reconnect():
+            communicator = connect()
+            connected, _ = await communicator.connect()
+            await communicator.disconnect()
+            return connected
+
+        assert asyncio.run(reconnect())
+
+    def test_closes_when_token_expires(self):
+        async def scenario():
+            communicator = connect(token=access_token(lifetime=timedelta(seconds=1)))
+            connected, _ = await communicator.connect()
+            assert connected
+            return await communicator.receive_output(timeout=3)
+
+        assert asyncio.run(scenario()) == {'type': 'websocket.close', 'code': consumers.CLOSE_UNAUTHORIZED}
@@ -0,0 +1,101 @@
+import hashlib
+import hmac
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.common.user_cache import publish_revocations
+
+
+def sign_identity(user_id, email, exp, claims=''):
+    """Подпись заголовков личности (тот же формат, что и в api-gateway)"""
+    message = f'{user_id}|{email}|{exp}'
+    if claims:
+        message = f'{message}|{claims}'
+    return hmac.new(settings.INTERNAL_AUTH_SECRET.encode(), message.encode(), hashlib.sha256).hexdigest()
+
+
+def get_identity_user_id(request):
+    """
+    Получить user_id из подписанных gateway заголовков X-User-*
+    Возвращает None, если заголовков нет, подпись неверна или токен истек
+    """
+    signature = request.META.get('HTTP_X_IDENTITY_SIGNATURE')
+    if not signature:
+        return None
+
+    user_id = request.META.get('HTTP_X_USER_ID', '')
+    email = request.META.get('HTTP_X_USER_EMAIL', '')
+    exp = request.META.get('HTTP_X_TOKEN_EXP', '')
+    claims = request.META.get('HTTP_X_USER_CLAIMS', '')
+
+    if not hmac.compare_digest(signature, sign_identity(user_id, email, exp, claims)):
+        return None
+
+    try:
+        if exp and int(exp) <= time.time():
+            return None
+        return int(user_id)
+    except ValueError:
+        return None
+
+
+def get_identity_claims(request):
+    """
+    iat и флаги ролей из заголовка X-User-Claims (iat=...,is_staff=0,...)
+    Вызывать после get_identity_user_id - заголовок входит в подпись
+    """
+    claims = {}
+    for item in request.META.get('HTTP_X_USER_CLAIMS', '').split(','):
+        claim, _, value = item.partition('=')
+        if not value:
+            continue
+        try:
+            claims[claim] = float(value) if claim == 'iat' else value == '1'
+        except ValueError:
+            continue
+    return claims
+
+
+# Поля User, которые записываются в access токен (режим JWT_CLAIMS_ONLY)
+USER_CLAIMS = ('email', 'is_active', 'is_staff', 'is_superuser', 'is_freelancer', 'is_seller', 'is_moderator')
+
+
+def add_user_claims(token, user):
+    """
+    Записать is_active и флаги ролей пользователя в токен
+    iat - с долями секунды: токен, выданный сразу после отзыва, не попадает под него
+    """
+    token['iat'] = time.time()
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+def revocation_key(user_id):
+    return f'auth:revoked:{user_id}'
+
+
+def revoke_user_tokens(user_id):
+    """
+    Отозвать access токены, выданные до этого момента
+    Запись живет не дольше самого токена - потом старые токены истекают сами
+    """
+    revoke_users_tokens([user_id])
+
+
+def revoke_users_tokens(user_ids):
+    timeout = int(settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds())
+    now = time.time()
+    cache.set_many({revocation_key(user_id): now for user_id in user_ids}, timeout=timeout)
+    publish_revocations(user_ids, now, timeout)
+
+
+def is_token_revoked(user_id, issued_at):
+    """
+    Токен выдан до отзыва (деактивация, смена ролей, удаление)
+    Оба времени с долями секунды - отзыв и новый токен в одну секунду различимы
+    """
+    revoked_at = cache.get(revocation_key(user_id))
+    return revoked_at is not None and issued_at < revoked_at
@@ -1,11 +1,42 @@
 import logging
+from django.conf import settings
 from django.http import JsonResponse
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 from apps.users.models import User
+from apps.common.identity import USER_CLAIMS, get_identity_claims, get_identity_user_id, is_token_revoked
 
 logger = logging.getLogger(__name__)
 
+
+class ClaimsUser:
+    """
+    Пользователь из claims access токена (режим JWT_CLAIMS_ONLY)
+    id, email, is_active и флаги ролей берутся из токена без запроса к БД,
+    остальные атрибуты - из User, который загружается при первом обращении
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, claims):
+        self.id = self.pk = user_id
+        self._user = None
+        for claim, value in claims.items():
+            setattr(self, claim, value)
+
+    def __getattr__(self, name):
+        # Вызывается только для атрибутов, которых нет в claims
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._user is None:
+            self._user = User.objects.select_related('profile').get(id=self.id)
+        return getattr(self._user, name)
+
+    def __str__(self):
+        return str(self.email)
+
+
 class JWTAuthenticationMiddleware:
     """
     Middleware для автоматической проверки JWT токенов
@@ -35,22 +66,35 @@ class JWTAuthenticationMiddleware:
                 request.authenticated = False
             return self.get_response(request)
         
+        # Токен уже проверен gateway - доверяем подписанным заголовкам X-User-*
+        identity_user_id = get_identity_user_id(request)
+        
         # Извлекаем токен из заголовка
         auth_header = request.META.get('HTTP_AUTHORIZATION', '')
         
-        if not auth_header.startswith('Bearer '):
+        if identity_user_id is None and not auth_header.startswith('Bearer '):
             request.user = None
             request.authenticated = False
             return self.get_response(request)
         
-        token = auth_header.split(' ')[1]
-        
         try:
-            # Проверяем токен
-            access_token = AccessToken(token)
-            user_id = access_token['user_id']
+            if identity_user_id is not None:
+                access_token = None
+                user_id = identity_user_id
+            else:
+                # Проверяем токен
+                access_token = AccessToken(auth_header.split(' ')[1])
+                user_id = int(access_token['user_id'])
             
-            user = User.objects.select_related('profile').get(id=user_id)
+            if settings.JWT_CLAIMS_ONLY:
+                user = self._get_claims_user(request, user_id, access_token)
+            else:
+                user = User.objects.select_related('profile').get(id=user_id)
+            
+            if user is None:
+                request.user = None
+                request.authenticated = False
+                return self.get_response(request)
             
             if not user.is_active:
                 logger.warning(f'Attempt to use token for inactive user: {user.email}')
@@ -63,7 +107,7 @@ class JWTAuthenticationMiddleware:
             request.authenticated = True
             request.token = access_token
             
-            logger.debug(f"User authenticated: {user.email}")
+            logger.debug(f"User authenticated: {user_id}")
             
         except (TokenError, InvalidToken) as e:
             logger.warning(f'Invalid token: {str(e)}')
@@ -82,6 +126,39 @@ class JWTAuthenticationMiddleware:
         
         return self.get_response(request)
     
+    def _get_claims_user(self, request, user_id, access_token):
+        """
+        Пользователь из claims без запроса к БД; None - если токен отозван
+        Вместо проверки is_active в БД - набор отзывов в Redis
+        """
+        if access_token is not None:
+            issued_at = access_token['iat']
+            claims = {claim: access_token[claim] for claim in USER_CLAIMS if claim in access_token.payload}
+        else:
+            # Подписанные заголовки gateway: iat и флаги ролей - в X-User-Claims
+            claims = get_identity_claims(request)
+            issued_at = claims.pop('iat', None)
+            if issued_at is None:
+                # Токен без iat: время выдачи - по exp
+                lifetime = settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds()
+                issued_at = int(request.META.get('HTTP_X_TOKEN_EXP') or 0) - lifetime
+            claims.setdefault('is_active', True)
+            email = request.META.get('HTTP_X_USER_EMAIL')
+            if email:
+                claims['email'] = email
+
+        try:
+            revoked = is_token_revoked(user_id, issued_at)
+        except Exception as e:
+            logger.warning(f'Revocation check failed, loading user {user_id} from DB: {str(e)}')
+            return User.objects.select_related('profile').get(id=user_id)
+
+        if revoked:
+            logger.warning(f'Revoked token used for user {user_id}')
+            return None
+
+        return ClaimsUser(user_id, claims)
+
     def _is_public_path(self, path):
         return any(path.startswith(public_path) for public_path in self.PUBLIC_PATHS)
 
@@ -0,0 +1,278 @@
+"""
+Outbox запросов к другим сервисам
+
+Запрос записывается в OutboxMessage в той же транзакции, что и изменение,
+поэтому он не теряется при ошибке сервиса и не уходит при откате. Relay
+забирает готовые к отправке сообщения пачкой, отправляет их параллельно
+через пул соединений и при ошибке откладывает с экспоненциальной задержкой;
+после OUTBOX_MAX_ATTEMPTS попыток сообщение помечается failed (dead letter:
+остается в таблице для разбора, число таких сообщений - в /health/?deep=1).
+Сообщения для эндпоинтов из BATCH_ENDPOINTS (уведомления) уходят одним
+запросом на пачку.
+
+Отправленные сообщения удаляются через OUTBOX_SENT_RETENTION_DAYS дней,
+failed - через OUTBOX_FAILED_RETENTION_DAYS (отдельный поток relay, раз в
+OUTBOX_CLEANUP_INTERVAL секунд).
+
+Несколько relay могут работать одновременно: сообщения берутся через
+SELECT ... FOR UPDATE SKIP LOCKED и на время отправки сдвигаются на
+OUTBOX_LEASE секунд вперед. Поэтому получатели должны быть идемпотентны.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from apps.common.api import CONTENT_SERVICE_URL, FREELANCE_SERVICE_URL, MARKETPLACE_SERVICE_URL
+from apps.common.internal_auth import signed_json
+from apps.common.models import OutboxMessage
+from apps.common.tracing import traced_request
+
+logger = logging.getLogger(__name__)
+
+SERVICE_URLS = {
+    'content': CONTENT_SERVICE_URL,
+    'freelance': FREELANCE_SERVICE_URL,
+    'marketplace': MARKETPLACE_SERVICE_URL,
+    'notification': settings.NOTIFICATION_SERVICE_URL,
+}
+
+USER_CLEANUP_PATH = '/api/internal/user-cleanup/'
+USER_CLEANUP_SERVICES = ('content', 'freelance', 'marketplace')
+NOTIFICATION_PATH = '/api/notifications/send/'
+
+# (сервис, путь) -> (batch эндпоинт, поле со списком): такие сообщения отправляются пачкой,
+# ответ содержит errors [{'index', 'error'}] для отклоненных элементов
+BATCH_ENDPOINTS = {
+    ('notification', NOTIFICATION_PATH): ('/api/notifications/send-batch/', 'notifications'),
+}
+
+# Ответы, которые не исправятся повтором
+PERMANENT_ERROR_STATUSES = {400, 404, 405, 410, 422}
+
+
+def enqueue_many(service, path, payloads):
+    """Записать запросы в outbox (в текущей транзакции)"""
+    return OutboxMessage.objects.bulk_create([
+        OutboxMessage(service=service, path=path, payload=payload) for payload in payloads
+    ])
+
+
+def enqueue_user_cleanup(user_id):
+    """Удаление данных пользователя во всех сервисах (в транзакции удаления)"""
+    OutboxMessage.objects.bulk_create([
+        OutboxMessage(service=service, path=USER_CLEANUP_PATH, payload={'user_id': user_id})
+        for service in USER_CLEANUP_SERVICES
+    ])
+
+
+def dead_letter_count():
+    """Число сообщений, которые не удалось доставить (status=failed)"""
+    return OutboxMessage.objects.filter(status=OutboxMessage.STATUS_FAILED).count()
+
+
+def delete_in_chunks(queryset, chunk_size):
+    """Удалить строки частями по chunk_size, каждая часть - отдельный запрос; возвращает число удаленных"""
+    deleted = 0
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += OutboxMessage.objects.filter(id__in=ids).delete()[0]
+
+
+def backoff(attempts):
+    """Задержка перед следующей попыткой: экспонента с джиттером, не больше OUTBOX_BACKOFF_MAX"""
+    delay = min(settings.OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), settings.OUTBOX_BACKOFF_MAX)
+    return delay * random.uniform(0.5, 1)
+
+
+class OutboxRelay:
+    """
+    Отправка сообщений outbox пачками, параллельно по сервисам
+    У каждого сервиса свой цикл, поэтому медленный сервис не задерживает остальные
+    """
+
+    def __init__(self, batch_size, workers, timeout):
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbox')
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(SERVICE_URLS), pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def claim(self, service=None):
+        """Забрать готовые сообщения (всех сервисов или одного) и продлить их на время отправки"""
+        now = timezone.now()
+        queryset = OutboxMessage.objects.filter(status=OutboxMessage.STATUS_PENDING, next_attempt_at__lte=now)
+        if service is not None:
+            queryset = queryset.filter(service=service)
+
+        with transaction.atomic():
+            messages = list(
+                queryset.select_for_update(skip_locked=True).order_by('next_attempt_at')[:self.batch_size]
+            )
+            OutboxMessage.objects.filter(id__in=[m.id for m in messages]).update(
+                next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE)
+            )
+        return messages
+
+    def group(self, messages):
+        """Разбить пачку на запросы: сообщения для batch эндпоинта - одним запросом"""
+        groups = []
+        batches = {}
+        for message in messages:
+            key = (message.service, message.path)
+            if key in BATCH_ENDPOINTS:
+                batches.setdefault(key, []).append(message)
+            else:
+                groups.append([message])
+        return groups + list(batches.values())
+
+    def post(self, service, path, payload):
+        """POST в сервис; возвращает (ответ, ошибка или None, можно ли повторить)"""
+        # Внутренние эндпоинты принимают только подписанные запросы
+        body, headers = signed_json('POST', path, payload)
+        try:
+            response = traced_request(
+                'POST',
+                f'{SERVICE_URLS[service]}{path}',
+                session=self.session,
+                data=body,
+                headers=headers,
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            return None, str(e), True
+
+        if 200 <= response.status_code < 300:
+            return response, None, False
+        error = f'HTTP {response.status_code}: {response.text[:500]}'
+        return response, error, response.status_code not in PERMANENT_ERROR_STATUSES
+
+    def send(self, messages):
+        """
+        Отправить сообщение или группу для batch эндпоинта (выполняется в пуле, без обращений к БД)
+        Возвращает (ошибка или None, можно ли повторить) для каждого сообщения
+        """
+        service, path = messages[0].service, messages[0].path
+        batch = BATCH_ENDPOINTS.get((service, path))
+
+        if batch is None:
+            _, error, retryable = self.post(service, path, messages[0].payload)
+            return [(error, retryable)]
+
+        batch_path, field = batch
+        response, error, retryable = self.post(service, batch_path, {field: [m.payload for m in messages]})
+        if error:
+            return [(error, retryable)] * len(messages)
+
+        # Отклоненные элементы (например, уведомления выключены) не повторяются
+        try:
+            errors = response.json().get('errors', [])
+        except ValueError:
+            errors = []
+        rejected = {item['index']: item['error'] for item in errors}
+        return [(rejected.get(index), False) for index in range(len(messages))]
+
+    def record(self, message, error, retryable):
+        message.attempts += 1
+        message.last_error = error or ''
+
+        if error is None:
+            message.status = OutboxMessage.STATUS_SENT
+            message.sent_at = timezone.now()
+        elif not retryable or message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            message.status = OutboxMessage.STATUS_FAILED
+            logger.error(f'Outbox message {message.id} to {message.service} failed after {message.attempts} attempts: {error}')
+        else:
+            message.next_attempt_at = timezone.now() + timedelta(seconds=backoff(message.attempts))
+            logger.warning(f'Outbox message {message.id} to {message.service} will be retried: {error}')
+
+        message.save(update_fields=['status', 'attempts', 'last_error', 'sent_at', 'next_attempt_at'])
+
+    def run_once(self, service=None):
+        """Отправить одну пачку; возвращает число обработанных сообщений"""
+        messages = self.claim(service)
+        if not messages:
+            return 0
+
+        groups = self.group(messages)
+        for group, results in zip(groups, self.executor.map(self.send, groups)):
+            for message, (error, retryable) in zip(group, results):
+                self.record(message, error, retryable)
+        return len(messages)
+
+    def cleanup(self):
+        """
+        Удалить старые отправленные и failed сообщения
+        Возвращает (число удаленных, число оставшихся failed)
+        """
+        now = timezone.now()
+        chunk_size = settings.OUTBOX_CLEANUP_CHUNK_SIZE
+        deleted = delete_in_chunks(
+            OutboxMessage.objects.filter(
+                status=OutboxMessage.STATUS_SENT,
+                sent_at__lt=now - timedelta(days=settings.OUTBOX_SENT_RETENTION_DAYS)
+            ),
+            chunk_size
+        )
+        deleted += delete_in_chunks(
+            OutboxMessage.objects.filter(
+                status=OutboxMessage.STATUS_FAILED,
+                created_at__lt=now - timedelta(days=settings.OUTBOX_FAILED_RETENTION_DAYS)
+            ),
+            chunk_size
+        )
+
+        dead_letters = dead_letter_count()
+        if dead_letters:
+            logger.warning(f'Outbox has {dead_letters} failed (dead letter) messages')
+        return deleted, dead_letters
+
+    def run_cleanup(self, interval):
+        while True:
+            close_old_connections()
+            try:
+                deleted, _ = self.cleanup()
+                if deleted:
+                    logger.info(f'Outbox cleanup deleted {deleted} old messages')
+            except Exception as e:
+                logger.error(f'Outbox cleanup error: {str(e)}')
+            time.sleep(interval)
+
+    def run_service(self, service, poll_interval):
+        while True:
+            # Relay работает долго: соединение с БД, оборванное между пачками, открывается заново
+            close_old_connections()
+            try:
+                processed = self.run_once(service)
+            except Exception as e:
+                # Забранные сообщения вернутся в очередь после OUTBOX_LEASE
+                logger.error(f'Outbox relay error ({service}): {str(e)}')
+                processed = 0
+            if not processed:
+                time.sleep(poll_interval)
+
+    def run_forever(self, poll_interval, services=None):
+        threads = [
+            threading.Thread(target=self.run_service, args=(service, poll_interval), name=f'outbox-{service}', daemon=True)
+            for service in services or SERVICE_URLS
+        ]
+        threads.append(threading.Thread(
+            target=self.run_cleanup, args=(settings.OUTBOX_CLEANUP_INTERVAL,), name='outbox-cleanup', daemon=True
+        ))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,59 @@
+"""
+Инвалидация кэша пользователей других сервисов
+
+Сервисы кэшируют данные пользователей в общем Redis (USER_CACHE_REDIS_URL) и
+в памяти процесса. При изменении пользователя его записи удаляются из Redis,
+а ID публикуется в USER_CACHE_CHANNEL, чтобы процессы очистили локальный кэш.
+
+Время отзыва токенов пользователя тоже пишется в общий Redis
+(users:revoked:<user_id>): по нему notification-service проверяет токен при
+подключении WebSocket.
+"""
+import logging
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_CHANNEL = 'users:invalidate'
+USER_CACHE_KINDS = ('summary',)
+USER_REVOKED_KEY = 'users:revoked:{user_id}'
+
+_redis = redis.Redis.from_url(
+    getattr(settings, 'USER_CACHE_REDIS_URL', 'redis://localhost:6379/6'),
+    socket_timeout=0.2,
+    socket_connect_timeout=0.2
+)
+
+
+def invalidate_user(user_id):
+    """Удалить пользователя из кэшей всех сервисов"""
+    invalidate_users([user_id])
+
+
+def invalidate_users(user_ids):
+    """Удалить пользователей из кэшей всех сервисов (один round trip в Redis)"""
+    if not user_ids:
+        return
+    try:
+        pipe = _redis.pipeline(transaction=False)
+        pipe.delete(*[f'users:{kind}:{user_id}' for user_id in user_ids for kind in USER_CACHE_KINDS])
+        for user_id in user_ids:
+            pipe.publish(USER_CACHE_CHANNEL, user_id)
+        pipe.execute()
+    except redis.RedisError as e:
+        # Записи истекут по USER_CACHE_TTL
+        logger.warning(f"User cache invalidation failed for {len(user_ids)} users: {e}")
+
+
+def publish_revocations(user_ids, revoked_at, timeout):
+    """Записать время отзыва токенов пользователей для других сервисов (на время жизни токена)"""
+    try:
+        pipe = _redis.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.set(USER_REVOKED_KEY.format(user_id=user_id), repr(revoked_at), ex=timeout)
+        pipe.execute()
+    except redis.RedisError as e:
+        # Отзыв в кэше user-service уже записан; WebSocket примет старый токен до его exp
+        logger.warning(f"Token revocation publish failed for {len(user_ids)} users: {e}")
@@ -1,19 +1,56 @@
+import time
+
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.db import connection
+from django_redis import get_redis_connection
+
+from apps.common.outbox import dead_letter_count
 
-@require_http_methods(['GET'])          
-def health_check(request):
 
+def check_database():
+    """Статус БД и задержка запроса в мс"""
+    started = time.monotonic()
     try:
         with connection.cursor() as cursor:
             cursor.execute("SELECT 1")
-        db_status = 'healthy'
     except Exception:
-        db_status = 'unhealthy'
+        return 'unhealthy', None
+    return 'healthy', round((time.monotonic() - started) * 1000, 2)
+
+
+def check_redis():
+    """Статус Redis и задержка PING в мс"""
+    started = time.monotonic()
+    try:
+        get_redis_connection('default').ping()
+    except Exception:
+        return 'unhealthy', None
+    return 'healthy', round((time.monotonic() - started) * 1000, 2)
+
+
+@require_http_methods(['GET'])
+def health_check(request):
+    """
+    Проверка здоровья сервиса
+    ?deep=1 - дополнительно Redis, задержки зависимостей и число недоставленных
+    сообщений outbox (для gateway /health/?deep=1)
+    """
+    db_status, db_latency = check_database()
 
-    return JsonResponse({
+    data = {
         'status': 'healthy' if db_status == 'healthy' else 'degraded',
         'service': 'user-service',
         'database': db_status
-    })
+    }
+
+    if request.GET.get('deep', '').lower() in ('1', 'true'):
+        redis_status, redis_latency = check_redis()
+        data['redis'] = redis_status
+        data['latency_ms'] = {'database': db_latency, 'redis': redis_latency}
+        if db_status == 'healthy':
+            data['outbox_failed'] = dead_letter_count()
+        if redis_status != 'healthy':
+            data['status'] = 'degraded'
+
+    return JsonResponse(data)
@@ -0,0 +1,197 @@
+"""
+Массовый импорт пользователей и назначение ролей
+
+Записи читаются потоком (CSV или JSONL) и обрабатываются пачками: пароли
+хэшируются в пуле процессов, пользователи и профили вставляются через
+bulk_create, приветственные уведомления пишутся в outbox в той же транзакции.
+bulk_create и update() не вызывают сигналы, поэтому токены и кэши
+пользователей инвалидируются здесь же.
+"""
+import csv
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from apps.common.identity import revoke_users_tokens
+from apps.common.notifications import send_notifications_batch
+from apps.common.user_cache import invalidate_users
+from .models import User, UserProfile
+from .read_model import PROFILE_CACHE
+
+logger = logging.getLogger(__name__)
+
+ROLES = ('freelancer', 'seller', 'moderator')
+
+
+def read_records(stream, fmt):
+    """Записи из текстового потока: CSV с заголовком или JSONL"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError(f'Line {line_no}: invalid JSON')
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def role_flags(role):
+    """Флаги ролей как в set_role: одна роль, остальные сброшены"""
+    return {f'is_{name}': name == role for name in ROLES}
+
+
+def validate_batch(records, offset, seen_emails):
+    """
+    Нормализовать записи пачки
+    Возвращает (корректные записи, ошибки с номером записи)
+    """
+    valid = []
+    errors = []
+
+    for index, record in enumerate(records, start=offset):
+        email = (record.get('email') or '').lower().strip()
+        password = record.get('password') or ''
+        role = record.get('role') or None
+
+        try:
+            validate_email(email)
+        except ValidationError:
+            errors.append({'index': index, 'error': f'Invalid email: {email!r}'})
+            continue
+        if not password:
+            errors.append({'index': index, 'error': 'Password required'})
+            continue
+        if role is not None and role not in ROLES:
+            errors.append({'index': index, 'error': f'Invalid role: {role}'})
+            continue
+        if email in seen_emails:
+            errors.append({'index': index, 'error': f'Duplicate email: {email}'})
+            continue
+
+        seen_emails.add(email)
+        valid.append({
+            'index': index,
+            'email': email,
+            'password': password,
+            'first_name': (record.get('first_name') or '')[:150],
+            'last_name': (record.get('last_name') or '')[:150],
+            'role': role,
+        })
+
+    # Уже зарегистрированные - одним запросом на пачку
+    existing = set(
+        User.objects.filter(email__in=[r['email'] for r in valid]).values_list('email', flat=True)
+    )
+    if existing:
+        errors.extend(
+            {'index': r['index'], 'error': f'Email already registered: {r["email"]}'}
+            for r in valid if r['email'] in existing
+        )
+        valid = [r for r in valid if r['email'] not in existing]
+
+    return valid, errors
+
+
+def welcome_notification(user):
+    return {
+        'user_id': user.id,
+        'type': 'in_app',
+        'event': 'user_registered',
+        'title': 'Добро пожаловать!',
+        'message': f'Здравствуйте, {user.first_name}! Ваш аккаунт успешно создан.',
+    }
+
+
+def import_users(records, batch_size=None, notify=True):
+    """
+    Создать пользователей из потока записей (email, password, first_name, last_name, role)
+    Возвращает {'created': N, 'errors': [...]}; ошибки не прерывают импорт
+    """
+    batch_size = batch_size or settings.BULK_IMPORT_BATCH_SIZE
+    workers = settings.BULK_IMPORT_HASH_WORKERS
+    result = {'created': 0, 'errors': []}
+    seen_emails = set()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_no, batch in enumerate(batched(records, batch_size)):
+            valid, errors = validate_batch(batch, batch_no * batch_size, seen_emails)
+            result['errors'].extend(errors)
+            if not valid:
+                continue
+
+            chunksize = max(1, len(valid) // (workers * 4))
+            hashes = executor.map(make_password, [r['password'] for r in valid], chunksize=chunksize)
+
+            users = [
+                User(
+                    email=r['email'],
+                    first_name=r['first_name'],
+                    last_name=r['last_name'],
+                    password=password_hash,
+                    **role_flags(r['role'])
+                )
+                for r, password_hash in zip(valid, hashes)
+            ]
+
+            try:
+                with transaction.atomic():
+                    users = User.objects.bulk_create(users)
+                    UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+                    if notify:
+                        send_notifications_batch([welcome_notification(user) for user in users])
+            except IntegrityError as e:
+                # Email зарегистрировали параллельно - пачка не создана целиком
+                logger.error(f'Bulk import batch {batch_no} failed: {str(e)}')
+                result['errors'].extend(
+                    {'index': r['index'], 'error': 'Batch failed: email conflict'} for r in valid
+                )
+                continue
+
+            result['created'] += len(users)
+            logger.info(f'Bulk import batch {batch_no}: {len(users)} users created')
+
+    return result
+
+
+def users_changed(user_ids):
+    """Токены и кэши пользователей после изменения в обход сигналов"""
+    revoke_users_tokens(user_ids)
+    PROFILE_CACHE.delete_many(user_ids)
+    invalidate_users(user_ids)
+
+
+def set_roles(user_ids, role, batch_size=None):
+    """
+    Назначить роль пользователям одним UPDATE на пачку
+    Как и set_role, остальные роли сбрасываются. Возвращает число обновленных
+    """
+    if role not in ROLES:
+        raise ValueError(f'Invalid role: {role}')
+
+    batch_size = batch_size or settings.BULK_IMPORT_BATCH_SIZE
+    updated = 0
+
+    for chunk in batched(user_ids, batch_size):
+        with transaction.atomic():
+            updated += User.objects.filter(id__in=chunk).update(**role_flags(role))
+            transaction.on_commit(lambda chunk=chunk: users_changed(chunk))
+
+    logger.info(f'Role {role} set for {updated} users')
+    return updated
@@ -0,0 +1,28 @@
+"""
+Хэшеры паролей с настраиваемым work factor
+
+Work factor читается из PASSWORD_HASH_WORK_FACTOR при каждом хэшировании,
+поэтому после его изменения Django считает старые хэши устаревшими и
+пароль перехэшируется при следующем входе (apps/users/passwords.py).
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256, work factor - число итераций"""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_WORK_FACTOR or PBKDF2PasswordHasher.iterations
+
+
+class TunableScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt, work factor - параметр N (степень двойки)"""
+
+    # Лимит памяти по умолчанию (32 МБ) не пропускает N > 2**14
+    maxmem = 512 * 1024 * 1024
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_HASH_WORK_FACTOR or ScryptPasswordHasher.work_factor
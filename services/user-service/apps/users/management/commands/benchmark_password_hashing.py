@@ -0,0 +1,69 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from apps.users.passwords import PasswordHashPool, verify
+
+DEFAULT_CONFIGS = ['pbkdf2_sha256:1000000', 'pbkdf2_sha256:600000', 'pbkdf2_sha256:300000', 'scrypt:16384', 'scrypt:32768']
+PASSWORD = 'benchmark-password'
+
+
+class Command(BaseCommand):
+    help = 'Пропускная способность проверки пароля при входе (логинов/сек на ядро) для алгоритмов и work factor'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--config', action='append', dest='configs',
+            help=f'алгоритм:work_factor, можно несколько (по умолчанию {", ".join(DEFAULT_CONFIGS)})'
+        )
+        parser.add_argument('--duration', type=float, default=3.0, help='Секунд на замер')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Потоков пула хэширования')
+
+    def handle(self, *args, **options):
+        configs = [self.parse_config(config) for config in options['configs'] or DEFAULT_CONFIGS]
+        workers = options['workers']
+        cores = min(workers, os.cpu_count() or 1)
+
+        self.stdout.write(f"{'hasher':<15}{'work factor':>12}{'1 thread/s':>12}{f'{workers} threads/s':>14}{'per core/s':>12}")
+        for algorithm, work_factor in configs:
+            with override_settings(
+                PASSWORD_HASHERS=[settings.PASSWORD_HASHER_CLASSES[algorithm]],
+                PASSWORD_HASH_WORK_FACTOR=work_factor,
+            ):
+                encoded = make_password(PASSWORD)
+                single = self.measure(encoded, 1, options['duration'])
+                parallel = self.measure(encoded, workers, options['duration'])
+            self.stdout.write(
+                f'{algorithm:<15}{work_factor or "default":>12}{single:>12.1f}{parallel:>14.1f}{parallel / cores:>12.1f}'
+            )
+
+    def parse_config(self, config):
+        algorithm, _, work_factor = config.partition(':')
+        if algorithm not in settings.PASSWORD_HASHER_CLASSES:
+            raise CommandError(f'Unknown hasher: {algorithm}')
+        try:
+            return algorithm, int(work_factor or 0)
+        except ValueError:
+            raise CommandError(f'Invalid work factor: {work_factor}')
+
+    def measure(self, encoded, workers, duration):
+        """Проверок пароля в секунду через пул, как в login"""
+        pool = PasswordHashPool(workers, queue_size=0)
+        deadline = time.monotonic() + duration
+
+        def login_loop(_):
+            count = 0
+            while time.monotonic() < deadline:
+                pool.run(verify, PASSWORD, encoded)
+                count += 1
+            return count
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as clients:
+            total = sum(clients.map(login_loop, range(workers)))
+        return total / (time.monotonic() - started)
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from apps.users.stats import UserEventConsumer, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Обновлять статистику пользователей по событиям content и freelance, раз в сутки - сверка'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Обработать одну пачку и выйти')
+
+    def handle(self, *args, **options):
+        consumer = UserEventConsumer(
+            settings.USER_STATS_BATCH_SIZE, settings.USER_STATS_BLOCK_MS, settings.USER_STATS_CLAIM_IDLE_MS
+        )
+        consumer.ensure_group()
+
+        if options['once']:
+            self.stdout.write(self.style.SUCCESS(f'Processed {consumer.run_once()} user events'))
+            return
+
+        self.stdout.write(f'User events consumer {consumer.name} started, batch {settings.USER_STATS_BATCH_SIZE}')
+        while True:
+            # Соединение с БД, оборванное между пачками, открывается заново
+            close_old_connections()
+            self.maybe_reconcile()
+            try:
+                consumer.run_once()
+            except Exception as e:
+                # Неподтвержденные записи будут прочитаны повторно
+                self.stderr.write(f'User events consumer error: {str(e)}')
+                time.sleep(1)
+
+    def maybe_reconcile(self):
+        """Запустить сверку в фоне в USER_STATS_RECONCILE_HOUR - один раз в сутки на все consumer"""
+        now = timezone.localtime()
+        if now.hour != settings.USER_STATS_RECONCILE_HOUR:
+            return
+        if not cache.add(f'user_stats:reconciled:{now.date()}', 1, timeout=24 * 3600):
+            return
+        threading.Thread(target=self.reconcile, name='user-stats-reconcile', daemon=True).start()
+
+    def reconcile(self):
+        try:
+            reconcile(settings.USER_STATS_RECONCILE_CHUNK_SIZE)
+        finally:
+            close_old_connections()
@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.bulk import import_users, read_records
+
+
+class Command(BaseCommand):
+    help = 'Массовый импорт пользователей из CSV или JSONL (email, password, first_name, last_name, role)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с пользователями или - для stdin')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='По умолчанию - по расширению файла')
+        parser.add_argument('--batch-size', type=int, help='Пользователей в одной пачке (BULK_IMPORT_BATCH_SIZE)')
+        parser.add_argument('--no-notify', action='store_true', help='Не отправлять приветственные уведомления')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        try:
+            result = import_users(
+                read_records(stream, fmt),
+                batch_size=options['batch_size'],
+                notify=not options['no_notify']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for error in result['errors']:
+            self.stderr.write(f"#{error['index']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']} users, {len(result['errors'])} rejected"
+        ))
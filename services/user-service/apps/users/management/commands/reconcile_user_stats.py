@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.users.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать статистику пользователей по данным content и freelance'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.USER_STATS_RECONCILE_CHUNK_SIZE,
+            help='Пользователей в одном запросе к сервисам'
+        )
+
+    def handle(self, *args, **options):
+        checked, corrected, failed = reconcile(options['chunk_size'])
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style(f'Checked {checked} users, corrected {corrected}, failed {failed}'))
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.common.outbox import SERVICE_URLS, OutboxRelay
+
+
+class Command(BaseCommand):
+    help = 'Отправлять сообщения outbox в другие сервисы (уведомления, удаление данных пользователей)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Отправить одну пачку и выйти')
+        parser.add_argument('--cleanup', action='store_true', help='Удалить старые отправленные и failed сообщения и выйти')
+        parser.add_argument(
+            '--service', action='append', dest='services', choices=list(SERVICE_URLS),
+            help='Отправлять только сообщения этих сервисов (по умолчанию - все)'
+        )
+
+    def handle(self, *args, **options):
+        relay = OutboxRelay(settings.OUTBOX_BATCH_SIZE, settings.OUTBOX_WORKERS, settings.OUTBOX_REQUEST_TIMEOUT)
+
+        if options['cleanup']:
+            deleted, dead_letters = relay.cleanup()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} outbox messages, {dead_letters} failed remain'))
+            return
+
+        if options['once']:
+            processed = sum(relay.run_once(service) for service in options['services'] or [None])
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} outbox messages'))
+            return
+
+        self.stdout.write(f'Outbox relay started, batch {settings.OUTBOX_BATCH_SIZE}, workers {settings.OUTBOX_WORKERS}')
+        relay.run_forever(settings.OUTBOX_POLL_INTERVAL, options['services'])
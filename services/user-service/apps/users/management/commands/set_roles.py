@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.bulk import ROLES, set_roles
+
+
+class Command(BaseCommand):
+    help = 'Назначить роль пользователям (ID через запятую или по одному на строку в файле)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('role', choices=ROLES)
+        parser.add_argument('--ids', help='ID через запятую')
+        parser.add_argument('--file', help='Файл с ID по одному на строку или - для stdin')
+
+    def handle(self, *args, **options):
+        if options['ids']:
+            lines = options['ids'].split(',')
+        elif options['file']:
+            stream = sys.stdin if options['file'] == '-' else open(options['file'], encoding='utf-8')
+            with stream:
+                lines = stream.read().split()
+        else:
+            raise CommandError('Укажите --ids или --file')
+
+        try:
+            user_ids = [int(line) for line in lines if line.strip()]
+        except ValueError as e:
+            raise CommandError(f'Invalid user ID: {e}')
+
+        updated = set_roles(user_ids, options['role'])
+        self.stdout.write(self.style.SUCCESS(f"Role {options['role']} set for {updated} users"))
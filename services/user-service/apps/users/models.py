@@ -129,3 +129,29 @@ class UserProfile(models.Model):
             roles.append('Seller')
             
         return ", ".join(roles) or "User"
+
+
+class UserStats(models.Model):
+    """
+    Счетчики пользователя из других сервисов (apps/users/stats.py)
+    Обновляются событиями из Redis stream, расхождения исправляет сверка
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    gigs_count = models.PositiveIntegerField(default=0)
+    active_gigs_count = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+    reconciled_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self) -> str:
+        return f'Статистика {self.user_id}'
@@ -0,0 +1,91 @@
+"""
+Проверка паролей при входе
+
+Хэширование пароля - самая дорогая часть login. Оно выполняется в
+ограниченном пуле потоков (hashlib отпускает GIL), а поток запроса только
+ждет результат. Если в пуле уже PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_SIZE
+проверок, новая сразу отклоняется (HashPoolFull -> 503), чтобы шторм входов
+не занимал все потоки gunicorn и не останавливал остальные эндпоинты.
+
+Если пароль захэширован не PASSWORD_HASHER или не с текущим
+PASSWORD_HASH_WORK_FACTOR, при успешном входе он перехэшируется.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+class HashPoolFull(Exception):
+    """Очередь хэширования заполнена"""
+
+
+class PasswordHashPool:
+    """Пул потоков для хэширования с ограничением очереди"""
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pending = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def run(self, fn, *args):
+        """Выполнить fn в пуле и дождаться результата; HashPoolFull, если очередь заполнена"""
+        with self._lock:
+            if self.pending >= self.workers + self.queue_size:
+                raise HashPoolFull()
+            self.pending += 1
+            if self._executor is None:
+                # Создается в воркере gunicorn, а не в мастере до fork
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+HASH_POOL = PasswordHashPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_SIZE)
+
+
+def verify(password, encoded):
+    """
+    Проверить пароль по хэшу (выполняется в пуле)
+    Возвращает (пароль верный, новый хэш или None, если перехэширование не нужно)
+    """
+    if encoded is None:
+        # Пользователя нет: хэшируем, чтобы время ответа не выдавало это
+        make_password(password)
+        return False, None
+
+    is_correct, must_update = verify_password(password, encoded)
+    if is_correct and must_update:
+        return True, make_password(password)
+    return is_correct, None
+
+
+def authenticate_user(email, password):
+    """
+    Активный пользователь с таким email и паролем или None
+    Запрос к БД - в потоке запроса, хэширование - в HASH_POOL
+    """
+    user = User.objects.select_related('profile').filter(email=email).first()
+    is_correct, new_hash = HASH_POOL.run(verify, password, user.password if user else None)
+
+    # Как ModelBackend: неактивный пользователь не аутентифицируется
+    if not is_correct or not user.is_active:
+        return None
+
+    if new_hash:
+        User.objects.filter(pk=user.pk).update(password=new_hash)
+        user.password = new_hash
+        logger.info(f'Password rehashed on login for user {user.id}')
+
+    return user
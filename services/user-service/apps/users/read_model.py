@@ -0,0 +1,184 @@
+"""
+Read model профиля пользователя
+
+Профиль собирается из User + UserProfile один раз и хранится готовыми JSON
+ответами эндпоинтов (профиль, публичный профиль, /auth/me/, /auth/verify/)
+в Redis и в LRU процесса. Сигналы пересобирают его после изменения
+пользователя, эндпоинты отдают байты как есть с ETag.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+# Вариант ответа -> (обертка, поля профиля, ключи ответа перед оберткой)
+PROFILE_VARIANTS = {
+    'profile': ('profile', (
+        'id', 'email', 'first_name', 'last_name', 'bio', 'avatar', 'is_public',
+        'timezone', 'streak_visibility', 'role_display',
+        'is_freelancer', 'is_seller', 'is_moderator', 'is_staff', 'is_superuser',
+    ), {}),
+    'public': ('profile', (
+        'id', 'email', 'first_name', 'last_name', 'bio', 'avatar', 'is_public',
+        'role_display', 'is_freelancer', 'is_seller', 'is_moderator',
+    ), {}),
+    'me': ('user', (
+        'id', 'email', 'first_name', 'last_name', 'bio', 'avatar', 'is_public',
+        'timezone', 'streak_visibility', 'role_display',
+        'is_freelancer', 'is_seller', 'is_moderator', 'is_staff', 'is_superuser',
+        'is_active', 'is_verified', 'date_joined',
+    ), {}),
+    'verify': ('user', (
+        'id', 'email', 'first_name', 'last_name', 'role_display',
+        'is_freelancer', 'is_seller', 'is_moderator',
+    ), {'success': True, 'message': 'Valid'}),
+}
+
+
+def cache_key(user_id):
+    return f'profile:{user_id}'
+
+
+def build_profile(user):
+    """Все поля профиля, которые отдают эндпоинты"""
+    profile = user.profile
+    return {
+        'id': user.id,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'bio': profile.bio,
+        'avatar': profile.avatar.url if profile.avatar else None,
+        'is_public': profile.is_public,
+        'timezone': profile.timezone,
+        'streak_visibility': profile.streak_visibility,
+        'role_display': profile.role_display(),
+        'is_freelancer': user.is_freelancer,
+        'is_seller': user.is_seller,
+        'is_moderator': user.is_moderator,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+        'is_active': user.is_active,
+        'is_verified': user.is_verified,
+        'date_joined': user.date_joined.isoformat(),
+    }
+
+
+def build_entry(user):
+    """Готовые тела ответов и ETag профиля"""
+    profile = build_profile(user)
+    bodies = {
+        variant: json.dumps({**envelope, wrapper: {field: profile[field] for field in fields}}).encode()
+        for variant, (wrapper, fields, envelope) in PROFILE_VARIANTS.items()
+    }
+    return {
+        'is_public': profile['is_public'],
+        'etag': hashlib.sha1(bodies['me']).hexdigest(),
+        'bodies': bodies,
+    }
+
+
+class ProfileCache:
+    """
+    Read model профилей: LRU процесса -> Redis -> сборка из БД
+    Локальная копия живет PROFILE_LOCAL_TTL секунд - столько другие процессы
+    могут отдавать профиль после изменения
+    """
+
+    def __init__(self, ttl, local_ttl, local_size):
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.local_size = local_size
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Запись профиля или None, если пользователя нет"""
+        entry = self._get_local(user_id)
+        if entry is not None:
+            return entry
+
+        try:
+            entry = cache.get(cache_key(user_id))
+        except Exception as e:
+            logger.warning(f'Profile cache read failed: {str(e)}')
+
+        if entry is None:
+            entry = self.rebuild(user_id)
+        else:
+            self._set_local(user_id, entry)
+        return entry
+
+    def rebuild(self, user_id):
+        """Пересобрать профиль из БД и сохранить в оба кэша"""
+        user = User.objects.select_related('profile').filter(id=user_id, profile__isnull=False).first()
+        if user is None:
+            self.delete(user_id)
+            return None
+
+        entry = build_entry(user)
+        try:
+            cache.set(cache_key(user_id), entry, timeout=self.ttl)
+        except Exception as e:
+            logger.warning(f'Profile cache write failed: {str(e)}')
+        self._set_local(user_id, entry)
+        return entry
+
+    def delete(self, user_id):
+        self.delete_many([user_id])
+
+    def delete_many(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._local.pop(user_id, None)
+        try:
+            cache.delete_many([cache_key(user_id) for user_id in user_ids])
+        except Exception as e:
+            logger.warning(f'Profile cache delete failed: {str(e)}')
+
+    def _get_local(self, user_id):
+        with self._lock:
+            item = self._local.get(user_id)
+            if item is None:
+                return None
+            entry, expires_at = item
+            if expires_at < time.monotonic():
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return entry
+
+    def _set_local(self, user_id, entry):
+        with self._lock:
+            self._local[user_id] = (entry, time.monotonic() + self.local_ttl)
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+
+PROFILE_CACHE = ProfileCache(settings.PROFILE_CACHE_TTL, settings.PROFILE_LOCAL_TTL, settings.PROFILE_LOCAL_SIZE)
+
+
+def profile_response(request, entry, variant):
+    """Готовый ответ из read model; 304 - если у клиента эта версия"""
+    etag = f'"{entry["etag"]}-{variant}"'
+
+    if_none_match = request.headers.get('If-None-Match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(entry['bodies'][variant], content_type='application/json')
+
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
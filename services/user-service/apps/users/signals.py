@@ -1,6 +1,12 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from .models import User, UserProfile
+from apps.common.identity import USER_CLAIMS, revoke_user_tokens
+from apps.common.outbox import enqueue_user_cleanup
+from apps.common.user_cache import invalidate_user
+from .read_model import PROFILE_CACHE
 import logging
 
 logger = logging.getLogger(__name__)
@@ -15,3 +21,50 @@ def create_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def log_roles(sender, instance, **kwargs):
     logger.info(f"User {instance.email} roles: freelancer={instance.is_freelancer}, seller={instance.is_seller}, moderator={instance.is_moderator}")
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_user_cache(sender, instance, **kwargs):
+    user_id = instance.pk if sender is User else instance.user_id
+    transaction.on_commit(lambda: invalidate_user(user_id))
+
+
+@receiver(pre_save, sender=User)
+def revoke_stale_claims(sender, instance, update_fields=None, **kwargs):
+    """Claims в выданных токенах устарели - отзываем их"""
+    if not settings.JWT_CLAIMS_ONLY or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(USER_CLAIMS):
+        return
+
+    old = User.objects.filter(pk=instance.pk).values(*USER_CLAIMS).first()
+    if old and any(old[claim] != getattr(instance, claim) for claim in USER_CLAIMS):
+        user_id = instance.pk
+        transaction.on_commit(lambda: revoke_user_tokens(user_id))
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user_tokens(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: revoke_user_tokens(user_id))
+
+
+@receiver(post_delete, sender=User)
+def cleanup_deleted_user_data(sender, instance, **kwargs):
+    # В транзакции удаления: данные в других сервисах удалит outbox relay
+    enqueue_user_cleanup(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=UserProfile)
+def rebuild_profile_read_model(sender, instance, **kwargs):
+    user_id = instance.pk if sender is User else instance.user_id
+    transaction.on_commit(lambda: PROFILE_CACHE.rebuild(user_id))
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=UserProfile)
+def delete_profile_read_model(sender, instance, **kwargs):
+    user_id = instance.pk if sender is User else instance.user_id
+    transaction.on_commit(lambda: PROFILE_CACHE.delete(user_id))
@@ -0,0 +1,200 @@
+"""
+Статистика пользователей (посты, гиги) - проекция в user-service
+
+Content и freelance публикуют события (post_created, gig_activated, ...) в Redis
+stream USER_EVENTS_STREAM общего USER_CACHE_REDIS_URL. Consumer
+(manage.py consume_user_events) читает их через consumer group и применяет
+пачкой к UserStats, поэтому чтение счетчиков - один запрос по первичному ключу
+без обращения к другим сервисам.
+
+Доставка at-least-once: событие может примениться дважды или потеряться, если
+Redis был недоступен при публикации. Такие расхождения исправляет сверка
+(reconcile): счетчики пересчитываются в сервисах-источниках частями по
+USER_STATS_RECONCILE_CHUNK_SIZE пользователей.
+"""
+import logging
+import socket
+
+import redis
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from apps.common.api import CONTENT_SERVICE_URL, FREELANCE_SERVICE_URL, fetch_user_stats
+from .models import User, UserStats
+
+logger = logging.getLogger(__name__)
+
+USER_EVENTS_STREAM = 'users:events'
+USER_EVENTS_GROUP = 'user-stats'
+
+STAT_FIELDS = ('posts_count', 'gigs_count', 'active_gigs_count')
+EVENT_DELTAS = {
+    'post_created': ('posts_count', 1),
+    'post_deleted': ('posts_count', -1),
+    'gig_created': ('gigs_count', 1),
+    'gig_deleted': ('gigs_count', -1),
+    'gig_activated': ('active_gigs_count', 1),
+    'gig_deactivated': ('active_gigs_count', -1),
+}
+
+
+def get_user_stats(user_id):
+    """Счетчики активного пользователя или None, если его нет"""
+    row = User.objects.filter(pk=user_id, is_active=True).values(
+        *[f'stats__{field}' for field in STAT_FIELDS]
+    ).first()
+    if row is None:
+        return None
+    # Нет строки UserStats - у пользователя еще не было событий
+    return {field: row[f'stats__{field}'] or 0 for field in STAT_FIELDS}
+
+
+def parse_event(fields):
+    """(поле, изменение, user_id) из записи stream или None для неизвестного события"""
+    event = fields.get(b'event', b'').decode()
+    if event not in EVENT_DELTAS:
+        return None
+    try:
+        user_id = int(fields[b'user_id'])
+    except (KeyError, ValueError):
+        return None
+    return (*EVENT_DELTAS[event], user_id)
+
+
+def apply_events(events):
+    """
+    Применить события [(поле, изменение, user_id)] одной транзакцией
+    Изменения одного пользователя суммируются - один UPDATE на пользователя
+    """
+    deltas = {}
+    for field, delta, user_id in events:
+        user_deltas = deltas.setdefault(user_id, {})
+        user_deltas[field] = user_deltas.get(field, 0) + delta
+
+    with transaction.atomic():
+        # События удаленных пользователей пропускаются
+        user_ids = set(User.objects.filter(id__in=deltas).values_list('id', flat=True))
+        UserStats.objects.bulk_create(
+            [UserStats(user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True
+        )
+        now = timezone.now()
+        for user_id in user_ids:
+            changes = {
+                field: Greatest(F(field) + delta, 0)
+                for field, delta in deltas[user_id].items() if delta
+            }
+            if changes:
+                UserStats.objects.filter(user_id=user_id).update(updated_at=now, **changes)
+    return len(user_ids)
+
+
+class UserEventConsumer:
+    """Чтение USER_EVENTS_STREAM через consumer group: несколько consumer делят поток"""
+
+    def __init__(self, batch_size, block_ms, claim_idle_ms, name=None):
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.name = name or socket.gethostname()
+        self.redis = redis.Redis.from_url(settings.USER_CACHE_REDIS_URL)
+
+    def ensure_group(self):
+        try:
+            self.redis.xgroup_create(USER_EVENTS_STREAM, USER_EVENTS_GROUP, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def read(self):
+        """
+        Следующая пачка: свои неподтвержденные записи (после ошибки), записи
+        упавших consumer, простаивающие claim_idle_ms, затем новые
+        """
+        pending = self.redis.xreadgroup(
+            USER_EVENTS_GROUP, self.name, {USER_EVENTS_STREAM: '0'}, count=self.batch_size
+        )
+        if pending and pending[0][1]:
+            return pending[0][1]
+
+        claimed = self.redis.xautoclaim(
+            USER_EVENTS_STREAM, USER_EVENTS_GROUP, self.name,
+            min_idle_time=self.claim_idle_ms, start_id='0-0', count=self.batch_size
+        )[1]
+        if claimed:
+            return claimed
+
+        new = self.redis.xreadgroup(
+            USER_EVENTS_GROUP, self.name, {USER_EVENTS_STREAM: '>'},
+            count=self.batch_size, block=self.block_ms
+        )
+        return new[0][1] if new else []
+
+    def run_once(self):
+        """Применить одну пачку и подтвердить ее; возвращает число записей"""
+        entries = self.read()
+        if not entries:
+            return 0
+
+        # Удаленные из stream записи (MAXLEN) приходят без полей
+        events = [event for _, fields in entries if fields and (event := parse_event(fields))]
+        if events:
+            apply_events(events)
+        self.redis.xack(USER_EVENTS_STREAM, USER_EVENTS_GROUP, *[entry_id for entry_id, _ in entries])
+        return len(entries)
+
+
+def reconcile(chunk_size):
+    """
+    Пересчитать счетчики всех пользователей по данным content и freelance
+    Возвращает (проверено, исправлено, не удалось проверить)
+    """
+    checked = corrected = failed = 0
+    last_id = 0
+
+    while True:
+        user_ids = list(
+            User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+
+        try:
+            posts = fetch_user_stats(CONTENT_SERVICE_URL, user_ids)
+            gigs = fetch_user_stats(FREELANCE_SERVICE_URL, user_ids)
+        except (requests.RequestException, ValueError, KeyError) as e:
+            logger.error(f'User stats reconciliation failed for users {user_ids[0]}-{last_id}: {str(e)}')
+            failed += len(user_ids)
+            continue
+
+        current = {
+            row[0]: row[1:]
+            for row in UserStats.objects.filter(user_id__in=user_ids).values_list('user_id', *STAT_FIELDS)
+        }
+        now = timezone.now()
+        rows = []
+        for user_id in user_ids:
+            values = (
+                posts.get(user_id, {}).get('posts_count', 0),
+                gigs.get(user_id, {}).get('gigs_count', 0),
+                gigs.get(user_id, {}).get('active_gigs_count', 0),
+            )
+            if current.get(user_id, (0, 0, 0)) != values:
+                corrected += 1
+            rows.append(UserStats(user_id=user_id, updated_at=now, reconciled_at=now, **dict(zip(STAT_FIELDS, values))))
+
+        UserStats.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=[*STAT_FIELDS, 'updated_at', 'reconciled_at']
+        )
+        checked += len(user_ids)
+
+    logger.info(f'User stats reconciled: {checked} checked, {corrected} corrected, {failed} failed')
+    return checked, corrected, failed
@@ -1,7 +1,37 @@
+import io
+import json
+import time
+from datetime import timedelta
+from unittest.mock import Mock
+import msgpack
 import pytest
+import requests
 from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
 from apps.users.models import User
+from apps.users.read_model import PROFILE_CACHE
+from apps.users.passwords import HASH_POOL
+from apps.users.stats import apply_events, parse_event, reconcile
+from apps.common.api import CONTENT_SERVICE_URL
+from apps.common.identity import (
+    add_user_claims, get_identity_user_id, is_token_revoked, revocation_key, revoke_user_tokens, sign_identity
+)
+from apps.common import user_cache
+from apps.common.internal_auth import SIGNATURE_HEADER
+from apps.common.models import OutboxMessage
+from apps.common.outbox import SERVICE_URLS, OutboxRelay
+from apps.common.middleware import JWTAuthenticationMiddleware
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # Read model профиля переживает откат транзакции теста
+    cache.clear()
+    PROFILE_CACHE._local.clear()
 
 
 @pytest.fixture
@@ -122,3 +152,437 @@ def test_set_role_non_admin(client, user):
     )
     assert response.status_code == 403, f"Failed with response: {response.content.decode()}"
     assert response.json()['error'] == 'Forbidden'
+
+
+@pytest.mark.django_db
+def test_current_user_with_gateway_identity_headers(client, user):
+    exp = int(time.time()) + 60
+    response = client.get(
+        reverse('users:current_user'),
+        HTTP_X_USER_ID=str(user.id),
+        HTTP_X_USER_EMAIL='',
+        HTTP_X_TOKEN_EXP=str(exp),
+        HTTP_X_IDENTITY_SIGNATURE=sign_identity(user.id, '', exp)
+    )
+    assert response.status_code == 200
+    assert response.json()['user']['email'] == user.email
+
+
+def test_forged_identity_headers_are_rejected(rf):
+    exp = int(time.time()) + 60
+    request = rf.get(
+        '/api/auth/me/',
+        HTTP_X_USER_ID='1',
+        HTTP_X_USER_EMAIL='',
+        HTTP_X_TOKEN_EXP=str(exp),
+        HTTP_X_IDENTITY_SIGNATURE='0' * 64
+    )
+    assert get_identity_user_id(request) is None
+
+
+@pytest.mark.django_db
+def test_request_id_is_propagated(client, user):
+    response = client.get(
+        reverse('users:profile_detail', kwargs={'pk': user.pk}),
+        HTTP_X_REQUEST_ID='req-42'
+    )
+    assert response['X-Request-ID'] == 'req-42'
+    assert response['Server-Timing'].startswith('app;dur=')
+
+    response = client.get(
+        reverse('users:profile_detail', kwargs={'pk': user.pk}),
+        HTTP_X_REQUEST_ID='bad id'
+    )
+    assert response['X-Request-ID'] != 'bad id'
+
+
+@pytest.mark.django_db
+def test_users_batch_fields_projection(client, user, admin):
+    client.force_login(user)
+    response = client.post(
+        reverse('users:get_users_batch'),
+        json.dumps({'user_ids': [user.id, admin.id, 999], 'fields': ['email', 'role_display', 'avatar_url']}),
+        content_type='application/json'
+    )
+    assert response.status_code == 200
+    data = json.loads(b''.join(response.streaming_content))
+    assert data['count'] == 2
+    users = {u['id']: u for u in data['users']}
+    assert users[user.id] == {'id': user.id, 'email': user.email, 'role_display': 'User', 'avatar_url': None}
+    assert users[admin.id]['role_display'] == 'Admin'
+
+
+@pytest.mark.django_db
+def test_users_batch_rejects_unknown_fields_and_large_batches(client, user, settings):
+    client.force_login(user)
+    url = reverse('users:get_users_batch')
+
+    response = client.post(url, json.dumps({'user_ids': [user.id], 'fields': ['password']}), content_type='application/json')
+    assert response.status_code == 400
+
+    settings.USERS_BATCH_MAX_SIZE = 2
+    response = client.post(url, json.dumps({'user_ids': [1, 2, 3]}), content_type='application/json')
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_users_batch_msgpack(client, user, settings):
+    settings.USERS_BATCH_CHUNK_SIZE = 1
+    other = User.objects.create_user(email='other@test.com', password='testpass123')
+    client.force_login(user)
+    response = client.post(
+        reverse('users:get_users_batch'),
+        msgpack.packb({'user_ids': [user.id, other.id], 'fields': ['id', 'email']}),
+        content_type='application/x-msgpack',
+        HTTP_ACCEPT='application/x-msgpack'
+    )
+    assert response.status_code == 200
+    unpacker = msgpack.Unpacker()
+    unpacker.feed(b''.join(response.streaming_content))
+    assert sorted(u['email'] for u in unpacker) == ['other@test.com', 'test@test.com']
+
+
+@pytest.mark.django_db
+def test_claims_only_auth_and_revocation(client, rf, user, settings, django_assert_num_queries,
+                                        django_capture_on_commit_callbacks):
+    settings.JWT_CLAIMS_ONLY = True
+    response = client.post(
+        reverse('users:login'),
+        json.dumps({'email': 'test@test.com', 'password': 'testpass123'}),
+        content_type='application/json'
+    )
+    token = response.json()['access_token']
+
+    # id и роли - из токена, без запроса User
+    request = rf.get('/api/auth/me/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    with django_assert_num_queries(0):
+        JWTAuthenticationMiddleware(lambda r: None)(request)
+        assert request.authenticated
+        assert (request.user.id, request.user.is_freelancer) == (user.id, False)
+
+    response = client.post(reverse('users:verify_token'), HTTP_AUTHORIZATION=f'Bearer {token}')
+    assert response.status_code == 200
+    assert response.json()['user']['email'] == user.email
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user.is_active = False
+        user.save()
+
+    response = client.post(reverse('users:verify_token'), HTTP_AUTHORIZATION=f'Bearer {token}')
+    assert response.status_code == 401
+
+
+@pytest.mark.django_db
+def test_claims_only_gateway_headers_carry_roles(rf, user, settings, django_assert_num_queries):
+    settings.JWT_CLAIMS_ONLY = True
+    exp = int(time.time()) + 60
+    claims = f'iat={time.time()},is_active=1,is_staff=1,is_superuser=0,is_freelancer=0,is_seller=1,is_moderator=0'
+    request = rf.get(
+        '/api/auth/me/',
+        HTTP_X_USER_ID=str(user.id),
+        HTTP_X_USER_EMAIL=user.email,
+        HTTP_X_TOKEN_EXP=str(exp),
+        HTTP_X_USER_CLAIMS=claims,
+        HTTP_X_IDENTITY_SIGNATURE=sign_identity(user.id, user.email, exp, claims)
+    )
+
+    # Проверка is_staff и ролей не загружает User
+    with django_assert_num_queries(0):
+        JWTAuthenticationMiddleware(lambda r: None)(request)
+        assert request.authenticated
+        assert (request.user.is_staff, request.user.is_seller, request.user.is_moderator) == (True, True, False)
+
+    forged = rf.get(
+        '/api/auth/me/',
+        HTTP_X_USER_ID=str(user.id),
+        HTTP_X_USER_EMAIL=user.email,
+        HTTP_X_TOKEN_EXP=str(exp),
+        HTTP_X_USER_CLAIMS=claims.replace('is_superuser=0', 'is_superuser=1'),
+        HTTP_X_IDENTITY_SIGNATURE=sign_identity(user.id, user.email, exp, claims)
+    )
+    assert get_identity_user_id(forged) is None
+
+
+@pytest.mark.django_db
+def test_token_issued_right_after_revocation_is_valid(user):
+    before = add_user_claims(RefreshToken.for_user(user).access_token, user)
+    revoke_user_tokens(user.id)
+    after = add_user_claims(RefreshToken.for_user(user).access_token, user)
+
+    # Отзыв и новый токен в одну секунду различаются по долям секунды
+    assert is_token_revoked(user.id, before['iat'])
+    assert not is_token_revoked(user.id, after['iat'])
+
+
+@pytest.mark.django_db
+def test_revocation_published_to_shared_redis(user, monkeypatch):
+    shared = Mock()
+    monkeypatch.setattr(user_cache, '_redis', shared)
+
+    revoke_user_tokens(user.id)
+
+    key, value = shared.pipeline.return_value.set.call_args.args
+    assert key == f'users:revoked:{user.id}'
+    assert float(value) == cache.get(revocation_key(user.id))
+    assert shared.pipeline.return_value.set.call_args.kwargs['ex'] == 3600
+
+
+@pytest.mark.django_db
+def test_role_change_does_not_revoke_without_claims_only(user, settings, django_capture_on_commit_callbacks):
+    settings.JWT_CLAIMS_ONLY = False
+    with django_capture_on_commit_callbacks(execute=True):
+        user.is_seller = True
+        user.save()
+    assert cache.get(revocation_key(user.id)) is None
+
+    settings.JWT_CLAIMS_ONLY = True
+    with django_capture_on_commit_callbacks(execute=True):
+        user.is_seller = False
+        user.save()
+    assert cache.get(revocation_key(user.id)) is not None
+
+
+@pytest.mark.django_db
+def test_verify_token_response_body(client, user):
+    token = str(RefreshToken.for_user(user).access_token)
+    response = client.post(reverse('users:verify_token'), HTTP_AUTHORIZATION=f'Bearer {token}')
+    assert response.status_code == 200
+    assert response.content == json.dumps({
+        'success': True,
+        'message': 'Valid',
+        'user': {
+            'id': user.id,
+            'email': 'test@test.com',
+            'first_name': 'Test',
+            'last_name': 'User',
+            'role_display': 'User',
+            'is_freelancer': False,
+            'is_seller': False,
+            'is_moderator': False,
+        }
+    }).encode()
+
+
+@pytest.mark.django_db
+def test_profile_detail_etag_and_rebuild(client, user, django_assert_num_queries, django_capture_on_commit_callbacks):
+    url = reverse('users:profile_detail', kwargs={'pk': user.pk})
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response['ETag']
+
+    with django_assert_num_queries(0):
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user.profile.bio = 'Updated'
+        user.profile.save()
+
+    response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response['ETag'] != etag
+    assert response.json()['profile']['bio'] == 'Updated'
+
+
+@pytest.mark.django_db
+def test_import_users_command(tmp_path, user):
+    path = tmp_path / 'users.jsonl'
+    path.write_text('\n'.join(json.dumps(r) for r in [
+        {'email': 'A@Partner.com', 'password': 'pass12345', 'first_name': 'A', 'role': 'seller'},
+        {'email': 'b@partner.com', 'password': 'pass12345'},
+        {'email': 'b@partner.com', 'password': 'pass12345'},
+        {'email': user.email, 'password': 'pass12345'},
+        {'email': 'broken', 'password': 'pass12345'},
+    ]))
+
+    call_command('import_users', str(path), '--no-notify', '--batch-size', '2', stdout=io.StringIO(), stderr=io.StringIO())
+
+    imported = User.objects.get(email='a@partner.com')
+    assert imported.is_seller and imported.check_password('pass12345')
+    assert imported.profile.pk is not None
+    assert User.objects.filter(email='b@partner.com').count() == 1
+    assert User.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_set_role_bulk(client, user, admin):
+    other = User.objects.create_user(email='other@test.com', password='testpass123', is_moderator=True)
+    exp = int(time.time()) + 60
+    response = client.post(
+        reverse('users:set_role_bulk'),
+        json.dumps({'user_ids': [user.id, other.id], 'role': 'freelancer'}),
+        content_type='application/json',
+        HTTP_X_USER_ID=str(admin.id),
+        HTTP_X_USER_EMAIL='',
+        HTTP_X_TOKEN_EXP=str(exp),
+        HTTP_X_IDENTITY_SIGNATURE=sign_identity(admin.id, '', exp)
+    )
+    assert response.status_code == 200
+    assert response.json()['updated'] == 2
+    other.refresh_from_db()
+    assert other.is_freelancer and not other.is_moderator
+
+
+@pytest.mark.django_db
+def test_login_rehashes_to_configured_hasher(client, settings):
+    settings.PASSWORD_HASH_WORK_FACTOR = 1000
+    user = User.objects.create_user(email='rehash@test.com', password='testpass123')
+    assert user.password.startswith('pbkdf2_sha256$1000$')
+
+    def login(password='testpass123'):
+        return client.post(
+            reverse('users:login'),
+            json.dumps({'email': 'rehash@test.com', 'password': password}),
+            content_type='application/json'
+        )
+
+    settings.PASSWORD_HASH_WORK_FACTOR = 2000
+    assert login().status_code == 200
+    user.refresh_from_db()
+    assert user.password.startswith('pbkdf2_sha256$2000$')
+
+    settings.PASSWORD_HASHERS = [settings.PASSWORD_HASHER_CLASSES['scrypt'], settings.PASSWORD_HASHER_CLASSES['pbkdf2_sha256']]
+    settings.PASSWORD_HASH_WORK_FACTOR = 1024
+    assert login('wrongpass').status_code == 401
+    assert login().status_code == 200
+    user.refresh_from_db()
+    assert user.password.startswith('scrypt$1024$')
+    assert user.check_password('testpass123')
+
+
+@pytest.mark.django_db
+def test_login_shed_when_hash_queue_full(client, user, monkeypatch):
+    monkeypatch.setattr(HASH_POOL, 'pending', HASH_POOL.workers + HASH_POOL.queue_size)
+    response = client.post(
+        reverse('users:login'),
+        json.dumps({'email': user.email, 'password': 'testpass123'}),
+        content_type='application/json'
+    )
+    assert response.status_code == 503
+    assert response['Retry-After'] == '1'
+
+
+@pytest.mark.django_db
+def test_user_delete_cleanup_via_outbox(user, monkeypatch):
+    user_id = user.id
+    user.delete()
+    messages = OutboxMessage.objects.order_by('service')
+    assert [m.service for m in messages] == ['content', 'freelance', 'marketplace']
+    assert all(m.payload == {'user_id': user_id} for m in messages)
+
+    class FakeResponse:
+        def __init__(self, status_code):
+            self.status_code = status_code
+            self.text = ''
+
+    def fake_request(method, url, **kwargs):
+        if url.startswith(SERVICE_URLS['freelance']):
+            raise requests.ConnectionError('refused')
+        return FakeResponse(500 if url.startswith(SERVICE_URLS['marketplace']) else 200)
+
+    monkeypatch.setattr('apps.common.outbox.traced_request', fake_request)
+    relay = OutboxRelay(batch_size=10, workers=3, timeout=1)
+    assert relay.run_once() == 3
+
+    statuses = dict(OutboxMessage.objects.values_list('service', 'status'))
+    assert statuses == {'content': 'sent', 'freelance': 'pending', 'marketplace': 'pending'}
+    # Повтор - только после задержки
+    assert relay.run_once() == 0
+
+    OutboxMessage.objects.filter(status='pending').update(next_attempt_at=timezone.now())
+    monkeypatch.setattr('apps.common.outbox.traced_request', lambda method, url, **kwargs: FakeResponse(200))
+    assert relay.run_once() == 2
+    assert set(OutboxMessage.objects.values_list('status', flat=True)) == {'sent'}
+    assert OutboxMessage.objects.get(service='freelance').attempts == 2
+
+
+@pytest.mark.django_db
+def test_registration_notification_relayed_in_batch(client, monkeypatch):
+    requests_sent = []
+
+    class FakeResponse:
+        status_code = 201
+        text = ''
+
+        def json(self):
+            return {'created': 1, 'errors': [{'index': 1, 'error': 'In-app notifications disabled'}]}
+
+    def fake_request(method, url, **kwargs):
+        assert SIGNATURE_HEADER in kwargs['headers']
+        requests_sent.append((url, json.loads(kwargs['data'])))
+        return FakeResponse()
+
+    monkeypatch.setattr('apps.common.outbox.traced_request', fake_request)
+
+    for email in ('first@test.com', 'second@test.com'):
+        response = client.post(reverse('users:create_user'), {
+            'email': email,
+            'password1': 'testpass123',
+            'password2': 'testpass123',
+            'first_name': 'New',
+        })
+        assert response.status_code == 201
+    # Ответ регистрации не ждет notification-service
+    assert requests_sent == []
+    assert OutboxMessage.objects.filter(service='notification', status='pending').count() == 2
+
+    assert OutboxRelay(batch_size=10, workers=2, timeout=1).run_once('notification') == 2
+
+    assert len(requests_sent) == 1
+    url, body = requests_sent[0]
+    assert url.endswith('/api/notifications/send-batch/')
+    assert [item['event'] for item in body['notifications']] == ['user_registered', 'user_registered']
+    assert list(OutboxMessage.objects.order_by('id').values_list('status', flat=True)) == ['sent', 'failed']
+
+
+@pytest.mark.django_db
+def test_outbox_cleanup_keeps_recent_and_pending(client, settings):
+    settings.OUTBOX_CLEANUP_CHUNK_SIZE = 1
+    now = timezone.now()
+    old, recent = now - timedelta(days=40), now - timedelta(days=1)
+    for status, sent_at, created_at in [
+        ('sent', old, old),
+        ('sent', old, old),
+        ('sent', recent, recent),
+        ('failed', None, old),
+        ('failed', None, recent),
+        ('pending', None, old),
+    ]:
+        message = OutboxMessage.objects.create(service='content', path='/', payload={}, status=status, sent_at=sent_at)
+        OutboxMessage.objects.filter(id=message.id).update(created_at=created_at)
+
+    deleted, dead_letters = OutboxRelay(batch_size=10, workers=1, timeout=1).cleanup()
+
+    assert (deleted, dead_letters) == (3, 1)
+    assert sorted(OutboxMessage.objects.values_list('status', flat=True)) == ['failed', 'pending', 'sent']
+    assert client.get('/health/?deep=1').json()['outbox_failed'] == 1
+
+
+@pytest.mark.django_db
+def test_user_stats_from_events_and_reconcile(client, user, monkeypatch):
+    url = reverse('users:user_stats', args=[user.id])
+    assert client.get(url).json()['stats'] == {'posts_count': 0, 'gigs_count': 0, 'active_gigs_count': 0}
+
+    entries = [
+        {b'event': b'post_created', b'user_id': str(user.id).encode()},
+        {b'event': b'post_created', b'user_id': str(user.id).encode()},
+        {b'event': b'gig_created', b'user_id': str(user.id).encode()},
+        {b'event': b'gig_activated', b'user_id': str(user.id).encode()},
+        {b'event': b'gig_deactivated', b'user_id': str(user.id).encode()},
+        {b'event': b'post_created', b'user_id': b'999999'},
+        {b'event': b'unknown', b'user_id': str(user.id).encode()},
+    ]
+    apply_events([event for fields in entries if (event := parse_event(fields))])
+    assert client.get(url).json()['stats'] == {'posts_count': 2, 'gigs_count': 1, 'active_gigs_count': 0}
+
+    # Сверка заменяет счетчики данными сервисов
+    def fake_fetch(service_url, user_ids, timeout=30):
+        if service_url == CONTENT_SERVICE_URL:
+            return {user.id: {'posts_count': 3}}
+        return {user.id: {'gigs_count': 1, 'active_gigs_count': 1}}
+
+    monkeypatch.setattr('apps.users.stats.fetch_user_stats', fake_fetch)
+    assert reconcile(chunk_size=10) == (1, 1, 0)
+    assert client.get(url).json()['stats'] == {'posts_count': 3, 'gigs_count': 1, 'active_gigs_count': 1}
+
+    assert client.get(reverse('users:user_stats', args=[999999])).status_code == 404
@@ -12,10 +12,12 @@ urlpatterns = [
     # Profile Management
     path('api/profile/', views.get_profile, name='profile'),
     path('api/profile/<int:pk>/', views.get_profile_detail, name='profile_detail'),
+    path('api/profile/<int:pk>/stats/', views.get_user_stats_detail, name='user_stats'),
     path('api/profile/update/', views.update_profile, name='update_profile'),
     
     # Role Management
     path('api/set-role/', views.set_role, name='set_role'),
+    path('api/set-role/bulk/', views.set_role_bulk, name='set_role_bulk'),
     
     # Authentication
     path('api/auth/login/', views.login, name='login'),
@@ -1,16 +1,24 @@
 import json
 import urllib.parse
 import logging
-from django.http import JsonResponse
+import msgpack
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, Value, When
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from apps.users.models import User, UserProfile
 from apps.users.forms import RegisterForm, ProfileForm
-from django.contrib.auth import authenticate
+from apps.users.bulk import ROLES, set_roles
+from apps.users.read_model import PROFILE_CACHE, profile_response
+from apps.users.passwords import HASH_POOL, HashPoolFull, authenticate_user
+from apps.users.stats import get_user_stats
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import TokenError
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
+from apps.common.identity import add_user_claims
 from apps.common.notifications import send_notification
 from django.contrib.auth.decorators import login_required
 from apps.common.decorators import (
@@ -21,10 +29,6 @@ from apps.common.decorators import (
 
 logger = logging.getLogger(__name__)
 
-def health_check(request):
-    """Health check endpoint"""
-    return JsonResponse({'status': 'healthy', 'service': 'user-service'})
-
 @csrf_exempt
 @public_endpoint
 def create_user(request):
@@ -35,14 +39,16 @@ def create_user(request):
     if request.method == 'POST':
         form = RegisterForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            send_notification(
-                user_id=user.id,
-                event='user_registered',
-                title='Добро пожаловать!',
-                message=f'Здравствуйте, {user.first_name}! Ваш аккаунт успешно создан.',
-                notification_type='in_app'
-            )
+            # Уведомление пишется в outbox вместе с пользователем, отправляет relay
+            with transaction.atomic():
+                user = form.save()
+                send_notification(
+                    user_id=user.id,
+                    event='user_registered',
+                    title='Добро пожаловать!',
+                    message=f'Здравствуйте, {user.first_name}! Ваш аккаунт успешно создан.',
+                    notification_type='in_app'
+                )
             logger.info(f"User created: {user.email}")
             return JsonResponse({
                 'status': 'success',
@@ -76,28 +82,11 @@ def get_profile(request):
             logger.error(f"Invalid user_id: {user_id}")
             return JsonResponse({'error': 'Invalid user ID'}, status=400)
         
-        user = get_object_or_404(User, id=user_id)
-        profile = user.profile
+        entry = PROFILE_CACHE.get(user_id)
+        if entry is None:
+            raise Http404('User not found')
         
-        return JsonResponse({
-            'profile': {
-                'id': user.id,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'bio': profile.bio,
-                'avatar': profile.avatar.url if profile.avatar else None,
-                'is_public': profile.is_public,
-                'timezone': profile.timezone,
-                'streak_visibility': profile.streak_visibility,
-                'role_display': profile.role_display(),
-                'is_freelancer': user.is_freelancer,
-                'is_seller': user.is_seller,
-                'is_moderator': user.is_moderator,
-                'is_staff': user.is_staff,
-                'is_superuser': user.is_superuser
-            }
-        }, status=200)
+        return profile_response(request, entry, 'profile')
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
@@ -109,9 +98,11 @@ def get_profile_detail(request, pk):
     GET /api/profile/<pk>/
     """
     if request.method == 'GET':
-        profile = get_object_or_404(UserProfile.objects.select_related('user'), user__pk=pk)
+        entry = PROFILE_CACHE.get(pk)
+        if entry is None:
+            raise Http404('Profile not found')
         
-        if not profile.is_public:
+        if not entry['is_public']:
             # Если профиль приватный, проверяем аутентификацию
             if not getattr(request, 'authenticated', False):
                 return JsonResponse({'error': 'Profile is private'}, status=403)
@@ -121,24 +112,29 @@ def get_profile_detail(request, pk):
             if user.id != pk and not (user.is_staff or user.is_superuser):
                 return JsonResponse({'error': 'Profile is private'}, status=403)
         
-        return JsonResponse({
-            'profile': {
-                'id': profile.user.id,
-                'email': profile.user.email,
-                'first_name': profile.user.first_name,
-                'last_name': profile.user.last_name,
-                'bio': profile.bio,
-                'avatar': profile.avatar.url if profile.avatar else None,
-                'is_public': profile.is_public,
-                'role_display': profile.role_display(),
-                'is_freelancer': profile.user.is_freelancer,
-                'is_seller': profile.user.is_seller,
-                'is_moderator': profile.user.is_moderator
-            }
-        }, status=200)
+        return profile_response(request, entry, 'public')
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+@public_endpoint
+@require_http_methods(['GET'])
+def get_user_stats_detail(request, pk):
+    """
+    Публичные счетчики постов и гигов пользователя
+    Читаются из проекции UserStats, без запросов к другим сервисам
+    GET /api/profile/<pk>/stats/
+    """
+    stats = get_user_stats(pk)
+    if stats is None:
+        raise Http404('User not found')
+
+    return JsonResponse({
+        'success': True,
+        'user_id': pk,
+        'stats': stats
+    })
+
+
 @owner_or_staff_required
 def update_profile(request):
     """
@@ -251,6 +247,39 @@ def set_role(request):
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+@csrf_exempt
+@staff_required
+@require_http_methods(['POST'])
+def set_role_bulk(request):
+    """
+    Назначить роль нескольким пользователям (только staff)
+    POST /api/set-role/bulk/  {"user_ids": [...], "role": "seller"}
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid JSON'
+        }, status=400)
+    
+    user_ids = data.get('user_ids')
+    role = data.get('role')
+    
+    if not isinstance(user_ids, list) or role not in ROLES:
+        return JsonResponse({'error': 'user_ids list and valid role required'}, status=400)
+    
+    try:
+        user_ids = [int(user_id) for user_id in user_ids]
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Invalid user ID'}, status=400)
+    
+    updated = set_roles(user_ids, role)
+    
+    logger.info(f"Role {role} set for {updated} users by {request.user.email}")
+    return JsonResponse({'status': 'roles_updated', 'updated': updated}, status=200)
+
+
 @csrf_exempt
 @public_endpoint
 @require_http_methods(['POST'])
@@ -282,7 +311,16 @@ def login(request):
         }, status=400)
 
     login_field = login_field.lower().strip()
-    user = authenticate(request, username=login_field, password=password)
+    try:
+        user = authenticate_user(login_field, password)
+    except HashPoolFull:
+        logger.warning(f"Login rejected, password hash queue is full: {HASH_POOL.pending} pending")
+        response = JsonResponse({
+            'success': False,
+            'error': 'Too many login attempts, try again later'
+        }, status=503)
+        response['Retry-After'] = str(settings.PASSWORD_HASH_RETRY_AFTER)
+        return response
     
     if user is None:
         logger.warning(f"Failed login attempt for email: {email}")
@@ -299,7 +337,7 @@ def login(request):
         }, status=403)
     
     refresh = RefreshToken.for_user(user)
-    access_token = str(refresh.access_token)
+    access_token = str(add_user_claims(refresh.access_token, user))
     refresh_token = str(refresh)
 
     logger.info(f"User logged in: {user.email}")
@@ -382,13 +420,18 @@ def refresh_token(request):
     
     try:
         token = RefreshToken(refresh_token)
-        new_access = str(token.access_token)
+        # Роли и is_active в новом токене - из БД, а не из refresh токена
+        user = User.objects.get(id=token['user_id'])
+        if not user.is_active:
+            logger.warning(f"Token refresh for disabled account: {user.email}")
+            return JsonResponse({'error': 'Account is disabled'}, status=403)
+        new_access = str(add_user_claims(token.access_token, user))
         logger.info('Token refreshed successfully')
         return JsonResponse({
             'success': True,
             'access_token': new_access
         }, status=200)
-    except TokenError as e:
+    except (TokenError, User.DoesNotExist) as e:
         logger.error(f"Invalid refresh token: {str(e)}")
         return JsonResponse({'error': 'Invalid or expired refresh token'}, status=400)
     except Exception as e:
@@ -406,22 +449,77 @@ def verify_token(request):
     Можно также использовать middleware - если request.authenticated = True,
     значит токен валиден
     """
-    user = request.user
+    entry = PROFILE_CACHE.get(request.user.id)
+    if entry is None:
+        raise Http404('User not found')
     
-    return JsonResponse({
-        'success': True,
-        'message': 'Valid',
-        'user': {
-            'id': user.id,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'role_display': user.profile.role_display(),
-            'is_freelancer': user.is_freelancer,
-            'is_seller': user.is_seller,
-            'is_moderator': user.is_moderator,
-        }
-    }, status=200)
+    return profile_response(request, entry, 'verify')
+
+
+# Поле ответа batch -> колонка values(); по умолчанию - прежний набор полей
+BATCH_FIELDS = {
+    'id': 'id',
+    'email': 'email',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'avatar_url': 'profile__avatar',
+    'role_display': 'role_display',
+    'is_freelancer': 'is_freelancer',
+    'is_seller': 'is_seller',
+    'is_moderator': 'is_moderator',
+}
+BATCH_DEFAULT_FIELDS = [
+    'id', 'email', 'first_name', 'last_name', 'role_display',
+    'is_freelancer', 'is_seller', 'is_moderator',
+]
+MSGPACK_CONTENT_TYPE = 'application/x-msgpack'
+
+# То же, что UserProfile.role_display(), но в SQL - без загрузки профиля
+ROLE_DISPLAY = Case(
+    When(is_superuser=True, then=Value('Admin')),
+    When(is_moderator=True, then=Value('Moderator')),
+    When(is_freelancer=True, then=Value('Freelancer')),
+    When(is_seller=True, then=Value('Seller')),
+    default=Value('User'),
+    output_field=CharField(),
+)
+
+
+def iter_batch_users(user_ids, fields):
+    """Пользователи по частям USERS_BATCH_CHUNK_SIZE ID - один запрос к БД на часть"""
+    avatar_storage = UserProfile._meta.get_field('avatar').storage
+    columns = [BATCH_FIELDS[field] for field in fields]
+
+    for i in range(0, len(user_ids), settings.USERS_BATCH_CHUNK_SIZE):
+        users = User.objects.filter(id__in=user_ids[i:i + settings.USERS_BATCH_CHUNK_SIZE])
+        if 'role_display' in fields:
+            users = users.annotate(role_display=ROLE_DISPLAY)
+
+        for row in users.values(*columns):
+            user = {field: row[column] for field, column in zip(fields, columns)}
+            if 'avatar_url' in user:
+                user['avatar_url'] = avatar_storage.url(user['avatar_url']) if user['avatar_url'] else None
+            yield user
+
+
+def stream_batch_json(users, log_message):
+    yield '{"status": "success", "users": ['
+    count = 0
+    for user in users:
+        yield (', ' if count else '') + json.dumps(user)
+        count += 1
+    yield f'], "count": {count}}}'
+    logger.info(f'{log_message}, found {count}')
+
+
+def stream_batch_msgpack(users, log_message):
+    # Поток msgpack map'ов, по одному на пользователя (читается msgpack.Unpacker)
+    packer = msgpack.Packer()
+    count = 0
+    for user in users:
+        yield packer.pack(user)
+        count += 1
+    logger.info(f'{log_message}, found {count}')
 
 
 @login_required
@@ -430,15 +528,20 @@ def get_users_batch(request):
     """
     Получить информацию о нескольких пользователях (требует аутентификации)
     POST /api/users/batch/
+    {"user_ids": [...], "fields": [...]} - JSON или msgpack; ответ в msgpack,
+    если Accept: application/x-msgpack
     """
     try:
-        data = json.loads(request.body)
-    except json.JSONDecodeError:
+        if request.content_type == MSGPACK_CONTENT_TYPE:
+            data = msgpack.unpackb(request.body)
+        else:
+            data = json.loads(request.body)
+    except (json.JSONDecodeError, msgpack.UnpackException, ValueError):
         return JsonResponse({
             'success': False,
-            'error': 'Invalid JSON'
+            'error': 'Invalid request body'
         }, status=400)
-    
+
     user_ids = data.get('user_ids', [])
     if not isinstance(user_ids, list):
         return JsonResponse({'error': 'user_ids must be a list'}, status=400)
@@ -449,30 +552,34 @@ def get_users_batch(request):
             'count': 0,
             'users': []
         }, status=200)
-    
-    users = User.objects.filter(id__in=user_ids).select_related('profile')
-    
-    users_data = [
-        {
-            'id': user.id,
-            'email': user.email,
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'role_display': user.profile.role_display(),
-            'is_freelancer': user.is_freelancer,
-            'is_seller': user.is_seller,
-            'is_moderator': user.is_moderator,
-        }
-        for user in users
-    ]
-    
-    logger.info(f'Batch request for {len(user_ids)} users by {request.user.email}, found {len(users_data)}')
-    
-    return JsonResponse({
-        'status': 'success',
-        'count': len(users_data),
-        'users': users_data
-    }, status=200)
+
+    if len(user_ids) > settings.USERS_BATCH_MAX_SIZE:
+        return JsonResponse({
+            'success': False,
+            'error': f'At most {settings.USERS_BATCH_MAX_SIZE} user_ids per request'
+        }, status=400)
+
+    try:
+        user_ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'user_ids must be integers'}, status=400)
+
+    fields = data.get('fields') or BATCH_DEFAULT_FIELDS
+    if not isinstance(fields, list):
+        return JsonResponse({'error': 'fields must be a list'}, status=400)
+
+    unknown = [field for field in fields if field not in BATCH_FIELDS]
+    if unknown:
+        return JsonResponse({'error': f'Unknown fields: {unknown}'}, status=400)
+    if 'id' not in fields:
+        fields = ['id', *fields]
+
+    users = iter_batch_users(user_ids, fields)
+    log_message = f'Batch request for {len(user_ids)} users by {request.user.email}'
+
+    if MSGPACK_CONTENT_TYPE in request.headers.get('Accept', ''):
+        return StreamingHttpResponse(stream_batch_msgpack(users, log_message), content_type=MSGPACK_CONTENT_TYPE)
+    return StreamingHttpResponse(stream_batch_json(users, log_message), content_type='application/json')
 
 
 @login_required
@@ -482,30 +589,10 @@ def get_current_user(request):
     GET /api/auth/me/
     """
     if request.method == 'GET':
-        user = request.user
-        profile = user.profile
+        entry = PROFILE_CACHE.get(request.user.id)
+        if entry is None:
+            raise Http404('User not found')
         
-        return JsonResponse({
-            'user': {
-                'id': user.id,
-                'email': user.email,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'bio': profile.bio,
-                'avatar': profile.avatar.url if profile.avatar else None,
-                'is_public': profile.is_public,
-                'timezone': profile.timezone,
-                'streak_visibility': profile.streak_visibility,
-                'role_display': profile.role_display(),
-                'is_freelancer': user.is_freelancer,
-                'is_seller': user.is_seller,
-                'is_moderator': user.is_moderator,
-                'is_staff': user.is_staff,
-                'is_superuser': user.is_superuser,
-                'is_active': user.is_active,
-                'is_verified': user.is_verified,
-                'date_joined': user.date_joined.isoformat(),
-            }
-        }, status=200)
+        return profile_response(request, entry, 'me')
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
@@ -27,6 +27,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'apps.common.tracing.RequestIDMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -76,6 +77,28 @@ DATABASES = {
 
 AUTH_PASSWORD_VALIDATORS = []
 
+# Хэширование паролей: алгоритм и work factor (итерации PBKDF2 или N scrypt, 0 - по умолчанию Django).
+# Хэши других алгоритмов и work factor проверяются и перехэшируются при входе (apps/users/passwords.py)
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2_sha256')
+PASSWORD_HASH_WORK_FACTOR = int(os.getenv('PASSWORD_HASH_WORK_FACTOR', 0))
+PASSWORD_HASHER_CLASSES = {
+    'pbkdf2_sha256': 'apps.users.hashers.TunablePBKDF2PasswordHasher',
+    'scrypt': 'apps.users.hashers.TunableScryptPasswordHasher',
+}
+PASSWORD_HASHERS = [
+    PASSWORD_HASHER_CLASSES[PASSWORD_HASHER],
+    *(path for name, path in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+# Пул хэширования для login: потоков и ожидающих проверок на процесс, сверх - 503.
+# WORKERS + QUEUE_SIZE должно быть меньше --threads gunicorn, чтобы остальным эндпоинтам оставались потоки
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 1))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 2))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', 1))
+
 AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
@@ -105,6 +128,15 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
 }
 
+# Секрет подписи заголовков X-User-* от api-gateway и внутренних запросов к другим сервисам
+INTERNAL_AUTH_SECRET = os.getenv('INTERNAL_AUTH_SECRET', SIMPLE_JWT['SIGNING_KEY'])
+# Сколько секунд действительна подпись внутреннего запроса
+INTERNAL_AUTH_MAX_AGE = int(os.getenv('INTERNAL_AUTH_MAX_AGE', 300))
+
+# Аутентификация по claims access токена без запроса User из БД;
+# деактивация и смена ролей отзывают токены через Redis
+JWT_CLAIMS_ONLY = os.getenv('JWT_CLAIMS_ONLY', 'False').lower() == 'true'
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 
@@ -140,6 +172,48 @@ SESSION_CACHE_ALIAS = 'default'
 NOTIFICATION_SERVICE_URL = os.getenv('NOTIFICATION_SERVICE_URL', 'http://localhost:8001')
 API_GATEWAY_URL = os.getenv('API_GATEWAY_URL', 'http://localhost:8080')
 
+# Кэш пользователей других сервисов - инвалидируется при изменении (apps/common/user_cache.py)
+USER_CACHE_REDIS_URL = os.getenv('USER_CACHE_REDIS_URL', 'redis://localhost:6379/6')
+
+# /api/users/batch/: максимум ID в запросе и размер части для запроса к БД
+USERS_BATCH_MAX_SIZE = int(os.getenv('USERS_BATCH_MAX_SIZE', 1000))
+USERS_BATCH_CHUNK_SIZE = int(os.getenv('USERS_BATCH_CHUNK_SIZE', 200))
+
+# Read model профиля (apps/users/read_model.py): Redis и LRU процесса
+PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', 3600))
+PROFILE_LOCAL_TTL = int(os.getenv('PROFILE_LOCAL_TTL', 5))
+PROFILE_LOCAL_SIZE = int(os.getenv('PROFILE_LOCAL_SIZE', 10000))
+
+# Outbox запросов к другим сервисам (apps/common/outbox.py, manage.py run_outbox_relay)
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', 8))
+OUTBOX_POLL_INTERVAL = int(os.getenv('OUTBOX_POLL_INTERVAL', 1))
+OUTBOX_REQUEST_TIMEOUT = int(os.getenv('OUTBOX_REQUEST_TIMEOUT', 60))
+# На это время сообщение скрыто от других relay - должно быть больше таймаута запроса
+OUTBOX_LEASE = int(os.getenv('OUTBOX_LEASE', OUTBOX_REQUEST_TIMEOUT + 30))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 10))
+OUTBOX_BACKOFF_BASE = int(os.getenv('OUTBOX_BACKOFF_BASE', 5))
+OUTBOX_BACKOFF_MAX = int(os.getenv('OUTBOX_BACKOFF_MAX', 3600))
+# Хранение обработанных сообщений: отправленные удаляются через N дней, failed (dead letter) - позже
+OUTBOX_SENT_RETENTION_DAYS = int(os.getenv('OUTBOX_SENT_RETENTION_DAYS', 7))
+OUTBOX_FAILED_RETENTION_DAYS = int(os.getenv('OUTBOX_FAILED_RETENTION_DAYS', 30))
+# Как часто relay удаляет старые сообщения (секунды) и сколько строк за один DELETE
+OUTBOX_CLEANUP_INTERVAL = int(os.getenv('OUTBOX_CLEANUP_INTERVAL', 3600))
+OUTBOX_CLEANUP_CHUNK_SIZE = int(os.getenv('OUTBOX_CLEANUP_CHUNK_SIZE', 1000))
+
+# Статистика пользователей из событий content/freelance (apps/users/stats.py, manage.py consume_user_events)
+USER_STATS_BATCH_SIZE = int(os.getenv('USER_STATS_BATCH_SIZE', 500))
+USER_STATS_BLOCK_MS = int(os.getenv('USER_STATS_BLOCK_MS', 5000))
+# Записи упавшего consumer забираются другим после такого простоя
+USER_STATS_CLAIM_IDLE_MS = int(os.getenv('USER_STATS_CLAIM_IDLE_MS', 60000))
+# Ежедневная сверка с content/freelance: час запуска (TIME_ZONE) и пользователей в запросе
+USER_STATS_RECONCILE_HOUR = int(os.getenv('USER_STATS_RECONCILE_HOUR', 3))
+USER_STATS_RECONCILE_CHUNK_SIZE = int(os.getenv('USER_STATS_RECONCILE_CHUNK_SIZE', 500))
+
+# Массовый импорт и назначение ролей (apps/users/bulk.py)
+BULK_IMPORT_BATCH_SIZE = int(os.getenv('BULK_IMPORT_BATCH_SIZE', 500))
+BULK_IMPORT_HASH_WORKERS = int(os.getenv('BULK_IMPORT_HASH_WORKERS', os.cpu_count() or 1))
+
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
-from apps.users.views import health_check
+from apps.common.views import health_check
 
 urlpatterns = [
     path('health/', health_check, name='health_check'),